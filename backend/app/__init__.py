@@ -4,6 +4,8 @@ from flask_jwt_extended import JWTManager
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from apscheduler.schedulers.background import BackgroundScheduler
+from datetime import datetime
+import atexit
 import os
 
 db = SQLAlchemy()
@@ -23,11 +25,17 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'pulseguard-super-secret-key-change-in-prod')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False
+    # embedded: every web worker runs the scheduler, jobs only fire on the lease holder
+    # external: periodic jobs run in scheduler.py; web workers start no scheduler
+    # off: no periodic jobs at all
+    app.config['SCHEDULER_MODE'] = os.getenv('SCHEDULER_MODE', 'embedded')
+    # off: the schema is upgraded by `flask db-upgrade` as a release step, not by each worker
+    app.config['MIGRATE_ON_START'] = os.getenv('MIGRATE_ON_START', 'on') != 'off'
 
     db.init_app(app)
     jwt.init_app(app)
     bcrypt.init_app(app)
-    CORS(app, origins="*", supports_credentials=True)
+    CORS(app, origins="*", supports_credentials=True, expose_headers=['X-Next-Cursor', 'ETag'])
 
     from .routes.auth import auth_bp
     from .routes.medications import med_bp
@@ -43,27 +51,60 @@ def create_app():
     app.register_blueprint(alerts_bp, url_prefix='/api/alerts')
     app.register_blueprint(profile_bp, url_prefix='/api')
 
+    from .services import upstream
+    app.before_request(upstream.begin_request)
+    app.teardown_request(upstream.end_request)
+
+    from .cli import register_commands
+    register_commands(app)
+
     with app.app_context():
-        db.create_all()
-        _start_scheduler(app)
+        if app.config['MIGRATE_ON_START']:
+            from .migrations import upgrade_schema
+            upgrade_schema()
+        if app.config['SCHEDULER_MODE'] == 'embedded':
+            start_scheduler(app)
 
     return app
 
 
-def _start_scheduler(app):
-    from .tasks import check_missed_doses, check_low_stock
-    if not scheduler.running:
-        scheduler.add_job(
-            func=lambda: _run_with_context(app, check_missed_doses),
-            trigger='interval', minutes=1, id='missed_doses'
+def start_scheduler(app, sched=scheduler):
+    """Register periodic jobs on sched and start it (blocks for a BlockingScheduler)."""
+    from .tasks import reconcile_missed_doses, check_low_stock, handle_due_doses, load_dose_timer, \
+        dose_timer, MISSED_DOSE_RECONCILE_MINUTES
+    from .leader import scheduler_lease, SCHEDULER_HEARTBEAT_SECONDS
+    from .services.enrichment import poll_jobs, ENRICHMENT_POLL_SECONDS
+    if not sched.running:
+        _run_with_context(app, load_dose_timer)
+        dose_timer.start(on_due=lambda med_ids: _run_as_leader(app, lambda: handle_due_doses(med_ids)))
+        sched.add_job(
+            func=lambda: _run_with_context(app, scheduler_lease.heartbeat),
+            trigger='interval', seconds=SCHEDULER_HEARTBEAT_SECONDS, id='leader_heartbeat',
+            next_run_time=datetime.now()
+        )
+        sched.add_job(
+            func=lambda: _run_as_leader(app, reconcile_missed_doses),
+            trigger='interval', minutes=MISSED_DOSE_RECONCILE_MINUTES, id='missed_doses'
         )
-        scheduler.add_job(
-            func=lambda: _run_with_context(app, check_low_stock),
+        sched.add_job(
+            func=lambda: _run_as_leader(app, check_low_stock),
             trigger='interval', minutes=5, id='low_stock'
         )
-        scheduler.start()
+        # Not leader-only: each job is claimed in the database, so every process can help
+        sched.add_job(
+            func=lambda: _run_with_context(app, lambda: poll_jobs(app)),
+            trigger='interval', seconds=ENRICHMENT_POLL_SECONDS, id='label_enrichment'
+        )
+        atexit.register(lambda: _run_with_context(app, scheduler_lease.release))
+        sched.start()
 
 
 def _run_with_context(app, fn):
     with app.app_context():
-        fn()
\ No newline at end of file
+        fn()
+
+
+def _run_as_leader(app, fn):
+    from .leader import scheduler_lease
+    if scheduler_lease.is_leader:
+        _run_with_context(app, fn)
\ No newline at end of file
@@ -0,0 +1,64 @@
+import click
+
+
+def register_commands(app):
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """Create missing tables and apply pending schema migrations."""
+        from .migrations import upgrade_schema
+        click.echo(f'Schema at version {upgrade_schema()}')
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans_command():
+        """EXPLAIN every hot query; exit 1 if any falls back to a full table scan."""
+        from .query_plans import check_query_plans
+        failed = False
+        for name, (plan, scans) in check_query_plans().items():
+            status = 'FULL SCAN of ' + ', '.join(scans) if scans else 'ok'
+            click.echo(f'{name}: {status}')
+            for line in plan:
+                click.echo(f'    {line}')
+            failed = failed or bool(scans)
+        if failed:
+            raise SystemExit(1)
+
+    @app.cli.command('adherence-backfill')
+    def adherence_backfill():
+        """Rebuild the adherence_daily rollup from dose_logs."""
+        from .services.adherence import backfill
+        click.echo(f'Wrote {backfill()} adherence row(s)')
+
+    @app.cli.command('adherence-check')
+    @click.option('--fix', is_flag=True, help='Rebuild the rollup if it has drifted.')
+    def adherence_check(fix):
+        """Compare the adherence rollup with dose_logs; exit 1 on drift unless fixed."""
+        from .services.adherence import find_inconsistencies, backfill
+        problems = find_inconsistencies()
+        for med_id, day, expected, actual in problems:
+            click.echo(f'medication {med_id} on {day}: expected {expected}, found {actual}')
+        if not problems:
+            click.echo('Adherence rollup is consistent')
+        elif fix:
+            click.echo(f'Rebuilt {backfill()} adherence row(s)')
+        else:
+            raise SystemExit(1)
+
+    @app.cli.command('interactions-import')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--replace', is_flag=True, help='Drop the whole store first, not just the sources in the file.')
+    @click.option('--source', default='local', show_default=True, help='Source for rows that leave it empty.')
+    def interactions_import(path, replace, source):
+        """Load an interaction dataset (CSV) into the local interaction store."""
+        from .services.interaction_store import import_interactions, IMPORT_COLUMNS
+        try:
+            imported, concepts = import_interactions(path, replace=replace, default_source=source)
+        except ValueError as e:
+            raise click.ClickException(f'{e} (columns: {", ".join(IMPORT_COLUMNS)})')
+        click.echo(f'Imported {imported} interaction(s), {concepts} new drug concept(s)')
+
+    @app.cli.command('enrichment-run')
+    def enrichment_run():
+        """Run every due label enrichment job in this process."""
+        from .services.enrichment import run_due_jobs
+        click.echo(f'Ran {run_due_jobs()} enrichment job(s)')
@@ -0,0 +1,120 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class DueDose:
+    """One scheduled deadline. medication_id is cleared when the entry is superseded."""
+    __slots__ = ('deadline', 'medication_id')
+
+    def __init__(self, deadline, medication_id):
+        self.deadline = deadline
+        self.medication_id = medication_id
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+
+def _epoch(dt):
+    # Model timestamps are naive UTC
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+class DoseTimer:
+    """
+    Min-heap of upcoming missed-dose deadlines (next_dose_time + grace).
+
+    A background thread sleeps until the earliest deadline and hands every
+    medication that is due to on_due(medication_ids). Rescheduling or
+    cancelling a medication tombstones its old entry instead of searching the
+    heap; tombstones are dropped when they surface or on the next load().
+
+    The heap only knows about writes made in this process, so it is reseeded
+    from the database by the periodic reconciliation scan.
+    """
+
+    def __init__(self, grace_seconds):
+        self.grace_seconds = grace_seconds
+        self._heap = []
+        self._entries = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._on_due = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def start(self, on_due):
+        if self.running:
+            return
+        self._on_due = on_due
+        self._thread = threading.Thread(target=self._run, name='dose-timer', daemon=True)
+        self._thread.start()
+
+    def load(self, schedule):
+        """Replace the heap with (medication_id, next_dose_time) pairs."""
+        entries = {
+            med_id: DueDose(_epoch(next_dose) + self.grace_seconds, med_id)
+            for med_id, next_dose in schedule if next_dose is not None
+        }
+        heap = list(entries.values())
+        heapq.heapify(heap)
+        with self._cond:
+            self._entries = entries
+            self._heap = heap
+            self._cond.notify()
+
+    def schedule(self, medication_id, next_dose_time):
+        """Arm (or re-arm) the deadline for one medication; no-op unless the timer runs here."""
+        if not self.running:
+            return
+        if next_dose_time is None:
+            return self.cancel(medication_id)
+        entry = DueDose(_epoch(next_dose_time) + self.grace_seconds, medication_id)
+        with self._cond:
+            old = self._entries.get(medication_id)
+            if old is not None:
+                old.medication_id = None
+            self._entries[medication_id] = entry
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._cond.notify()
+
+    def cancel(self, medication_id):
+        with self._cond:
+            old = self._entries.pop(medication_id, None)
+            if old is not None:
+                old.medication_id = None
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0].deadline <= now:
+            entry = heapq.heappop(self._heap)
+            if entry.medication_id is not None:
+                del self._entries[entry.medication_id]
+                due.append(entry.medication_id)
+        return due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.time()
+                due = self._pop_due(now)
+                if not due:
+                    # Wake at the next deadline; re-check at least once a minute
+                    # so wall-clock jumps cannot strand an entry.
+                    delay = self._heap[0].deadline - now if self._heap else 60
+                    self._cond.wait(timeout=max(0.05, min(delay, 60)))
+                    continue
+            try:
+                self._on_due(due)
+            except Exception as e:
+                logger.error(f"Dose timer handler failed for {len(due)} medication(s): {e}")
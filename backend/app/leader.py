@@ -0,0 +1,98 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_LEASE_TTL_SECONDS = int(os.getenv('SCHEDULER_LEASE_TTL_SECONDS', '30'))
+SCHEDULER_HEARTBEAT_SECONDS = int(os.getenv('SCHEDULER_HEARTBEAT_SECONDS', '10'))
+
+
+class LeaderLease:
+    """
+    Lease-based leader election on a row of the scheduler_leases table.
+
+    Every process that runs a scheduler calls heartbeat() periodically. The
+    row is claimed with a conditional UPDATE (only if we already hold it or it
+    has expired), so at most one holder wins; the leader renews it on each
+    heartbeat and another process takes over once it lapses. A process stops
+    considering itself leader as soon as its own view of the lease expires,
+    even if it cannot reach the database to find out.
+    """
+
+    def __init__(self, name='scheduler', ttl_seconds=SCHEDULER_LEASE_TTL_SECONDS, holder=None):
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.holder = holder or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._valid_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_leader(self):
+        return time.monotonic() < self._valid_until
+
+    def heartbeat(self):
+        """Acquire or renew the lease. Returns True while this process is leader."""
+        from .models import SchedulerLease
+        table = SchedulerLease.__table__
+        started = time.monotonic()
+        now = datetime.utcnow()
+        with self._lock:
+            was_leader = self.is_leader
+            try:
+                with db.engine.begin() as conn:
+                    claimed = conn.execute(
+                        table.update()
+                        .where(table.c.name == self.name)
+                        .where((table.c.holder == self.holder) | (table.c.expires_at < now))
+                        .values(holder=self.holder, expires_at=now + self.ttl, renewed_at=now)
+                    ).rowcount == 1
+                    if not claimed and conn.execute(
+                        table.select().where(table.c.name == self.name)
+                    ).first() is None:
+                        conn.execute(table.insert().values(
+                            name=self.name, holder=self.holder,
+                            expires_at=now + self.ttl, renewed_at=now
+                        ))
+                        claimed = True
+            except IntegrityError:
+                claimed = False  # another process inserted the row first
+            except Exception as e:
+                logger.warning(f"Scheduler lease heartbeat failed: {e}")
+                return self.is_leader
+
+            # Measure validity from before the round trip so we never overestimate it
+            self._valid_until = started + self.ttl.total_seconds() if claimed else 0.0
+            if claimed and not was_leader:
+                logger.info(f"{self.holder} acquired the {self.name} lease")
+            elif was_leader and not claimed:
+                logger.warning(f"{self.holder} lost the {self.name} lease")
+            return claimed
+
+    def release(self):
+        from .models import SchedulerLease
+        table = SchedulerLease.__table__
+        with self._lock:
+            if not self.is_leader:
+                return
+            self._valid_until = 0.0
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(
+                        table.update()
+                        .where(table.c.name == self.name, table.c.holder == self.holder)
+                        .values(expires_at=datetime.utcnow())
+                    )
+            except Exception as e:
+                logger.warning(f"Scheduler lease release failed: {e}")
+
+
+scheduler_lease = LeaderLease()
@@ -0,0 +1,214 @@
+"""
+Versioned schema migrations.
+
+db.create_all() only creates missing tables, so columns and indexes added to
+existing tables need a migration here. Every migration must be idempotent:
+on a fresh database create_all has already built the current schema, and
+running the steps only records the version.
+
+upgrade_schema() holds an exclusive lock while it runs, so when several
+workers start at once one of them migrates and the others wait and find
+nothing left to do. Deployments with more than one host should set
+MIGRATE_ON_START=off and run `flask --app run db-upgrade` once per release.
+"""
+import json
+import logging
+from contextlib import contextmanager
+
+from sqlalchemy import inspect
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+# Arbitrary key for the PostgreSQL advisory lock held while migrating
+MIGRATION_LOCK_KEY = 8150731
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def _add_column(conn, column):
+    """ALTER TABLE ... ADD COLUMN for a model column, unless it already exists. Returns True if added."""
+    table = column.table.name
+    if column.name in {c['name'] for c in inspect(conn).get_columns(table)}:
+        return False
+    conn.exec_driver_sql(
+        f'ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}'
+    )
+    return True
+
+
+def _create_index(conn, name, table, *columns, unique=False):
+    """
+    CREATE INDEX IF NOT EXISTS. Each migration spells out the indexes it adds
+    instead of reading them from the models, whose later columns may not
+    exist yet when an old database is upgraded.
+    """
+    conn.exec_driver_sql(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    )
+
+
+@migration(1, 'Add medications.updated_at and alerts.dedupe_key')
+def _add_change_tracking_columns(conn):
+    from .models import Medication, Alert
+    if _add_column(conn, Medication.__table__.c.updated_at):
+        conn.execute(
+            Medication.__table__.update()
+            .where(Medication.__table__.c.updated_at.is_(None))
+            .values(updated_at=Medication.__table__.c.created_at)
+        )
+    if _add_column(conn, Alert.__table__.c.dedupe_key):
+        # Give the newest unread low-stock alert of each medication its key so
+        # the unique index (created below) keeps deduplicating against it.
+        alerts = Alert.__table__
+        rows = conn.execute(
+            db.select(db.func.max(alerts.c.id), alerts.c.medication_id)
+            .where(alerts.c.type == 'low_stock', alerts.c.is_read == False,
+                   alerts.c.medication_id.isnot(None))
+            .group_by(alerts.c.medication_id)
+        ).all()
+        for alert_id, med_id in rows:
+            conn.execute(alerts.update().where(alerts.c.id == alert_id)
+                         .values(dedupe_key=f'low_stock:{med_id}'))
+    _create_index(conn, 'uq_alerts_dedupe_key', 'alerts', 'dedupe_key', unique=True)
+
+
+@migration(2, 'Composite indexes for hot query paths')
+def _add_hot_path_indexes(conn):
+    _create_index(conn, 'ix_medications_active_next_dose', 'medications', 'is_active', 'next_dose_time')
+    _create_index(conn, 'ix_medications_patient_active', 'medications', 'patient_id', 'is_active')
+    _create_index(conn, 'ix_medications_updated_at', 'medications', 'updated_at')
+    _create_index(conn, 'ix_dose_logs_medication_status_scheduled', 'dose_logs', 'medication_id', 'status', 'scheduled_time')
+    _create_index(conn, 'ix_dose_logs_created_at', 'dose_logs', 'created_at')
+    _create_index(conn, 'ix_alerts_user_read_created', 'alerts', 'user_id', 'is_read', 'created_at')
+    _create_index(conn, 'ix_caregiver_links_caregiver', 'caregiver_links', 'caregiver_id')
+    _create_index(conn, 'ix_caregiver_links_patient', 'caregiver_links', 'patient_id')
+
+
+@migration(3, 'Backfill the adherence_daily rollup from dose_logs')
+def _backfill_adherence(conn):
+    from .services.adherence import backfill
+    backfill(conn)
+
+
+@migration(4, 'Index alerts by (user_id, id) for keyset reads')
+def _add_alert_keyset_index(conn):
+    _create_index(conn, 'ix_alerts_user_id', 'alerts', 'user_id', 'id')
+
+
+@migration(5, 'Add users.data_version')
+def _add_data_version(conn):
+    from .models import User
+    if _add_column(conn, User.__table__.c.data_version):
+        conn.execute(User.__table__.update().values(data_version=0))
+
+
+@migration(6, 'Add medications.last_taken_time / recent_taken_times and backfill them from dose_logs')
+def _add_recent_doses(conn):
+    from .models import Medication, DoseLog, RECENT_DOSE_RING_SIZE
+    meds, logs = Medication.__table__, DoseLog.__table__
+    added = _add_column(conn, meds.c.last_taken_time)
+    added = _add_column(conn, meds.c.recent_taken_times) or added
+    if not added:
+        return
+    taken_at = db.func.coalesce(logs.c.taken_time, logs.c.created_at)
+    ranked = db.select(
+        logs.c.medication_id, taken_at.label('taken_at'),
+        db.func.row_number().over(partition_by=logs.c.medication_id, order_by=taken_at.desc()).label('n')
+    ).where(logs.c.status == 'taken').subquery()
+    rings = {}
+    for med_id, t in conn.execute(
+        db.select(ranked.c.medication_id, ranked.c.taken_at)
+        .where(ranked.c.n <= RECENT_DOSE_RING_SIZE)
+        .order_by(ranked.c.medication_id, ranked.c.taken_at)
+    ):
+        rings.setdefault(med_id, []).append(t)
+    if rings:
+        conn.execute(
+            meds.update().where(meds.c.id == db.bindparam('med_id'))
+            .values(last_taken_time=db.bindparam('last'), recent_taken_times=db.bindparam('ring')),
+            [{'med_id': med_id, 'last': ring[-1], 'ring': json.dumps([t.isoformat() for t in ring])}
+             for med_id, ring in rings.items()]
+        )
+
+
+@migration(7, 'Add dose_logs.client_key for idempotent batched dose logging')
+def _add_dose_client_key(conn):
+    from .models import DoseLog
+    _add_column(conn, DoseLog.__table__.c.client_key)
+    _create_index(conn, 'uq_dose_logs_medication_client_key', 'dose_logs', 'medication_id', 'client_key', unique=True)
+
+
+@migration(8, 'Add medications.label_status for background label enrichment')
+def _add_label_status(conn):
+    from .models import Medication
+    if _add_column(conn, Medication.__table__.c.label_status):
+        conn.execute(Medication.__table__.update().values(label_status='ready'))
+
+
+def current_version():
+    from .models import SchemaVersion
+    with db.engine.connect() as conn:
+        return conn.execute(db.select(db.func.max(SchemaVersion.version))).scalar() or 0
+
+
+def run_migrations():
+    """Apply pending migrations, each in its own transaction. Returns the resulting version."""
+    from .models import SchemaVersion
+    version = current_version()
+    for number, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if number <= version:
+            continue
+        logger.info(f"Applying migration {number}: {description}")
+        with db.engine.begin() as conn:
+            fn(conn)
+            conn.execute(SchemaVersion.__table__.delete())
+            conn.execute(SchemaVersion.__table__.insert().values(version=number))
+        version = number
+    return version
+
+
+@contextmanager
+def migration_lock():
+    """
+    Exclusive lock for schema changes: an advisory lock on PostgreSQL, a
+    lock file next to the database on SQLite (whose writers share a host).
+    """
+    engine = db.engine
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            conn.exec_driver_sql(f'SELECT pg_advisory_lock({MIGRATION_LOCK_KEY})')
+            try:
+                yield
+            finally:
+                conn.exec_driver_sql(f'SELECT pg_advisory_unlock({MIGRATION_LOCK_KEY})')
+        return
+    path = engine.url.database if engine.dialect.name == 'sqlite' else None
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    if not path or path == ':memory:' or fcntl is None:
+        yield
+        return
+    with open(f'{path}.migrate.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def upgrade_schema():
+    """Create missing tables and apply pending migrations under migration_lock(). Returns the version."""
+    with migration_lock():
+        db.create_all()
+        return run_migrations()
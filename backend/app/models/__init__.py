@@ -1,6 +1,10 @@
+import json
 from datetime import datetime
 from .. import db
 
+# How many recent taken-dose times a medication keeps in recent_taken_times
+RECENT_DOSE_RING_SIZE = 8
+
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -10,6 +14,8 @@ class User(db.Model):
     name = db.Column(db.String(100), nullable=False)
     role = db.Column(db.String(20), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped by every write to this patient's data (services/data_version.py)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     medications = db.relationship('Medication', backref='patient', lazy=True, foreign_keys='Medication.patient_id')
     alerts = db.relationship('Alert', backref='user', lazy=True)
@@ -21,21 +27,8 @@ class User(db.Model):
     )
 
     def to_dict(self):
-        try:
-            profile_data = None
-            if self.profile:
-                profile_data = self.profile.to_dict()
-        except:
-            profile_data = None
-        
-        return {
-            'id': self.id,
-            'email': self.email,
-            'name': self.name,
-            'role': self.role,
-            'created_at': self.created_at.isoformat(),
-            'profile': profile_data
-        }
+        from ..serializers import USER
+        return {**USER.dump_object(self), 'profile': self.profile.to_dict() if self.profile else None}
 
 
 class UserProfile(db.Model):
@@ -56,26 +49,11 @@ class UserProfile(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    user = db.relationship('User', backref='profile', uselist=False)
+    user = db.relationship('User', backref=db.backref('profile', uselist=False))
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'age': self.age,
-            'height_cm': self.height_cm,
-            'weight_kg': self.weight_kg,
-            'blood_type': self.blood_type,
-            'allergies': self.allergies,
-            'medical_history': self.medical_history,
-            'medications_history': self.medications_history,
-            'emergency_contact_name': self.emergency_contact_name,
-            'emergency_contact_phone': self.emergency_contact_phone,
-            'emergency_contact_relationship': self.emergency_contact_relationship,
-            'notes': self.notes,
-            'updated_at': self.updated_at.isoformat(),
-            'created_at': self.created_at.isoformat()
-        }
+        from ..serializers import USER_PROFILE
+        return USER_PROFILE.dump_object(self)
 
 
 class CaregiverLink(db.Model):
@@ -85,6 +63,11 @@ class CaregiverLink(db.Model):
     patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_caregiver_links_caregiver', 'caregiver_id'),
+        db.Index('ix_caregiver_links_patient', 'patient_id'),
+    )
+
 
 class Medication(db.Model):
     __tablename__ = 'medications'
@@ -102,32 +85,43 @@ class Medication(db.Model):
     next_dose_time = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     description = db.Column(db.Text)
     side_effects = db.Column(db.Text)
     boxed_warnings = db.Column(db.Text)
+    # FDA label fields above: 'pending' until the enrichment job fills them
+    # (services/enrichment.py), then 'ready', or 'failed' once it gives up
+    label_status = db.Column(db.String(20), nullable=False, default='ready', server_default='ready')
+    # Denormalised from dose_logs by record_taken(): the latest taken dose and a
+    # JSON list of the last RECENT_DOSE_RING_SIZE taken times (oldest first)
+    last_taken_time = db.Column(db.DateTime)
+    recent_taken_times = db.Column(db.Text)
 
     dose_logs = db.relationship('DoseLog', backref='medication', lazy=True)
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'patient_id': self.patient_id,
-            'name': self.name,
-            'rxcui': self.rxcui,
-            'form': self.form,
-            'dose_amount': self.dose_amount,
-            'dose_unit': self.dose_unit,
-            'frequency_hours': self.frequency_hours,
-            'half_life_hours': self.half_life_hours,
-            'current_stock': self.current_stock,
-            'stock_threshold': self.stock_threshold,
-            'next_dose_time': self.next_dose_time.isoformat() if self.next_dose_time else None,
-            'is_active': self.is_active,
-            'description': self.description,
-            'side_effects': self.side_effects,
-            'boxed_warnings': self.boxed_warnings,
-            'created_at': self.created_at.isoformat()
-        }
+    __table_args__ = (
+        db.Index('ix_medications_active_next_dose', 'is_active', 'next_dose_time'),
+        db.Index('ix_medications_patient_active', 'patient_id', 'is_active'),
+        db.Index('ix_medications_updated_at', 'updated_at'),
+    )
+
+    def recent_taken(self):
+        """Recent taken-dose times, oldest first (at most RECENT_DOSE_RING_SIZE)."""
+        return [datetime.fromisoformat(t) for t in json.loads(self.recent_taken_times or '[]')]
+
+    def record_taken(self, taken_time):
+        """Keep last_taken_time and the recent-dose ring in step with a new taken dose log."""
+        ring = sorted([*self.recent_taken(), taken_time])[-RECENT_DOSE_RING_SIZE:]
+        self.recent_taken_times = json.dumps([t.isoformat() for t in ring])
+        self.last_taken_time = max(ring[-1], self.last_taken_time or ring[-1])
+
+    @property
+    def has_boxed_warning(self):
+        return bool(self.boxed_warnings)
+
+    def to_dict(self, include_label=True):
+        from ..serializers import medication_projection
+        return medication_projection(include_label).dump_object(self)
 
 
 class DoseLog(db.Model):
@@ -139,18 +133,22 @@ class DoseLog(db.Model):
     status = db.Column(db.String(20), nullable=False, default='pending')
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Idempotency key sent by the client with a batched log (routes/doses.py log_dose_batch)
+    client_key = db.Column(db.String(100))
+
+    __table_args__ = (
+        db.Index('ix_dose_logs_medication_status_scheduled', 'medication_id', 'status', 'scheduled_time'),
+        db.Index('ix_dose_logs_created_at', 'created_at'),
+        db.Index('uq_dose_logs_medication_client_key', 'medication_id', 'client_key', unique=True),
+    )
+
+    @property
+    def medication_name(self):
+        return self.medication.name if self.medication else None
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'medication_id': self.medication_id,
-            'medication_name': self.medication.name if self.medication else None,
-            'scheduled_time': self.scheduled_time.isoformat(),
-            'taken_time': self.taken_time.isoformat() if self.taken_time else None,
-            'status': self.status,
-            'notes': self.notes,
-            'created_at': self.created_at.isoformat()
-        }
+        from ..serializers import DOSE_LOG
+        return DOSE_LOG.dump_object(self)
 
 
 class Alert(db.Model):
@@ -164,16 +162,116 @@ class Alert(db.Model):
     medication_id = db.Column(db.Integer, db.ForeignKey('medications.id'), nullable=True)
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set while an alert must stay unique (e.g. one unread low-stock alert per
+    # medication); cleared when it is read so a new one can be raised later.
+    dedupe_key = db.Column(db.String(100))
+
+    __table_args__ = (
+        db.Index('ix_alerts_user_read_created', 'user_id', 'is_read', 'created_at'),
+        # Keyset reads by alert id (delta sync, history pages, the alert stream)
+        db.Index('ix_alerts_user_id', 'user_id', 'id'),
+        db.Index('uq_alerts_dedupe_key', 'dedupe_key', unique=True),
+    )
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'type': self.type,
-            'severity': self.severity,
-            'title': self.title,
-            'message': self.message,
-            'medication_id': self.medication_id,
-            'is_read': self.is_read,
-            'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+        from ..serializers import ALERT
+        return ALERT.dump_object(self)
+
+
+class DrugLookupCache(db.Model):
+    """Shared tier of the drug lookup cache (see services/cache.py)."""
+    __tablename__ = 'drug_lookup_cache'
+    id = db.Column(db.Integer, primary_key=True)
+    namespace = db.Column(db.String(30), nullable=False)
+    lookup_key = db.Column(db.String(200), nullable=False)
+    value = db.Column(db.Text)  # JSON payload; NULL marks a negative (not found) entry
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('namespace', 'lookup_key', name='uq_drug_lookup_cache_key'),)
+
+
+class EnrichmentJob(db.Model):
+    """Queued background fetch of a medication's FDA label (see services/enrichment.py)."""
+    __tablename__ = 'enrichment_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    medication_id = db.Column(db.Integer, db.ForeignKey('medications.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued | running | done | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(150))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_enrichment_jobs_status_run_after', 'status', 'run_after'),
+        db.Index('ix_enrichment_jobs_medication', 'medication_id'),
+    )
+
+
+class SchedulerLease(db.Model):
+    """Leader-election lease for periodic jobs (see app/leader.py)."""
+    __tablename__ = 'scheduler_leases'
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(150))
+    expires_at = db.Column(db.DateTime, nullable=False)
+    renewed_at = db.Column(db.DateTime)
+
+
+class SchemaVersion(db.Model):
+    """Single-row table recording the last migration applied (see app/migrations.py)."""
+    __tablename__ = 'schema_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class AdherenceDaily(db.Model):
+    """Per-medication daily dose outcome counters (see services/adherence.py)."""
+    __tablename__ = 'adherence_daily'
+    id = db.Column(db.Integer, primary_key=True)
+    medication_id = db.Column(db.Integer, db.ForeignKey('medications.id'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    taken = db.Column(db.Integer, nullable=False, default=0)
+    missed = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('medication_id', 'day', name='uq_adherence_daily_medication_day'),
+        # Per-patient windows sum the medication rows through this index
+        db.Index('ix_adherence_daily_patient_day', 'patient_id', 'day'),
+    )
+
+
+class DrugConcept(db.Model):
+    """An RxCUI known to the local interaction store (see services/interaction_store.py)."""
+    __tablename__ = 'drug_concepts'
+    rxcui = db.Column(db.String(50), primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    name_key = db.Column(db.String(200), nullable=False)  # normalize_drug_name(name)
+
+    __table_args__ = (
+        db.Index('ix_drug_concepts_name_key', 'name_key'),
+    )
+
+
+class DrugInteraction(db.Model):
+    """One imported interaction record for an unordered RxCUI pair."""
+    __tablename__ = 'drug_interactions'
+    id = db.Column(db.Integer, primary_key=True)
+    pair_key = db.Column(db.String(101), nullable=False)  # interaction_pair_key(rxcui_a, rxcui_b)
+    rxcui_a = db.Column(db.String(50), nullable=False)
+    rxcui_b = db.Column(db.String(50), nullable=False)
+    drug_a = db.Column(db.String(200))
+    drug_b = db.Column(db.String(200))
+    severity = db.Column(db.String(50))
+    description = db.Column(db.Text, nullable=False)
+    source = db.Column(db.String(100), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_drug_interactions_pair_key', 'pair_key'),
+        db.Index('ix_drug_interactions_source', 'source'),
+    )
@@ -0,0 +1,77 @@
+"""
+EXPLAIN-based regression checks for hot queries.
+
+Each entry builds the statement a hot code path actually runs, with
+representative parameters. check_query_plans() asks SQLite for the plan and
+reports any step that reads a whole table instead of going through an index.
+"""
+import re
+from datetime import datetime, timedelta
+
+from . import db
+from .models import Medication, DoseLog, Alert, CaregiverLink, AdherenceDaily, DrugConcept, DrugInteraction, \
+    EnrichmentJob
+
+# "SCAN medications" / "SCAN TABLE medications" is a full table scan; a scan
+# "USING INDEX" / "USING COVERING INDEX" only walks an index.
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?!.*USING (?:COVERING )?INDEX)')
+
+
+def _hot_queries():
+    from .tasks import overdue_medications_query, low_stock_query
+    from .services.enrichment import _claimable
+    now = datetime.utcnow()
+    return {
+        'missed_doses_chunk': overdue_medications_query(now, 0, 2000),
+        'active_medications_for_patient': db.select(Medication).where(
+            Medication.patient_id == 1, Medication.is_active == True
+        ),
+        'dose_logs_for_patient_since': db.select(DoseLog).join(Medication).where(
+            Medication.patient_id == 1, DoseLog.created_at >= now - timedelta(days=7)
+        ),
+        'recent_dose_logs': db.select(DoseLog).where(
+            DoseLog.created_at >= now - timedelta(hours=2)
+        ),
+        'unread_alerts_for_user': db.select(Alert).where(
+            Alert.user_id == 1, Alert.is_read == False
+        ).order_by(Alert.created_at.desc()).limit(50),
+        'alerts_since_id': db.select(Alert).where(
+            Alert.user_id == 1, Alert.id > 100
+        ).order_by(Alert.id).limit(50),
+        'alert_history_page': db.select(Alert).where(
+            Alert.user_id == 1, Alert.id < 100
+        ).order_by(Alert.id.desc()).limit(50),
+        'caregiver_patients': db.select(CaregiverLink).where(CaregiverLink.caregiver_id == 1),
+        'low_stock_changed_since': low_stock_query(now - timedelta(minutes=5)),
+        'local_interaction_pairs': db.select(DrugInteraction).where(
+            DrugInteraction.pair_key.in_(['1191+11289', '11289+5640'])
+        ),
+        'local_rxcui_for_name': db.select(DrugConcept.rxcui).where(DrugConcept.name_key == 'warfarin').limit(1),
+        'due_enrichment_jobs': db.select(EnrichmentJob.id).where(_claimable(now)).order_by(EnrichmentJob.run_after),
+        'adherence_window': db.select(AdherenceDaily).where(
+            AdherenceDaily.patient_id.in_([1, 2]), AdherenceDaily.day >= (now - timedelta(days=30)).date()
+        ),
+    }
+
+
+def explain(conn, statement):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement (SQLite only)."""
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).all()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans():
+    """Returns {query name: (plan lines, [tables read by full scan])}."""
+    results = {}
+    with db.engine.connect() as conn:
+        if conn.dialect.name != 'sqlite':
+            raise RuntimeError('Query plan checks run against SQLite only')
+        for name, statement in _hot_queries().items():
+            plan = explain(conn, statement)
+            # Scans of subqueries / co-routines are fine; only real tables count
+            scans = [m.group(1) for m in (_FULL_SCAN.match(line) for line in plan)
+                     if m and m.group(1) in db.metadata.tables]
+            results[name] = (plan, scans)
+    return results
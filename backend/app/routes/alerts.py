@@ -1,21 +1,78 @@
-from flask import Blueprint, request, jsonify
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models import Alert
+from ..models import Alert, CaregiverLink
+from ..services.alert_bus import alert_bus, relay
+from ..services.data_version import touch
 from .. import db
+from .. import serializers
 
 alerts_bp = Blueprint('alerts', __name__)
 
+ALERTS_MAX_PAGE = 200
+
+# Comment line sent when nothing happened, so proxies keep the stream open
+ALERT_STREAM_HEARTBEAT_SECONDS = int(os.getenv('ALERT_STREAM_HEARTBEAT_SECONDS', '15'))
+# How often an open stream also re-reads the DB on its own. Alerts from other
+# processes normally arrive through the bus relay; this catches ids the relay
+# skipped because they committed out of order. 0 relies on the bus alone.
+ALERT_STREAM_CATCHUP_SECONDS = int(os.getenv('ALERT_STREAM_CATCHUP_SECONDS', '60'))
+
 
 @alerts_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_alerts():
+    """
+    Newest alerts first. Optional query params:
+      unread - 'true' for unread alerts only
+      limit  - page size (default 50, at most ALERTS_MAX_PAGE)
+      since  - alert id (or ISO timestamp): only alerts created after it.
+               X-Next-Cursor carries the id to pass as `since` next time;
+               a full page means more are waiting.
+      before - alert id: keyset page of older alerts for history. X-Next-Cursor
+               carries the next `before` while more pages remain.
+    """
     uid = int(get_jwt_identity())
     unread_only = request.args.get('unread', 'false').lower() == 'true'
-    query = Alert.query.filter_by(user_id=uid)
+    limit = max(1, min(request.args.get('limit', 50, type=int), ALERTS_MAX_PAGE))
+    since = request.args.get('since')
+    before = request.args.get('before', type=int)
+
+    query = serializers.ALERT.select().where(Alert.user_id == uid)
     if unread_only:
-        query = query.filter_by(is_read=False)
-    alerts = query.order_by(Alert.created_at.desc()).limit(50).all()
-    return jsonify([a.to_dict() for a in alerts])
+        query = query.where(Alert.is_read == False)
+
+    next_cursor = None
+    if since is not None:
+        try:
+            since_id = int(since)
+        except ValueError:
+            since_id = None
+            try:
+                since_time = datetime.fromisoformat(since.replace('Z', '+00:00'))
+            except ValueError:
+                return jsonify({'error': 'since must be an alert id or ISO timestamp'}), 400
+            if since_time.tzinfo is not None:
+                since_time = since_time.astimezone(timezone.utc).replace(tzinfo=None)
+            query = query.where(Alert.created_at > since_time)
+        else:
+            query = query.where(Alert.id > since_id)
+        # Oldest first so the cursor advances without gaps, returned newest first
+        alerts = serializers.alerts(query.order_by(Alert.id).limit(limit))[::-1]
+        next_cursor = alerts[0]['id'] if alerts else since_id
+    elif before is not None:
+        alerts = serializers.alerts(query.where(Alert.id < before).order_by(Alert.id.desc()).limit(limit))
+        if len(alerts) == limit:
+            next_cursor = alerts[-1]['id']
+    else:
+        alerts = serializers.alerts(query.order_by(Alert.created_at.desc()).limit(limit))
+
+    headers = {'X-Next-Cursor': str(next_cursor)} if next_cursor is not None else None
+    return serializers.json_response(alerts, headers=headers)
 
 
 @alerts_bp.route('/<int:alert_id>/read', methods=['PUT'])
@@ -26,6 +83,7 @@ def mark_read(alert_id):
     if alert.user_id != uid:
         return jsonify({'error': 'Forbidden'}), 403
     alert.is_read = True
+    alert.dedupe_key = None
     db.session.commit()
     return jsonify({'message': 'marked read'})
 
@@ -34,6 +92,76 @@ def mark_read(alert_id):
 @jwt_required()
 def mark_all_read():
     uid = int(get_jwt_identity())
-    Alert.query.filter_by(user_id=uid, is_read=False).update({'is_read': True})
+    Alert.query.filter_by(user_id=uid, is_read=False).update({'is_read': True, 'dedupe_key': None})
+    touch(db.session, user_ids=[uid])
     db.session.commit()
-    return jsonify({'message': 'all read'})
\ No newline at end of file
+    return jsonify({'message': 'all read'})
+
+
+def _sse(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {event}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+def _alerts_after(uid, last_id):
+    return Alert.query.filter(Alert.user_id == uid, Alert.id > last_id).order_by(Alert.id).all()
+
+
+@alerts_bp.route('/stream', methods=['GET'])
+# EventSource cannot send headers, so this one endpoint also takes ?jwt=<token>
+@jwt_required(locations=['headers', 'query_string'])
+def stream_alerts():
+    """
+    Server-sent events: `alert` for each new alert of the user (id = alert id),
+    `patient_update` when a linked patient gets one (caregivers only).
+    Resumes after the Last-Event-ID header or ?last_event_id=; without one
+    the stream starts with alerts created from now on.
+    """
+    uid = int(get_jwt_identity())
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_id is not None:
+        try:
+            last_id = int(last_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    else:
+        last_id = db.session.execute(
+            db.select(db.func.max(Alert.id)).where(Alert.user_id == uid)
+        ).scalar() or 0
+    # Linked patients are resolved once per connection; EventSource reconnects pick up new links
+    patient_ids = set(db.session.execute(
+        db.select(CaregiverLink.patient_id).where(CaregiverLink.caregiver_id == uid)
+    ).scalars())
+    # Don't hold a pooled connection while the stream sits idle
+    db.session.close()
+    relay.start(current_app._get_current_object())
+
+    def generate():
+        nonlocal last_id
+        sub = alert_bus.subscribe({uid} | patient_ids)
+        try:
+            yield 'retry: 5000\n\n'
+            changed = {uid}
+            last_query = time.monotonic()
+            while True:
+                catchup = ALERT_STREAM_CATCHUP_SECONDS and time.monotonic() - last_query >= ALERT_STREAM_CATCHUP_SECONDS
+                if uid in changed or catchup:
+                    last_query = time.monotonic()
+                    alerts = _alerts_after(uid, last_id)
+                    db.session.close()
+                    for alert in alerts:
+                        last_id = alert.id
+                        yield _sse('alert', alert.to_dict(), alert.id)
+                for patient_id in sorted(changed & patient_ids):
+                    yield _sse('patient_update', {'patient_id': patient_id})
+                changed = sub.wait(ALERT_STREAM_HEARTBEAT_SECONDS)
+                if not changed:
+                    yield ': keepalive\n\n'
+        finally:
+            alert_bus.unsubscribe(sub)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
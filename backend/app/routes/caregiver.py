@@ -3,6 +3,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from ..models import User, CaregiverLink, Medication, DoseLog, Alert
 from .. import db
+from ..services.adherence import compliance_by_patient
+from ..services.data_version import make_etag, conditional_json
+from .. import serializers
 
 caregiver_bp = Blueprint('caregiver', __name__)
 
@@ -26,57 +29,116 @@ def link_patient():
     return jsonify({'message': f'Linked to patient {patient.name}', 'patient': patient.to_dict()}), 201
 
 
+def _patient_status(compliance, critical_alerts, missed_recent, low_stock):
+    return 'red' if (critical_alerts or compliance < 60) else \
+           'yellow' if (missed_recent or low_stock or compliance < 80) else 'green'
+
+
 @caregiver_bp.route('/patients', methods=['GET'])
 @jwt_required()
 def get_patients():
+    """
+    Dashboard summary for every linked patient, built from grouped aggregates
+    so the number of queries doesn't grow with the number of patients.
+
+    Optional query params:
+      compliance_days - compliance window in days (default 7)
+      status - comma-separated status colours to keep (red, yellow, green)
+      limit  - page size; the response then carries an X-Next-Cursor header
+      cursor - X-Next-Cursor value of the previous page
+
+    Carries an ETag built from the linked patients' data versions and answers
+    If-None-Match with 304.
+    """
     uid = int(get_jwt_identity())
     user = User.query.get(uid)
     if user.role != 'caregiver':
         return jsonify({'error': 'Caregivers only'}), 403
 
-    links = CaregiverLink.query.filter_by(caregiver_id=uid).all()
-    result = []
-
-    for link in links:
-        patient = User.query.get(link.patient_id)
-        meds = Medication.query.filter_by(patient_id=patient.id, is_active=True).all()
-
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        all_logs = DoseLog.query.join(Medication).filter(
-            Medication.patient_id == patient.id,
-            DoseLog.created_at >= week_ago
-        ).all()
-
-        total = len(all_logs)
-        taken = sum(1 for l in all_logs if l.status == 'taken')
-        compliance = round((taken / total * 100) if total > 0 else 100, 1)
-
-        active_alerts = Alert.query.filter_by(user_id=patient.id, is_read=False).all()
-        critical_alerts = [a for a in active_alerts if a.severity == 'critical']
-        low_stock = [m for m in meds if m.current_stock <= m.stock_threshold]
-
-        two_hours_ago = datetime.utcnow() - timedelta(hours=2)
-        missed_recent = DoseLog.query.join(Medication).filter(
-            Medication.patient_id == patient.id,
-            DoseLog.status == 'missed',
-            DoseLog.created_at >= two_hours_ago
-        ).first()
-
-        status = 'red' if (critical_alerts or compliance < 60) else \
-                 'yellow' if (missed_recent or low_stock or compliance < 80) else 'green'
-
-        result.append({
-            'patient': patient.to_dict(),
-            'medications': [m.to_dict() for m in meds],
-            'compliance_percent': compliance,
-            'active_alerts': [a.to_dict() for a in active_alerts],
-            'critical_alert_count': len(critical_alerts),
-            'low_stock_meds': [m.name for m in low_stock],
-            'has_missed_dose': missed_recent is not None,
-            'status': status
-        })
-
-    return jsonify(result)
+    # Linked patients and their data versions; the query string selects the view
+    linked = db.session.execute(
+        db.select(CaregiverLink.patient_id, User.data_version)
+        .join(User, User.id == CaregiverLink.patient_id)
+        .where(CaregiverLink.caregiver_id == uid)
+        .order_by(CaregiverLink.patient_id)
+    ).all()
+    etag = make_etag('caregiver-patients', uid, tuple(map(tuple, linked)), request.query_string, clock=True)
+    return conditional_json(etag, lambda: _patient_summaries(uid))
+
+
+def _patient_summaries(uid):
+    status_filter = {s for s in request.args.get('status', '').split(',') if s}
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor', 0, type=int)
+
+    patient_ids = db.select(CaregiverLink.patient_id).where(CaregiverLink.caregiver_id == uid).scalar_subquery()
+    now = datetime.utcnow()
+
+    compliance = compliance_by_patient(patient_ids, request.args.get('compliance_days', 7, type=int))
+    critical_counts = dict(db.session.execute(
+        db.select(Alert.user_id, db.func.count(Alert.id))
+        .where(Alert.user_id.in_(patient_ids), Alert.is_read == False, Alert.severity == 'critical')
+        .group_by(Alert.user_id)
+    ).all())
+    low_stock = {}
+    for pid, name in db.session.execute(
+        db.select(Medication.patient_id, Medication.name)
+        .where(Medication.patient_id.in_(patient_ids), Medication.is_active == True,
+               Medication.current_stock <= Medication.stock_threshold)
+        .order_by(Medication.id)
+    ).all():
+        low_stock.setdefault(pid, []).append(name)
+    missed_recent = set(db.session.execute(
+        db.select(Medication.patient_id).distinct()
+        .join(DoseLog, DoseLog.medication_id == Medication.id)
+        .where(Medication.patient_id.in_(patient_ids), DoseLog.status == 'missed',
+               DoseLog.created_at >= now - timedelta(hours=2))
+    ).scalars())
+
+    # Status is derived from the aggregates above, so filtering and paging
+    # happen before any per-patient rows are loaded.
+    summaries = []
+    for pid in db.session.execute(
+        db.select(CaregiverLink.patient_id).distinct()
+        .where(CaregiverLink.caregiver_id == uid, CaregiverLink.patient_id > cursor)
+        .order_by(CaregiverLink.patient_id)
+    ).scalars():
+        pct = compliance.get(pid, 100)
+        status = _patient_status(pct, critical_counts.get(pid), pid in missed_recent, low_stock.get(pid))
+        if status_filter and status not in status_filter:
+            continue
+        summaries.append((pid, pct, status))
+        if limit and len(summaries) > limit:
+            break
+
+    next_cursor = None
+    if limit and len(summaries) > limit:
+        summaries = summaries[:limit]
+        next_cursor = summaries[-1][0]
+
+    page_ids = [pid for pid, _, _ in summaries]
+    patients = serializers.users(page_ids)
+    meds, alerts = {}, {}
+    for m in serializers.medications(Medication.patient_id.in_(page_ids), Medication.is_active == True,
+                                     include_label=serializers.wants_label(request.args)):
+        meds.setdefault(m['patient_id'], []).append(m)
+    for a in serializers.alerts(serializers.ALERT.select()
+                                .where(Alert.user_id.in_(page_ids), Alert.is_read == False).order_by(Alert.id)):
+        alerts.setdefault(a['user_id'], []).append(a)
+
+    result = [{
+        'patient': patients[pid],
+        'medications': meds.get(pid, []),
+        'compliance_percent': pct,
+        'active_alerts': alerts.get(pid, []),
+        'critical_alert_count': critical_counts.get(pid, 0),
+        'low_stock_meds': low_stock.get(pid, []),
+        'has_missed_dose': pid in missed_recent,
+        'status': status
+    } for pid, pct, status in summaries if pid in patients]
+
+    headers = {'X-Next-Cursor': str(next_cursor)} if next_cursor is not None else {}
+    return result, 200, headers
 
 
 @caregiver_bp.route('/patient-profile/<int:patient_id>', methods=['GET'])
@@ -95,33 +157,32 @@ def get_patient_profile(patient_id):
     if not link:
         return jsonify({'error': 'Not authorised to view this patient'}), 403
 
-    patient = User.query.get_or_404(patient_id)
-    meds = Medication.query.filter_by(patient_id=patient_id, is_active=True).all()
+    patient = serializers.users([patient_id]).get(patient_id)
+    if patient is None:
+        return jsonify({'error': 'Patient not found'}), 404
+    meds = serializers.medications(Medication.patient_id == patient_id, Medication.is_active == True,
+                                   include_label=serializers.wants_label(request.args))
 
-    # Compliance (last 7 days)
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    all_logs = DoseLog.query.join(Medication).filter(
-        Medication.patient_id == patient_id,
-        DoseLog.created_at >= week_ago
-    ).all()
-    total = len(all_logs)
-    taken = sum(1 for l in all_logs if l.status == 'taken')
-    compliance = round((taken / total * 100) if total > 0 else 100, 1)
+    # Compliance (last 7 days unless ?compliance_days= says otherwise)
+    days = request.args.get('compliance_days', 7, type=int)
+    compliance = compliance_by_patient([patient_id], days).get(patient_id, 100)
 
-    # Recent dose history (last 20 logs across all meds)
-    dose_history = DoseLog.query.join(Medication).filter(
-        Medication.patient_id == patient_id
-    ).order_by(DoseLog.created_at.desc()).limit(20).all()
+    # Recent dose history (last 20 logs across all meds), medication name joined in
+    dose_history = serializers.dose_logs(
+        serializers.dose_log_select().where(Medication.patient_id == patient_id)
+        .order_by(DoseLog.created_at.desc()).limit(20)
+    )
 
     # Active alerts
-    active_alerts = Alert.query.filter_by(
-        user_id=patient_id, is_read=False
-    ).order_by(Alert.created_at.desc()).all()
-
-    return jsonify({
-        'patient': patient.to_dict(),
-        'medications': [m.to_dict() for m in meds],
+    active_alerts = serializers.alerts(
+        serializers.ALERT.select().where(Alert.user_id == patient_id, Alert.is_read == False)
+        .order_by(Alert.created_at.desc())
+    )
+
+    return serializers.json_response({
+        'patient': patient,
+        'medications': meds,
         'compliance_percent': compliance,
-        'dose_history': [d.to_dict() for d in dose_history],
-        'active_alerts': [a.to_dict() for a in active_alerts],
+        'dose_history': dose_history,
+        'active_alerts': active_alerts,
     })
\ No newline at end of file
@@ -3,6 +3,11 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from ..models import Medication, DoseLog, Alert, User, CaregiverLink
 from .. import db
+from ..tasks import dose_timer, alert_if_stock_crossed
+from ..services import adherence
+from ..services import pharmacokinetics
+from ..services.dose_batch import log_doses, DOSE_BATCH_MAX_ITEMS
+from .. import serializers
 
 dose_bp = Blueprint('doses', __name__)
 
@@ -17,50 +22,88 @@ def log_dose(med_id):
     status = data.get('status', 'taken')
 
     if status == 'taken':
+        previous_stock = med.current_stock
         med.next_dose_time = taken_time + timedelta(hours=med.frequency_hours)
         med.current_stock = max(0, med.current_stock - med.dose_amount)
+        med.record_taken(taken_time)
+        alert_if_stock_crossed(med, previous_stock)
 
     log = DoseLog(
         medication_id=med_id,
         scheduled_time=scheduled_time,
         taken_time=taken_time if status == 'taken' else None,
         status=status,
-        notes=data.get('notes', '')
+        notes=data.get('notes', ''),
+        created_at=taken_time
     )
     db.session.add(log)
+    adherence.record_doses([(med.id, med.patient_id, taken_time.date(), status)])
     db.session.commit()
+    dose_timer.schedule(med.id, med.next_dose_time)
     return jsonify(log.to_dict()), 201
 
 
+@dose_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def log_dose_batch():
+    """
+    Log many dose events in one transaction, e.g. replayed by a client that
+    was offline. Body: {"doses": [{"medication_id", "idempotency_key",
+    "taken_time" (ISO 8601, default now), "status" (taken / missed / skipped),
+    "scheduled_time", "notes"}, ...]}. Resending a key already logged for
+    that medication returns the stored log instead of logging it again.
+    Responds 200 with one result per item, in request order.
+    """
+    uid = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+    doses = data.get('doses')
+    if not isinstance(doses, list) or not doses:
+        return jsonify({'error': 'doses must be a non-empty list'}), 400
+    if len(doses) > DOSE_BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {DOSE_BATCH_MAX_ITEMS} doses per batch'}), 413
+    results = log_doses(uid, doses)
+    return serializers.json_response({
+        'results': results,
+        'created': sum(1 for r in results if r['result'] == 'created'),
+        'duplicates': sum(1 for r in results if r['result'] == 'duplicate'),
+        'errors': sum(1 for r in results if r['result'] == 'error'),
+    })
+
+
 @dose_bp.route('/<int:med_id>/history', methods=['GET'])
 @jwt_required()
 def dose_history(med_id):
-    logs = DoseLog.query.filter_by(medication_id=med_id).order_by(DoseLog.created_at.desc()).limit(30).all()
-    return jsonify([l.to_dict() for l in logs])
+    return serializers.json_response(serializers.dose_logs(
+        serializers.dose_log_select().where(DoseLog.medication_id == med_id)
+        .order_by(DoseLog.created_at.desc()).limit(30)
+    ))
 
 
 @dose_bp.route('/<int:med_id>/concentration', methods=['GET'])
 @jwt_required()
 def concentration_curve(med_id):
+    """
+    Concentration curve from the logged doses plus the doses still scheduled.
+    Optional query params (defaults: two dosing intervals either side of now):
+      history_hours, horizon_hours - window before / after now
+      resolution_minutes - spacing of the points
+    """
     med = Medication.query.get_or_404(med_id)
-    half_life = med.half_life_hours
-    initial_concentration = 100.0
-
-    accumulation = []
-    c_accum = 0
-    for dose_num in range(3):
-        for h in range(int(med.frequency_hours) + 1):
-            t = dose_num * med.frequency_hours + h
-            c_from_this_dose = initial_concentration * (0.5 ** (h / half_life))
-            residual = c_accum * (0.5 ** (h / half_life)) if dose_num > 0 else 0
-            total = c_from_this_dose + residual
-            accumulation.append({'time': round(t, 1), 'concentration': round(total, 2)})
-        if dose_num < 2:
-            c_accum = accumulation[-1]['concentration']
+    if not med.half_life_hours or med.half_life_hours <= 0:
+        return jsonify({'error': 'Medication has no half-life'}), 400
+    try:
+        profile = pharmacokinetics.medication_profile(
+            med, datetime.utcnow(),
+            history_hours=request.args.get('history_hours', type=float),
+            horizon_hours=request.args.get('horizon_hours', type=float),
+            resolution_minutes=request.args.get('resolution_minutes', type=float)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     return jsonify({
-        'accumulation': accumulation,
-        'half_life': half_life,
+        **profile,
+        'half_life': med.half_life_hours,
         'frequency_hours': med.frequency_hours,
         'next_dose_time': med.next_dose_time.isoformat() if med.next_dose_time else None
-    })
\ No newline at end of file
+    })
@@ -1,9 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, abort
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime, timedelta
-from ..models import Medication, User, Alert
+from datetime import datetime
+from ..models import Medication, User, CaregiverLink
 from .. import db
 from ..services.drug_api import get_rxcui, check_drug_interactions, fetch_fda_drug_info, check_pharmacokinetic_interactions
+from ..services.cache import cache_stats
+from ..services import upstream
+from ..services.medication_pipeline import AddMedicationPipeline
+from ..services.data_version import versions, make_etag, conditional_json
+from .. import serializers
+from ..services import pharmacokinetics
+from ..services.pk_overlaps import find_pk_overlaps
+from ..services.interaction_matrix import interaction_matrix
+from ..services.enrichment import label_status
+from ..tasks import dose_timer, alert_if_stock_crossed
 
 med_bp = Blueprint('medications', __name__)
 
@@ -15,13 +25,32 @@ def _get_patient_id(current_user_id, patient_id_param=None):
     return current_user_id
 
 
+def _accessible_medication(current_user_id, med_id):
+    """The medication if the user is its patient or a linked caregiver, else None."""
+    med = db.session.get(Medication, med_id)
+    if med is None:
+        return None
+    if med.patient_id == current_user_id or CaregiverLink.query.filter_by(
+            caregiver_id=current_user_id, patient_id=med.patient_id).first():
+        return med
+    return None
+
+
 @med_bp.route('/', methods=['GET'])
 @jwt_required()
 def list_medications():
     uid = int(get_jwt_identity())
     patient_id = _get_patient_id(uid, request.args.get('patient_id'))
-    meds = Medication.query.filter_by(patient_id=patient_id, is_active=True).all()
-    return jsonify([m.to_dict() for m in meds])
+    include_label = serializers.wants_label(request.args)
+
+    def build():
+        return serializers.medications(
+            Medication.patient_id == patient_id, Medication.is_active == True, include_label=include_label
+        ), 200
+
+    return conditional_json(
+        make_etag('meds', patient_id, versions([patient_id]).get(patient_id), include_label), build
+    )
 
 
 @med_bp.route('/', methods=['POST'])
@@ -31,132 +60,43 @@ def add_medication():
     data = request.get_json()
     patient_id = _get_patient_id(uid, data.get('patient_id'))
 
-    rxcui = get_rxcui(data['name'])
-    
-    # Get existing medications to check interactions
-    existing = Medication.query.filter_by(patient_id=patient_id, is_active=True).all()
-    
-    # Check 1: RxNav drug interaction database
-    if rxcui:
-        existing_cuis = [m.rxcui for m in existing if m.rxcui]
-        if existing_cuis:
-            interaction_result = check_drug_interactions(rxcui, existing_cuis)
-            if interaction_result.get('has_critical'):
-                critical = interaction_result['critical_interactions']
-                
-                # Create a critical alert for the patient
-                alert = Alert(
-                    user_id=patient_id,
-                    type='drug_interaction',
-                    severity='critical',
-                    title=f'CRITICAL: Cannot add {data["name"]}',
-                    message=f'This medication has a HIGH-SEVERITY interaction with your current medications: {", ".join([c["drugs"][0] if c.get("drugs") else "" for c in critical[:2]])}. Please consult with your healthcare provider.',
-                    is_read=False
-                )
-                db.session.add(alert)
-                db.session.commit()
-                
-                return jsonify({
-                    'error': 'FATAL_INTERACTION_BLOCKED',
-                    'message': 'This medication has been BLOCKED due to a high-severity drug interaction.',
-                    'interactions': critical
-                }), 409
-    
-    # Check 2: Pharmacokinetic overlap (active time window collision)
-    if existing:
-        # Create temporary medication object for checking
-        temp_med = Medication(
-            name=data['name'],
-            half_life_hours=float(data.get('half_life_hours', 6.0))
-        )
-        pk_interactions = check_pharmacokinetic_interactions(temp_med, existing)
-        if pk_interactions:
-            pk_critical = pk_interactions
-            
-            # Create a critical alert for pharmacokinetic interaction
-            alert = Alert(
-                user_id=patient_id,
-                type='drug_interaction',
-                severity='critical',
-                title=f'CRITICAL: Cannot add {data["name"]}',
-                message=f'This medication will be active in your body at the same time as {", ".join([i["med2"] for i in pk_critical])}. This combination is dangerous. Please consult with your healthcare provider.',
-                is_read=False
-            )
-            db.session.add(alert)
-            db.session.commit()
-            
-            return jsonify({
-                'error': 'FATAL_INTERACTION_BLOCKED',
-                'message': 'This medication has been BLOCKED due to pharmacokinetic overlap with active medications.',
-                'interactions': pk_critical
-            }), 409
-
-    fda_info = fetch_fda_drug_info(data['name'])
-    next_dose = datetime.utcnow() + timedelta(hours=1)
-
-    med = Medication(
-        patient_id=patient_id,
-        name=data['name'],
-        rxcui=rxcui,
-        form=data.get('form', 'pill'),
-        dose_amount=float(data['dose_amount']),
-        dose_unit=data.get('dose_unit', 'mg'),
-        frequency_hours=float(data['frequency_hours']),
-        half_life_hours=float(data.get('half_life_hours', 6.0)),
-        current_stock=float(data['current_stock']),
-        stock_threshold=float(data.get('stock_threshold', 5.0)),
-        next_dose_time=next_dose,
-        description=fda_info.get('description', ''),
-        side_effects=fda_info.get('side_effects', ''),
-        boxed_warnings=fda_info.get('boxed_warnings', '')
-    )
-    db.session.add(med)
-    
-    # Create a warning alert if there are any interactions (even non-critical)
-    if rxcui:
-        existing = Medication.query.filter_by(patient_id=patient_id, is_active=True).all()
-        existing_cuis = [m.rxcui for m in existing if m.rxcui]
-        if existing_cuis:
-            interaction_result = check_drug_interactions(rxcui, existing_cuis)
-            all_interactions = interaction_result.get('all_interactions', [])
-            if all_interactions:
-                for interaction in all_interactions:
-                    if not interaction.get('is_critical'):  # Only warn about non-critical ones here
-                        alert = Alert(
-                            user_id=patient_id,
-                            type='drug_interaction',
-                            severity='warning',
-                            title=f'Drug Interaction: {data["name"]}',
-                            message=f'Moderate interaction detected: {interaction.get("description", "")}. Monitor for side effects.',
-                            is_read=False
-                        )
-                        db.session.add(alert)
-                        break  # Only create one warning alert per medication
-    
-    db.session.commit()
-    return jsonify(med.to_dict()), 201
+    pipeline = AddMedicationPipeline(patient_id, data)
+    body, status = pipeline.run()
+    response = jsonify(body)
+    response.status_code = status
+    response.headers['Server-Timing'] = pipeline.timer.server_timing()
+    if 'retry_after' in body:
+        response.headers['Retry-After'] = str(body['retry_after'])
+    return response
 
 
 @med_bp.route('/<int:med_id>', methods=['PUT'])
 @jwt_required()
 def update_medication(med_id):
-    med = Medication.query.get_or_404(med_id)
+    med = _accessible_medication(int(get_jwt_identity()), med_id) or abort(404)
     data = request.get_json()
+    if 'frequency_hours' in data and float(data['frequency_hours']) <= 0:
+        return jsonify({'error': 'frequency_hours must be greater than 0'}), 400
+    previous_stock, previous_threshold = med.current_stock, med.stock_threshold
     for field in ['dose_amount', 'frequency_hours', 'half_life_hours', 'current_stock', 'stock_threshold']:
         if field in data:
             setattr(med, field, float(data[field]))
     if 'name' in data:
         med.name = data['name']
+    alert_if_stock_crossed(med, previous_stock, previous_threshold)
     db.session.commit()
+    if med.is_active:
+        dose_timer.schedule(med.id, med.next_dose_time)
     return jsonify(med.to_dict())
 
 
 @med_bp.route('/<int:med_id>', methods=['DELETE'])
 @jwt_required()
 def delete_medication(med_id):
-    med = Medication.query.get_or_404(med_id)
+    med = _accessible_medication(int(get_jwt_identity()), med_id) or abort(404)
     med.is_active = False
     db.session.commit()
+    dose_timer.cancel(med.id)
     return jsonify({'message': 'Medication deactivated'})
 
 
@@ -166,33 +106,88 @@ def check_pk_overlaps():
     """Check for pharmacokinetic overlaps among all current medications"""
     uid = int(get_jwt_identity())
     patient_id = _get_patient_id(uid, request.args.get('patient_id'))
-    
-    meds = Medication.query.filter_by(patient_id=patient_id, is_active=True).all()
-    
-    if len(meds) < 2:
-        return jsonify({
-            'has_overlaps': False,
-            'overlaps': [],
-            'message': 'Need at least 2 medications to check for overlaps'
-        }), 200
-    
-    overlaps = []
-    
-    # Check each pair of medications
-    for i in range(len(meds)):
-        for j in range(i + 1, len(meds)):
-            med1 = meds[i]
-            med2 = meds[j]
-            
-            pk_intrs = check_pharmacokinetic_interactions(med1, [med2])
-            if pk_intrs:
-                overlaps.extend(pk_intrs)
-    
+
+    def build():
+        meds = Medication.query.filter_by(patient_id=patient_id, is_active=True).all()
+
+        if len(meds) < 2:
+            return {
+                'has_overlaps': False,
+                'overlaps': [],
+                'message': 'Need at least 2 medications to check for overlaps'
+            }, 200
+
+        overlaps = find_pk_overlaps(meds)
+        return {
+            'has_overlaps': len(overlaps) > 0,
+            'overlaps': overlaps,
+            'message': f'Found {len(overlaps)} pharmacokinetic overlap(s)' if overlaps else 'No overlaps detected'
+        }, 200
+
+    # PK windows are measured from now, so the ETag also rolls over with the clock
+    return conditional_json(
+        make_etag('pk-overlaps', patient_id, versions([patient_id]).get(patient_id), clock=True), build
+    )
+
+
+@med_bp.route('/interaction-matrix', methods=['GET'])
+@jwt_required()
+def get_interaction_matrix():
+    """Interactions between every pair of active medications (RxNav / local store plus PK overlap)"""
+    uid = int(get_jwt_identity())
+    patient_id = _get_patient_id(uid, request.args.get('patient_id'))
+    meds = Medication.query.filter_by(patient_id=patient_id, is_active=True).order_by(Medication.id).all()
+    result = interaction_matrix(meds)
+    critical = sum(p['is_critical'] for p in result['pairs'])
+    warnings = len(result['pairs']) - critical
+    result['message'] = (f'Found {critical} critical and {warnings} warning interaction(s)'
+                         if result['pairs'] else 'No interactions found')
+    return jsonify(result)
+
+
+@med_bp.route('/concentration-curves', methods=['GET'])
+@jwt_required()
+def concentration_curves():
+    """
+    Concentration curves for all active medications on one shared time axis,
+    plus the combined overlay. Takes the same window params as
+    /api/doses/<id>/concentration.
+    """
+    uid = int(get_jwt_identity())
+    patient_id = _get_patient_id(uid, request.args.get('patient_id'))
+    meds = Medication.query.filter_by(patient_id=patient_id, is_active=True).order_by(Medication.id).all()
+    try:
+        curves, combined, window = pharmacokinetics.regimen_profiles(
+            meds, datetime.utcnow(),
+            history_hours=request.args.get('history_hours', type=float),
+            horizon_hours=request.args.get('horizon_hours', type=float),
+            resolution_minutes=request.args.get('resolution_minutes', type=float)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     return jsonify({
-        'has_overlaps': len(overlaps) > 0,
-        'overlaps': overlaps,
-        'message': f'Found {len(overlaps)} pharmacokinetic overlap(s)' if overlaps else 'No overlaps detected'
-    }), 200
+        'medications': [{
+            **profile,
+            'medication_id': med.id,
+            'name': med.name,
+            'half_life': med.half_life_hours,
+            'frequency_hours': med.frequency_hours,
+            'next_dose_time': med.next_dose_time.isoformat() if med.next_dose_time else None
+        } for med, profile in curves],
+        'combined': combined,
+        **window
+    })
+
+
+@med_bp.route('/<int:med_id>/label', methods=['GET'])
+@jwt_required()
+def medication_label(med_id):
+    """FDA label enrichment status for a medication; the label fields once it is no longer pending."""
+    body = label_status(med_id) if _accessible_medication(int(get_jwt_identity()), med_id) else None
+    if body is None:
+        return jsonify({'error': 'Medication not found'}), 404
+    return jsonify(body)
 
 
 @med_bp.route('/fda-info', methods=['GET'])
@@ -206,6 +201,20 @@ def fda_lookup():
     return jsonify({**info, 'rxcui': rxcui})
 
 
+@med_bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def drug_cache_stats():
+    """Hit/miss counters for the drug lookup cache in this worker"""
+    return jsonify(cache_stats())
+
+
+@med_bp.route('/upstream-stats', methods=['GET'])
+@jwt_required()
+def upstream_stats():
+    """Per-host request counts, errors, circuit breaker state and latency percentiles in this worker"""
+    return jsonify(upstream.stats())
+
+
 @med_bp.route('/check-interactions', methods=['POST'])
 @jwt_required()
 def check_interactions():
@@ -227,6 +236,7 @@ def check_interactions():
     # Check 1: RxNav interactions
     critical = []
     warnings = []
+    partial = False
     
     if rxcui and existing:
         existing_cuis = [m.rxcui for m in existing if m.rxcui]
@@ -235,6 +245,7 @@ def check_interactions():
             critical = interaction_result.get('critical_interactions', [])
             all_interactions = interaction_result.get('all_interactions', [])
             warnings = [i for i in all_interactions if not i.get('is_critical', False)]
+            partial = interaction_result.get('partial', False)
     
     # Check 2: Pharmacokinetic overlap
     pk_interactions = []
@@ -253,5 +264,6 @@ def check_interactions():
         'has_critical': len(all_critical) > 0,
         'critical_interactions': all_critical,
         'warnings': warnings,
+        'partial': partial,
         'message': f'Found {len(all_critical)} critical and {len(warnings)} warning interaction(s)' if all_critical or warnings else 'No interactions found'
     }), 200
\ No newline at end of file
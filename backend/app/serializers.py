@@ -0,0 +1,136 @@
+"""
+Column-projected serialisation for list endpoints.
+
+Each Projection names the columns a payload is built from. List endpoints
+select exactly those columns (joining for fields such as a dose log's
+medication name instead of lazy-loading them per row) and turn the rows into
+dicts without building ORM objects. Model.to_dict() goes through the same
+projections, so a single object and a list entry serialise identically.
+
+Medication label text (FDA description, side effects, boxed warning) is only
+included when asked for; list payloads carry has_boxed_warning instead.
+Responses are encoded with orjson when it is installed.
+"""
+from flask import Response, json
+
+from . import db
+from .models import User, UserProfile, Medication, DoseLog, Alert
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+class Projection:
+    """An ordered set of output fields, each backed by a column or SQL expression."""
+
+    def __init__(self, *columns, **expressions):
+        self.keys = [c.key for c in columns] + list(expressions)
+        self.columns = [*columns, *(expr.label(name) for name, expr in expressions.items())]
+        self._dates = [i for i, c in enumerate(self.columns) if isinstance(c.type, (db.DateTime, db.Date))]
+
+    def select(self):
+        return db.select(*self.columns)
+
+    def dump(self, row):
+        """Result row of select() (values in field order) -> JSON-ready dict."""
+        values = list(row)
+        for i in self._dates:
+            if values[i] is not None:
+                values[i] = values[i].isoformat()
+        return dict(zip(self.keys, values))
+
+    def dump_object(self, obj):
+        """Same dict from a model instance (the to_dict() path)."""
+        return self.dump([getattr(obj, key) for key in self.keys])
+
+
+_MEDICATION_COLUMNS = (
+    Medication.id, Medication.patient_id, Medication.name, Medication.rxcui, Medication.form,
+    Medication.dose_amount, Medication.dose_unit, Medication.frequency_hours, Medication.half_life_hours,
+    Medication.current_stock, Medication.stock_threshold, Medication.next_dose_time, Medication.is_active,
+    Medication.created_at, Medication.label_status,
+)
+_HAS_BOXED_WARNING = db.func.coalesce(db.func.length(Medication.boxed_warnings), 0) > 0
+
+MEDICATION = Projection(*_MEDICATION_COLUMNS, has_boxed_warning=_HAS_BOXED_WARNING)
+MEDICATION_WITH_LABEL = Projection(
+    *_MEDICATION_COLUMNS, Medication.description, Medication.side_effects, Medication.boxed_warnings,
+    has_boxed_warning=_HAS_BOXED_WARNING,
+)
+
+ALERT = Projection(
+    Alert.id, Alert.user_id, Alert.type, Alert.severity, Alert.title, Alert.message,
+    Alert.medication_id, Alert.is_read, Alert.created_at,
+)
+
+DOSE_LOG = Projection(
+    DoseLog.id, DoseLog.medication_id, DoseLog.scheduled_time, DoseLog.taken_time,
+    DoseLog.status, DoseLog.notes, DoseLog.created_at,
+    medication_name=Medication.name,
+)
+
+USER = Projection(User.id, User.email, User.name, User.role, User.created_at)
+
+USER_PROFILE = Projection(
+    UserProfile.id, UserProfile.user_id, UserProfile.age, UserProfile.height_cm, UserProfile.weight_kg,
+    UserProfile.blood_type, UserProfile.allergies, UserProfile.medical_history,
+    UserProfile.medications_history, UserProfile.emergency_contact_name,
+    UserProfile.emergency_contact_phone, UserProfile.emergency_contact_relationship,
+    UserProfile.notes, UserProfile.updated_at, UserProfile.created_at,
+)
+
+
+def medication_projection(include_label=False):
+    return MEDICATION_WITH_LABEL if include_label else MEDICATION
+
+
+def wants_label(args):
+    """?include=label on list endpoints adds the FDA label text to each medication."""
+    return 'label' in args.get('include', '').split(',')
+
+
+def medications(*criteria, include_label=False):
+    """Medication dicts matching criteria, in id order."""
+    projection = medication_projection(include_label)
+    rows = db.session.execute(projection.select().where(*criteria).order_by(Medication.id)).all()
+    return [projection.dump(r) for r in rows]
+
+
+def alerts(statement):
+    """Alert dicts for a statement built on ALERT.select()."""
+    return [ALERT.dump(r) for r in db.session.execute(statement).all()]
+
+
+def dose_log_select():
+    """DOSE_LOG columns with the medication joined in for its name."""
+    return DOSE_LOG.select().join_from(DoseLog, Medication, DoseLog.medication_id == Medication.id)
+
+
+def dose_logs(statement):
+    return [DOSE_LOG.dump(r) for r in db.session.execute(statement).all()]
+
+
+def users(user_ids):
+    """{user id: user dict with its profile (or None)}, two queries whatever the count."""
+    result = {r.id: {**USER.dump(r), 'profile': None}
+              for r in db.session.execute(USER.select().where(User.id.in_(user_ids))).all()}
+    if result:
+        for r in db.session.execute(USER_PROFILE.select().where(UserProfile.user_id.in_(list(result)))).all():
+            result[r.user_id]['profile'] = USER_PROFILE.dump(r)
+    return result
+
+
+def dumps(payload):
+    """JSON bytes for a response body."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload)
+        except TypeError:
+            pass
+    return json.dumps(payload).encode()
+
+
+def json_response(payload, status=200, headers=None):
+    return Response(dumps(payload), status=status, headers=headers, mimetype='application/json')
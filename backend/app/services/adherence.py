@@ -0,0 +1,119 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from .. import db
+from ..models import AdherenceDaily, DoseLog, Medication
+
+COUNTED_STATUSES = ('taken', 'missed', 'skipped')
+
+
+def _upsert_statement():
+    """INSERT that adds its counters onto an existing (medication_id, day) row."""
+    table = AdherenceDaily.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=['medication_id', 'day'],
+            set_={s: table.c[s] + stmt.excluded[s] for s in COUNTED_STATUSES}
+        )
+    from sqlalchemy.dialects.mysql import insert
+    stmt = insert(table)
+    return stmt.on_duplicate_key_update({s: table.c[s] + stmt.inserted[s] for s in COUNTED_STATUSES})
+
+
+def record_doses(events):
+    """
+    Add dose outcomes to the daily rollup inside the current transaction.
+    events: iterable of (medication_id, patient_id, day, status); statuses
+    outside COUNTED_STATUSES are ignored.
+    """
+    counts = Counter(
+        (med_id, patient_id, day, status)
+        for med_id, patient_id, day, status in events if status in COUNTED_STATUSES
+    )
+    rows = {}
+    for (med_id, patient_id, day, status), n in counts.items():
+        row = rows.setdefault((med_id, day), {
+            'medication_id': med_id, 'patient_id': patient_id, 'day': day,
+            'taken': 0, 'missed': 0, 'skipped': 0
+        })
+        row[status] += n
+    if rows:
+        db.session.execute(_upsert_statement(), list(rows.values()))
+
+
+def compliance_by_patient(patient_ids, days=7):
+    """
+    {patient_id: compliance %} over the last `days` calendar days (UTC),
+    today included. patient_ids may be a list or a subquery; patients
+    without logs are omitted.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = db.session.execute(
+        db.select(
+            AdherenceDaily.patient_id,
+            db.func.sum(AdherenceDaily.taken),
+            db.func.sum(AdherenceDaily.taken + AdherenceDaily.missed + AdherenceDaily.skipped)
+        )
+        .where(AdherenceDaily.patient_id.in_(patient_ids), AdherenceDaily.day >= since)
+        .group_by(AdherenceDaily.patient_id)
+    ).all()
+    return {pid: round(taken / total * 100, 1) for pid, taken, total in rows if total}
+
+
+def _counts_from_logs(executor):
+    """Recompute the rollup from dose_logs: {(medication_id, day): row dict}."""
+    rows = {}
+    for med_id, patient_id, day, status, n in executor.execute(
+        db.select(
+            DoseLog.medication_id, Medication.patient_id,
+            db.func.date(DoseLog.created_at), DoseLog.status, db.func.count(DoseLog.id)
+        )
+        .join(Medication, Medication.id == DoseLog.medication_id)
+        .where(DoseLog.status.in_(COUNTED_STATUSES))
+        .group_by(DoseLog.medication_id, Medication.patient_id, db.func.date(DoseLog.created_at), DoseLog.status)
+    ).all():
+        if isinstance(day, str):  # SQLite's date() returns text
+            day = date.fromisoformat(day)
+        row = rows.setdefault((med_id, day), {
+            'medication_id': med_id, 'patient_id': patient_id, 'day': day,
+            'taken': 0, 'missed': 0, 'skipped': 0
+        })
+        row[status] += n
+    return rows
+
+
+def backfill(conn=None):
+    """
+    Rebuild the whole rollup from dose_logs. Runs on conn's transaction when
+    given (migrations), otherwise commits db.session. Returns rows written.
+    """
+    executor = conn if conn is not None else db.session
+    rows = list(_counts_from_logs(executor).values())
+    executor.execute(db.delete(AdherenceDaily))
+    if rows:
+        executor.execute(db.insert(AdherenceDaily), rows)
+    if conn is None:
+        db.session.commit()
+    return len(rows)
+
+
+def find_inconsistencies():
+    """Compare the rollup with dose_logs. Returns [(medication_id, day, expected, actual)]."""
+    expected = _counts_from_logs(db.session)
+    actual = {
+        (r.medication_id, r.day): {'taken': r.taken, 'missed': r.missed, 'skipped': r.skipped}
+        for r in AdherenceDaily.query.all()
+    }
+    problems = []
+    for key in sorted(set(expected) | set(actual), key=lambda k: (k[0], k[1])):
+        want = {s: expected[key][s] for s in COUNTED_STATUSES} if key in expected else None
+        have = actual.get(key)
+        if want != have and not (want is None and not any(have.values())):
+            problems.append((key[0], key[1], want, have))
+    return problems
@@ -0,0 +1,183 @@
+"""
+In-process pub/sub for alert notifications.
+
+Anything that commits alert rows wakes the streams of the users those alerts
+belong to; the stream then reads the new rows by id. Only user ids travel
+over the bus, so inserts done through the ORM, Core bulk inserts and
+ON CONFLICT DO NOTHING all publish the same way, and a wake-up for a row
+that was never written just finds nothing.
+
+The bus is per process. Alerts committed by another process (the scheduler
+leader, another gunicorn worker) are relayed onto it by one poller thread
+per process, which looks for new alert ids every ALERT_BUS_RELAY_SECONDS
+while anyone is subscribed. The stream's own catch-up query covers ids
+that commit out of order.
+"""
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..models import Alert
+
+logger = logging.getLogger(__name__)
+
+# How often new alerts committed by other processes are relayed (0 = never)
+ALERT_BUS_RELAY_SECONDS = float(os.getenv('ALERT_BUS_RELAY_SECONDS', '2'))
+
+_PENDING = 'alert_bus_user_ids'
+
+
+class Subscription:
+    """Wake-ups for a set of user ids; bursts are coalesced until the next wait()."""
+
+    def __init__(self, user_ids):
+        self.user_ids = frozenset(user_ids)
+        self._changed = set()
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    def notify(self, user_ids):
+        with self._lock:
+            self._changed.update(user_ids)
+        self._event.set()
+
+    def wait(self, timeout):
+        """Block up to timeout seconds. Returns the user ids that got new alerts (may be empty)."""
+        self._event.wait(timeout)
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            self._event.clear()
+        return changed
+
+
+class AlertBus:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_ids):
+        sub = Subscription(user_ids)
+        with self._lock:
+            for uid in sub.user_ids:
+                self._subscribers.setdefault(uid, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for uid in sub.user_ids:
+                subs = self._subscribers.get(uid)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[uid]
+
+    def publish(self, user_ids):
+        by_sub = {}
+        with self._lock:
+            for uid in set(user_ids):
+                for sub in self._subscribers.get(uid, ()):
+                    by_sub.setdefault(sub, set()).add(uid)
+        for sub, uids in by_sub.items():
+            sub.notify(uids)
+
+    def __len__(self):
+        with self._lock:
+            return len({sub for subs in self._subscribers.values() for sub in subs})
+
+
+class Relay:
+    """Publishes the owners of alerts committed since the last poll, by any process."""
+
+    def __init__(self, bus, interval):
+        self.bus = bus
+        self.interval = interval
+        self.last_id = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        """Start polling on behalf of app (no-op if already running or disabled)."""
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,), name='alert-relay', daemon=True)
+            self._thread.start()
+
+    def poll(self):
+        """One round: publish users with alerts above the watermark. Returns those user ids."""
+        if self.last_id is None:
+            self.last_id = db.session.execute(db.select(db.func.max(Alert.id))).scalar() or 0
+            return set()
+        rows = db.session.execute(
+            db.select(Alert.user_id, db.func.max(Alert.id)).where(Alert.id > self.last_id).group_by(Alert.user_id)
+        ).all()
+        db.session.close()
+        if not rows:
+            return set()
+        self.last_id = max(last_id for _, last_id in rows)
+        user_ids = {uid for uid, _ in rows}
+        self.bus.publish(user_ids)
+        return user_ids
+
+    def _run(self, app):
+        while True:
+            time.sleep(self.interval)
+            if not len(self.bus):
+                # Nobody listening: start again from whatever is newest then
+                self.last_id = None
+                continue
+            try:
+                with app.app_context():
+                    self.poll()
+            except Exception as e:
+                logger.error(f"Alert relay poll failed: {e}")
+
+
+alert_bus = AlertBus()
+relay = Relay(alert_bus, ALERT_BUS_RELAY_SECONDS)
+
+
+# Collect the owners of alerts written in a transaction and publish them once it commits
+
+def _pending(session):
+    return session.info.setdefault(_PENDING, set())
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_orm_alerts(session, flush_context, instances):
+    user_ids = {obj.user_id for obj in session.new if isinstance(obj, Alert)}
+    if user_ids:
+        _pending(session).update(user_ids)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_alerts(orm_execute_state):
+    if not orm_execute_state.is_insert or orm_execute_state.bind_mapper is not Alert.__mapper__:
+        return
+    params = orm_execute_state.parameters
+    rows = params if isinstance(params, (list, tuple)) else [params or {}]
+    user_ids = {row.get('user_id') for row in rows} - {None}
+    if user_ids:
+        _pending(orm_execute_state.session).update(user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed(session):
+    user_ids = session.info.pop(_PENDING, None)
+    if user_ids:
+        try:
+            alert_bus.publish(user_ids)
+        except Exception as e:
+            logger.error(f"Alert bus publish failed: {e}")
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back(session, previous_transaction):
+    session.info.pop(_PENDING, None)
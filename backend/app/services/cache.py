@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import has_app_context
+
+logger = logging.getLogger(__name__)
+
+# Sentinel stored for lookups that resolved to "nothing" (negative caching)
+MISSING = object()
+
+DRUG_CACHE_TTL_HOURS = float(os.getenv('DRUG_CACHE_TTL_HOURS', '168'))
+DRUG_CACHE_NEGATIVE_TTL_HOURS = float(os.getenv('DRUG_CACHE_NEGATIVE_TTL_HOURS', '6'))
+DRUG_CACHE_MEMORY_SIZE = int(os.getenv('DRUG_CACHE_MEMORY_SIZE', '2048'))
+DRUG_CACHE_MEMORY_TTL_SECONDS = float(os.getenv('DRUG_CACHE_MEMORY_TTL_SECONDS', '900'))
+INTERACTION_CACHE_TTL_HOURS = float(os.getenv('INTERACTION_CACHE_TTL_HOURS', '72'))
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, maxsize=1024, ttl_seconds=900.0):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DrugCache:
+    """
+    Two-tier cache for upstream drug lookups.
+
+    Tier 1 is a per-process TTLCache; tier 2 is the drug_lookup_cache table,
+    which survives restarts and is shared by every worker. Values must be
+    JSON-serialisable. Storing MISSING records a negative result, which
+    expires after the (shorter) negative TTL.
+    """
+
+    def __init__(self, namespace, ttl_hours=DRUG_CACHE_TTL_HOURS,
+                 negative_ttl_hours=DRUG_CACHE_NEGATIVE_TTL_HOURS):
+        self.namespace = namespace
+        self.ttl = timedelta(hours=ttl_hours)
+        self.negative_ttl = timedelta(hours=negative_ttl_hours)
+        self.memory = TTLCache(DRUG_CACHE_MEMORY_SIZE, DRUG_CACHE_MEMORY_TTL_SECONDS)
+        self._stats_lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'db_hits': 0, 'negative_hits': 0, 'misses': 0, 'stores': 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.counters[name] += 1
+
+    def get_memory(self, key):
+        """Like get(), but only looks at this process's tier (no database read)."""
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            if value is MISSING:
+                self._count('negative_hits')
+        return value
+
+    def get(self, key):
+        """Return the cached value, MISSING for a cached negative, or None on a miss."""
+        value = self.get_memory(key)
+        if value is not None:
+            return value
+
+        value, expires_at = self._db_get(key)
+        if value is not None:
+            self._count('db_hits')
+            if value is MISSING:
+                self._count('negative_hits')
+            # Don't let the memory tier outlive the shared entry
+            remaining = (expires_at - datetime.utcnow()).total_seconds()
+            self.memory.set(key, value, min(self.memory.ttl_seconds, max(remaining, 0)))
+            return value
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if value is MISSING else self.ttl
+        self.memory.set(key, value, min(self.memory.ttl_seconds, ttl.total_seconds()))
+        self._db_set(key, value, datetime.utcnow() + ttl)
+        self._count('stores')
+
+    def invalidate(self, key):
+        self.memory.pop(key)
+        if not has_app_context():
+            return
+        from .. import db
+        from ..models import DrugLookupCache
+        table = DrugLookupCache.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.delete().where(
+                    (table.c.namespace == self.namespace) & (table.c.lookup_key == key)
+                ))
+        except Exception as e:
+            logger.warning(f"Drug cache invalidate failed for {self.namespace}:{key}: {e}")
+
+    def stats(self):
+        with self._stats_lock:
+            counters = dict(self.counters)
+        lookups = counters['memory_hits'] + counters['db_hits'] + counters['misses']
+        counters['hit_rate'] = round((lookups - counters['misses']) / lookups, 3) if lookups else 0.0
+        counters['memory_entries'] = len(self.memory)
+        return counters
+
+    # The shared tier uses its own connection so cache writes never commit
+    # (or roll back) whatever the calling request has pending in db.session.
+
+    def _db_get(self, key):
+        if not has_app_context():
+            return None, None
+        from .. import db
+        from ..models import DrugLookupCache
+        table = DrugLookupCache.__table__
+        try:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    table.select().where(
+                        (table.c.namespace == self.namespace) &
+                        (table.c.lookup_key == key) &
+                        (table.c.expires_at > datetime.utcnow())
+                    )
+                ).first()
+        except Exception as e:
+            logger.warning(f"Drug cache read failed for {self.namespace}:{key}: {e}")
+            return None, None
+        if row is None:
+            return None, None
+        value = MISSING if row.value is None else json.loads(row.value)
+        return value, row.expires_at
+
+    def _db_set(self, key, value, expires_at):
+        if not has_app_context():
+            return
+        from .. import db
+        from ..models import DrugLookupCache
+        table = DrugLookupCache.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.delete().where(
+                    (table.c.namespace == self.namespace) & (table.c.lookup_key == key)
+                ))
+                conn.execute(table.insert().values(
+                    namespace=self.namespace,
+                    lookup_key=key,
+                    value=None if value is MISSING else json.dumps(value),
+                    expires_at=expires_at,
+                    created_at=datetime.utcnow()
+                ))
+        except Exception as e:
+            logger.warning(f"Drug cache write failed for {self.namespace}:{key}: {e}")
+
+
+def normalize_drug_name(name: str) -> str:
+    return ' '.join((name or '').lower().split())
+
+
+def interaction_pair_key(cui_a, cui_b) -> str:
+    """Order-independent cache key for an rxcui pair"""
+    a, b = sorted((str(cui_a), str(cui_b)))
+    return f"{a}+{b}"
+
+
+rxcui_cache = DrugCache('rxcui')
+fda_info_cache = DrugCache('fda_info')
+# Values are lists of raw interaction records per unordered rxcui pair; an
+# empty list is a cached "no interaction" verdict.
+interaction_cache = DrugCache('interaction', ttl_hours=INTERACTION_CACHE_TTL_HOURS)
+
+
+def cache_stats():
+    return {c.namespace: c.stats() for c in (rxcui_cache, fda_info_cache, interaction_cache)}
@@ -0,0 +1,143 @@
+"""
+Per-patient data version (users.data_version) for conditional GETs.
+
+Every transaction that writes a patient's medications, dose logs, alerts,
+rollup rows, profile or user row bumps that patient's version once, right
+before it commits. ORM changes and Core bulk inserts / updates by primary key
+are picked up from session events; criteria updates (UPDATE ... WHERE) can't
+be inspected and must call touch() themselves.
+
+Read endpoints turn the versions into an ETag, answer If-None-Match with 304
+and keep recent payloads in a small per-process cache keyed by that ETag.
+"""
+import hashlib
+import os
+import time
+
+from flask import request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..models import User, UserProfile, Medication, DoseLog, Alert, AdherenceDaily
+from .cache import TTLCache
+from ..serializers import dumps
+
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '512'))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '300'))
+# Responses that also depend on the clock (PK windows, "missed in the last 2h",
+# compliance days) get this bucket in their ETag, so they go stale at least this often.
+ETAG_TIME_BUCKET_SECONDS = int(os.getenv('ETAG_TIME_BUCKET_SECONDS', '300'))
+
+response_cache = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS)
+
+_USERS = 'data_version_user_ids'
+_MEDICATIONS = 'data_version_medication_ids'
+
+# Mapper -> attribute naming the patient (or medication) a row belongs to
+_PATIENT_ATTR = {
+    Medication.__mapper__: 'patient_id',
+    Alert.__mapper__: 'user_id',
+    AdherenceDaily.__mapper__: 'patient_id',
+    UserProfile.__mapper__: 'user_id',
+    User.__mapper__: 'id',
+}
+
+
+def touch(session, user_ids=(), medication_ids=()):
+    """Bump these users' (and these medications' patients') versions when session commits."""
+    session.info.setdefault(_USERS, set()).update(user_ids)
+    session.info.setdefault(_MEDICATIONS, set()).update(medication_ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed(session, flush_context):
+    user_ids, medication_ids = set(), set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, DoseLog):
+            medication_ids.add(obj.medication_id)
+            continue
+        attr = _PATIENT_ATTR.get(getattr(type(obj), '__mapper__', None))
+        if attr is not None:
+            user_ids.add(getattr(obj, attr))
+    if user_ids or medication_ids:
+        touch(session, user_ids - {None}, medication_ids - {None})
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    params = orm_execute_state.parameters
+    rows = params if isinstance(params, (list, tuple)) else [params or {}]
+    if mapper is DoseLog.__mapper__:
+        touch(orm_execute_state.session, medication_ids={r.get('medication_id') for r in rows} - {None})
+    elif mapper is Medication.__mapper__ and orm_execute_state.is_update:
+        # Bulk UPDATE by primary key: rows carry the medication id
+        touch(orm_execute_state.session, medication_ids={r.get('id') for r in rows} - {None})
+    elif mapper in _PATIENT_ATTR and mapper is not User.__mapper__:
+        attr = _PATIENT_ATTR[mapper]
+        touch(orm_execute_state.session, user_ids={r.get(attr) for r in rows} - {None})
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_versions(session):
+    session.flush()
+    user_ids = session.info.pop(_USERS, set())
+    medication_ids = session.info.pop(_MEDICATIONS, set())
+    if not user_ids and not medication_ids:
+        return
+    condition = User.id.in_(user_ids)
+    if medication_ids:
+        condition = condition | User.id.in_(
+            db.select(Medication.patient_id).where(Medication.id.in_(medication_ids))
+        )
+    session.execute(
+        db.update(User).where(condition).values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back(session, previous_transaction):
+    session.info.pop(_USERS, None)
+    session.info.pop(_MEDICATIONS, None)
+
+
+def versions(user_ids):
+    """{user_id: data_version}; reads only the users table."""
+    return dict(db.session.execute(
+        db.select(User.id, User.data_version).where(User.id.in_(user_ids))
+    ).all())
+
+
+def make_etag(kind, *parts, clock=False):
+    """Opaque ETag from a response kind and whatever identifies its content (ids, versions, query args)."""
+    if clock:
+        parts += (int(time.time() // ETAG_TIME_BUCKET_SECONDS),)
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'{kind}-{digest}'
+
+
+def conditional_json(etag, build):
+    """
+    304 when the client already has etag; otherwise the cached payload for it,
+    or build() -> (body, status[, headers]) whose result is cached.
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    cached = response_cache.get(etag)
+    if cached is None:
+        body, status, *headers = build()
+        cached = (dumps(body), status, headers[0] if headers else {})
+        if status == 200:
+            response_cache.set(etag, cached)
+    data, status, headers = cached
+    response = Response(data, status=status, mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    # Let the browser keep the body but revalidate it every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,209 @@
+"""
+Batched, idempotent dose logging for clients that queue doses offline.
+
+Every item carries a client-generated idempotency key (unique per
+medication) and the time the dose was actually taken, missed or skipped.
+The whole batch is applied in one transaction: an item whose key is already
+stored is reported as a duplicate of the stored log instead of being logged
+again, so a client can resend a batch after a dropped connection.
+
+Events may arrive late and out of order. Stock goes down by one dose per new
+taken event whatever its time, the recent-dose ring keeps time order, and
+next_dose_time only moves when the batch holds a dose newer than the last
+one already recorded.
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
+
+from .. import db, serializers
+from ..models import Medication, DoseLog, CaregiverLink
+from ..tasks import dose_timer, alert_if_stock_crossed
+from . import adherence
+
+logger = logging.getLogger(__name__)
+
+DOSE_BATCH_MAX_ITEMS = int(os.getenv('DOSE_BATCH_MAX_ITEMS', '500'))
+# How far ahead of the server clock an event time may be
+DOSE_BATCH_CLOCK_SKEW_SECONDS = float(os.getenv('DOSE_BATCH_CLOCK_SKEW_SECONDS', '300'))
+DOSE_STATUSES = ('taken', 'missed', 'skipped')
+CLIENT_KEY_MAX_LENGTH = 100
+
+
+class DoseItemError(ValueError):
+    def __init__(self, message, code=400):
+        super().__init__(message)
+        self.code = code
+
+
+def _parse_time(value, field):
+    try:
+        t = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise DoseItemError(f'{field} must be an ISO 8601 timestamp')
+    if t.tzinfo is not None:
+        t = t.astimezone(timezone.utc).replace(tzinfo=None)
+    return t
+
+
+def _parse_item(item, now):
+    """(medication_id, key, time, status, scheduled_time or None, notes) for one request item."""
+    if not isinstance(item, dict):
+        raise DoseItemError('Each dose must be an object')
+    med_id = item.get('medication_id')
+    if not isinstance(med_id, int) or isinstance(med_id, bool):
+        raise DoseItemError('medication_id must be an integer')
+    key = item.get('idempotency_key')
+    if not isinstance(key, str) or not key or len(key) > CLIENT_KEY_MAX_LENGTH:
+        raise DoseItemError(f'idempotency_key must be a non-empty string of at most {CLIENT_KEY_MAX_LENGTH} characters')
+    status = item.get('status', 'taken')
+    if status not in DOSE_STATUSES:
+        raise DoseItemError(f"status must be one of {', '.join(DOSE_STATUSES)}")
+    time = _parse_time(item['taken_time'], 'taken_time') if item.get('taken_time') else now
+    if time > now + timedelta(seconds=DOSE_BATCH_CLOCK_SKEW_SECONDS):
+        raise DoseItemError('taken_time is in the future')
+    scheduled = _parse_time(item['scheduled_time'], 'scheduled_time') if item.get('scheduled_time') else None
+    return med_id, key, time, status, scheduled, item.get('notes', '')
+
+
+def _accessible_medications(uid, med_ids):
+    """({id: Medication} for med_ids, {ids uid may log doses for}). Caregivers may log for linked patients."""
+    meds = {m.id: m for m in Medication.query.filter(Medication.id.in_(med_ids)).all()}
+    linked = set(db.session.execute(
+        db.select(CaregiverLink.patient_id).where(CaregiverLink.caregiver_id == uid)
+    ).scalars())
+    allowed = {m.id for m in meds.values() if m.patient_id == uid or m.patient_id in linked}
+    return meds, allowed
+
+
+def _scheduled_time(med, ring, time, fallback):
+    """The dose slot an event answers: one interval after the previous taken dose."""
+    earlier = [t for t in ring if t < time]
+    return earlier[-1] + timedelta(hours=med.frequency_hours) if earlier else fallback or time
+
+
+def _apply_medication(med, events):
+    """Log one medication's new events (sorted by time); returns [(index, DoseLog)]."""
+    previous_stock = med.current_stock
+    previous_last = med.last_taken_time
+    fallback = med.next_dose_time
+    logged = []
+    for index, key, time, status, scheduled, notes in events:
+        log = DoseLog(
+            medication_id=med.id,
+            scheduled_time=scheduled or _scheduled_time(med, med.recent_taken(), time, fallback),
+            taken_time=time if status == 'taken' else None,
+            status=status,
+            notes=notes,
+            created_at=time,
+            client_key=key,
+        )
+        if status == 'taken':
+            med.current_stock = max(0, med.current_stock - med.dose_amount)
+            med.record_taken(time)
+        db.session.add(log)
+        logged.append((index, log))
+
+    if med.last_taken_time is not None and (previous_last is None or med.last_taken_time > previous_last):
+        med.next_dose_time = med.last_taken_time + timedelta(hours=med.frequency_hours)
+    alert_if_stock_crossed(med, previous_stock)
+    adherence.record_doses((med.id, med.patient_id, time.date(), status) for _, _, time, status, _, _ in events)
+    return logged
+
+
+def _apply(uid, parsed, results):
+    """One attempt at the whole batch inside the current transaction; returns the touched medications."""
+    meds, allowed = _accessible_medications(uid, {p[0] for p in parsed.values()})
+    for index, (med_id, *_) in parsed.items():
+        if med_id not in meds:
+            results[index] = DoseItemError('Medication not found', 404)
+        elif med_id not in allowed:
+            results[index] = DoseItemError('Not authorised to log doses for this medication', 403)
+
+    wanted = {(p[0], p[1]) for i, p in parsed.items() if i not in results}
+    stored = {}
+    if wanted:
+        for log_id, med_id, key in db.session.execute(
+            db.select(DoseLog.id, DoseLog.medication_id, DoseLog.client_key)
+            .where(DoseLog.medication_id.in_({m for m, _ in wanted}),
+                   DoseLog.client_key.in_({k for _, k in wanted}))
+        ).all():
+            stored[(med_id, key)] = log_id
+
+    first_in_batch = {}
+    pending = {}
+    for index, (med_id, key, time, status, scheduled, notes) in parsed.items():
+        if index in results:
+            continue
+        if (med_id, key) in stored:
+            results[index] = ('duplicate', stored[(med_id, key)])
+        elif (med_id, key) in first_in_batch:
+            results[index] = ('repeat', first_in_batch[(med_id, key)])
+        else:
+            first_in_batch[(med_id, key)] = index
+            pending.setdefault(med_id, []).append((index, key, time, status, scheduled, notes))
+
+    created = []
+    for med_id, events in pending.items():
+        events.sort(key=lambda e: e[2])
+        created += _apply_medication(meds[med_id], events)
+    db.session.flush()
+    for index, log in created:
+        results[index] = ('created', log.id)
+    # A key repeated within the batch is a duplicate of the log its first occurrence created
+    for index, result in results.items():
+        if isinstance(result, tuple) and result[0] == 'repeat':
+            results[index] = ('duplicate', results[result[1]][1])
+    return [meds[med_id] for med_id in pending]
+
+
+def log_doses(uid, items):
+    """
+    Apply a batch of dose events on behalf of user uid in one transaction.
+    Returns one result per item, in request order:
+    {'index', 'idempotency_key', 'result': 'created' | 'duplicate' | 'error',
+     'code', and 'log' or 'error'}.
+    """
+    now = datetime.utcnow()
+    parsed, errors = {}, {}
+    for index, item in enumerate(items):
+        try:
+            parsed[index] = _parse_item(item, now)
+        except DoseItemError as e:
+            errors[index] = e
+
+    for attempt in (1, 2):
+        results = dict(errors)
+        try:
+            touched = _apply(uid, parsed, results) if parsed else []
+            db.session.commit()
+            break
+        except IntegrityError:
+            # Another request stored one of these keys first; the retry sees it as a duplicate
+            db.session.rollback()
+            if attempt == 2:
+                raise
+    for med in touched:
+        dose_timer.schedule(med.id, med.next_dose_time)
+
+    log_ids = [r[1] for r in results.values() if isinstance(r, tuple)]
+    logs = {}
+    if log_ids:
+        logs = {log['id']: log for log in serializers.dose_logs(
+            serializers.dose_log_select().where(DoseLog.id.in_(log_ids))
+        )}
+    out = []
+    for index, item in enumerate(items):
+        result = results[index]
+        entry = {'index': index, 'idempotency_key': item.get('idempotency_key') if isinstance(item, dict) else None}
+        if isinstance(result, DoseItemError):
+            entry.update(result='error', code=result.code, error=str(result))
+        else:
+            entry.update(result=result[0], code=201 if result[0] == 'created' else 200, log=logs.get(result[1]))
+        out.append(entry)
+    created = sum(1 for e in out if e['result'] == 'created')
+    if created:
+        logger.info(f"Dose batch from user {uid}: {created} logged, {len(out) - created} duplicate or rejected")
+    return out
@@ -1,11 +1,34 @@
-import requests
+import contextvars
+import csv
+import json
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from . import upstream
+from .upstream import Deadline, DeadlineExceeded
+from .cache import rxcui_cache, fda_info_cache, interaction_cache, normalize_drug_name, interaction_pair_key, MISSING
+from .matcher import PatternMatcher
+from . import interaction_store
 
 logger = logging.getLogger(__name__)
 
-RXNAV_BASE = "https://rxnav.nlm.nih.gov/REST"
-OPENFDA_BASE = "https://api.fda.gov/drug/label.json"
+# Overridable to point at a mirror or a local stub server
+RXNAV_BASE = os.getenv('RXNAV_BASE_URL', "https://rxnav.nlm.nih.gov/REST")
+OPENFDA_BASE = os.getenv('OPENFDA_LABEL_URL', "https://api.fda.gov/drug/label.json")
+
+# Outbound HTTP goes through services/upstream.py (per-host pools, circuit breakers, deadlines)
+INTERACTION_CHECK_WORKERS = int(os.getenv('INTERACTION_CHECK_WORKERS', '8'))
+# Overall time budget for one interaction check / one name or label lookup
+INTERACTION_CHECK_DEADLINE_SECONDS = float(os.getenv('INTERACTION_CHECK_DEADLINE_SECONDS', '12'))
+DRUG_LOOKUP_DEADLINE_SECONDS = float(os.getenv('DRUG_LOOKUP_DEADLINE_SECONDS', '15'))
+
+# With RXNAV_FALLBACK=off nothing goes out to RxNav: names resolve and pairs are
+# checked against the local interaction store only (air-gapped deployments)
+RXNAV_FALLBACK = os.getenv('RXNAV_FALLBACK', 'on') != 'off'
+
+_executor = ThreadPoolExecutor(max_workers=INTERACTION_CHECK_WORKERS, thread_name_prefix='drug-api')
 
 # Clearance multiplier: medication is considered active until this many half-lives have passed
 # 5 half-lives = 97% clearance, 7 half-lives = 99% clearance
@@ -41,35 +64,119 @@ CRITICAL_DRUG_COMBOS = [
     ('haloperidol', 'antiarrhythmic'),
 ]
 
+# Optional data file of further critical pairs, one "drug1,drug2" per line
+# (CSV, '#' comments) or a JSON list of [drug1, drug2] pairs; added to the list above
+CRITICAL_COMBOS_FILE = os.getenv('CRITICAL_COMBOS_FILE', '')
 
-def get_rxcui(drug_name: str):
-    try:
-        url = f"{RXNAV_BASE}/rxcui.json"
-        r = requests.get(url, params={"name": drug_name, "allsrc": "0"}, timeout=5)
-        data = r.json()
-        cuis = data.get("idGroup", {}).get("rxnormId", [])
-        if cuis:
-            return cuis[0]
-        r2 = requests.get(f"{RXNAV_BASE}/spellingsuggestions.json", params={"name": drug_name}, timeout=5)
-        suggestions = r2.json().get("suggestionGroup", {}).get("suggestionList", {}).get("suggestion", [])
-        if suggestions:
-            r3 = requests.get(url, params={"name": suggestions[0]}, timeout=5)
-            cuis2 = r3.json().get("idGroup", {}).get("rxnormId", [])
-            return cuis2[0] if cuis2 else None
+
+def load_critical_combos(path):
+    """Lowercased (drug1, drug2) pairs from a CSV or JSON combos file."""
+    with open(path, newline='') as f:
+        if path.endswith('.json'):
+            rows = json.load(f)
+        else:
+            rows = [row for row in csv.reader(f) if row and not row[0].lstrip().startswith('#')]
+    combos = []
+    for row in rows:
+        if len(row) != 2 or not all(isinstance(d, str) and d.strip() for d in row):
+            raise ValueError(f"{path}: expected drug1,drug2 pairs, got {row!r}")
+        combos.append((row[0].strip().lower(), row[1].strip().lower()))
+    return combos
+
+
+if CRITICAL_COMBOS_FILE:
+    CRITICAL_DRUG_COMBOS = CRITICAL_DRUG_COMBOS + load_critical_combos(CRITICAL_COMBOS_FILE)
+
+# Combo member -> the members it is dangerous with
+_COMBO_PARTNERS = {}
+for _a, _b in CRITICAL_DRUG_COMBOS:
+    _COMBO_PARTNERS.setdefault(_a, set()).add(_b)
+    _COMBO_PARTNERS.setdefault(_b, set()).add(_a)
+
+# Built once: every keyword / combo member found in a text in one lookup
+_keyword_matcher = PatternMatcher(HIGH_SEVERITY_KEYWORDS)
+_combo_matcher = PatternMatcher(_COMBO_PARTNERS)
+
+
+def combo_members(drug_name):
+    """CRITICAL_DRUG_COMBOS members named in drug_name (substring match)."""
+    return frozenset(_combo_matcher.matches(drug_name))
+
+
+def combo_partners(member):
+    return _COMBO_PARTNERS.get(member, ())
+
+
+def is_critical_combo(members_a, members_b):
+    return any(_COMBO_PARTNERS[m] & members_b for m in members_a)
+
+
+class RxcuiLookupFailed(Exception):
+    """RxNav could not be reached or did not answer in time (as opposed to "no such drug")."""
+
+
+def resolve_rxcui(drug_name: str, deadline: Deadline = None):
+    """
+    RxCUI for a drug name: this process's cache first, then the local
+    interaction store (whose ids its pair keys use), then the shared cache
+    tier, then RxNav. Returns None for a name RxNav doesn't know and raises
+    RxcuiLookupFailed when the lookup itself failed.
+    """
+    key = normalize_drug_name(drug_name)
+    if not key:
+        return None
+    cached = rxcui_cache.get_memory(key)
+    if cached is not None:
+        return None if cached is MISSING else cached
+    local = interaction_store.rxcui_for_name(drug_name)
+    if local is not None:
+        rxcui_cache.memory.set(key, local)
+        return local
+    cached = rxcui_cache.get(key)
+    if cached is not None:
+        return None if cached is MISSING else cached
+    if not RXNAV_FALLBACK:
         return None
+    try:
+        rxcui = _lookup_rxcui(drug_name, deadline or Deadline(DRUG_LOOKUP_DEADLINE_SECONDS))
     except Exception as e:
+        # Upstream failures are not cached, only genuine "no such drug" answers
         logger.warning(f"RxCUI lookup failed for {drug_name}: {e}")
+        raise RxcuiLookupFailed(drug_name) from e
+    rxcui_cache.set(key, rxcui or MISSING)
+    return rxcui
+
+
+def get_rxcui(drug_name: str, deadline: Deadline = None):
+    """resolve_rxcui, with a failed lookup reported as None."""
+    try:
+        return resolve_rxcui(drug_name, deadline)
+    except RxcuiLookupFailed:
         return None
 
 
+def _lookup_rxcui(drug_name: str, deadline: Deadline):
+    url = f"{RXNAV_BASE}/rxcui.json"
+    r = upstream.get(url, params={"name": drug_name, "allsrc": "0"}, timeout=5, deadline=deadline, hedge=True)
+    r.raise_for_status()
+    cuis = r.json().get("idGroup", {}).get("rxnormId", [])
+    if cuis:
+        return cuis[0]
+    r2 = upstream.get(f"{RXNAV_BASE}/spellingsuggestions.json", params={"name": drug_name},
+                      timeout=5, deadline=deadline, hedge=True)
+    r2.raise_for_status()
+    suggestions = r2.json().get("suggestionGroup", {}).get("suggestionList", {}).get("suggestion", [])
+    if suggestions:
+        r3 = upstream.get(url, params={"name": suggestions[0]}, timeout=5, deadline=deadline, hedge=True)
+        r3.raise_for_status()
+        cuis2 = r3.json().get("idGroup", {}).get("rxnormId", [])
+        return cuis2[0] if cuis2 else None
+    return None
+
+
 def _classify_interaction(severity: str, description: str) -> bool:
-    desc_lower = description.lower()
-    sev_lower = severity.lower()
-    return (
-        sev_lower in ("high", "critical") or
-        any(kw in desc_lower for kw in HIGH_SEVERITY_KEYWORDS) or
-        any(kw in sev_lower for kw in HIGH_SEVERITY_KEYWORDS)
-    )
+    # "high" and "critical" are keywords themselves, so they cover an exact severity match too
+    return _keyword_matcher.search(description) or _keyword_matcher.search(severity)
 
 
 def calculate_drug_active_window(last_dose_time, half_life_hours):
@@ -128,32 +235,15 @@ def check_pharmacokinetic_interactions(new_medication, existing_medications):
     new_last_dose = datetime.utcnow()
     
     for existing_med in existing_medications:
-        existing_last_dose = None
-        
-        # Get the last actual dose time from DoseLog
-        if hasattr(existing_med, 'dose_logs') and existing_med.dose_logs:
-            taken_logs = [log for log in existing_med.dose_logs if log.status == 'taken']
-            if taken_logs:
-                taken_logs.sort(key=lambda x: x.taken_time or x.created_at, reverse=True)
-                existing_last_dose = taken_logs[0].taken_time or taken_logs[0].created_at
-            else:
-                existing_last_dose = existing_med.next_dose_time or datetime.utcnow()
-        else:
-            existing_last_dose = existing_med.next_dose_time or datetime.utcnow()
-        
+        # Latest taken dose, kept on the medication by log_dose
+        existing_last_dose = (getattr(existing_med, 'last_taken_time', None)
+                              or existing_med.next_dose_time or datetime.utcnow())
+
         # Check if active windows overlap
         if check_active_windows_overlap(new_last_dose, new_medication.half_life_hours, 
                                        existing_last_dose, existing_med.half_life_hours):
             # Check if this is a known critical combo
-            combo_key = (new_medication.name.lower(), existing_med.name.lower())
-            is_known_critical = False
-            for drug1, drug2 in CRITICAL_DRUG_COMBOS:
-                if ((drug1 in combo_key[0] and drug2 in combo_key[1]) or
-                    (drug2 in combo_key[0] and drug1 in combo_key[1])):
-                    is_known_critical = True
-                    break
-            
-            if is_known_critical:
+            if is_critical_combo(combo_members(new_medication.name), combo_members(existing_med.name)):
                 interactions.append({
                     'med1': new_medication.name,
                     'med2': existing_med.name,
@@ -164,96 +254,240 @@ def check_pharmacokinetic_interactions(new_medication, existing_medications):
     return interactions
 
 
-def check_drug_interactions(new_rxcui: str, existing_rxcuis: list):
+def submit(fn, *args, **kwargs):
+    """
+    Run fn on the shared drug API pool, inside the caller's app context if
+    there is one and under the caller's upstream deadline.
+    """
+    context = contextvars.copy_context()
+    if not has_app_context():
+        return _executor.submit(context.run, fn, *args, **kwargs)
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            return fn(*args, **kwargs)
+    return _executor.submit(context.run, run)
+
+
+def _parse_interaction_pairs(data):
+    """Flatten an RxNav interaction/list.json response into raw pair records."""
+    pairs = []
+    for group in data.get("fullInteractionTypeGroup", []):
+        for itype in group.get("fullInteractionType", []):
+            for pair in itype.get("interactionPair", []):
+                concepts = [c.get("minConceptItem", {}) for c in pair.get("interactionConcept", [])]
+                pairs.append({
+                    "rxcuis": [c.get("rxcui", "") for c in concepts],
+                    "severity": pair.get("severity", ""),
+                    "description": pair.get("description", ""),
+                    "drugs": [c.get("name", "") for c in concepts],
+                    "source": group.get("sourceName", ""),
+                })
+    return pairs
+
+
+def interaction_entry(raw):
+    is_crit = _classify_interaction(raw["severity"], raw["description"])
+
+    # Check if this is a known critical combo (both members named anywhere in the pair)
+    if not is_crit:
+        members = frozenset().union(*(combo_members(name) for name in raw["drugs"]))
+        is_crit = is_critical_combo(members, members)
+
+    return {"severity": raw["severity"] or ("CRITICAL" if is_crit else "N/A"),
+            "description": raw["description"], "drugs": raw["drugs"],
+            "source": raw["source"], "is_critical": is_crit}
+
+
+def check_drug_interactions(new_rxcui: str, existing_rxcuis: list, deadline: Deadline = None):
+    """
+    Check new_rxcui against the existing regimen. Pairs the local interaction
+    store covers are answered from it; the rest go to RxNav (cached) unless
+    RXNAV_FALLBACK is off. Upstream calls share one deadline; when it runs
+    out, or RxNav is off, whatever was answered is returned with "partial"
+    set and the unanswered pairs listed in "unchecked_rxcuis".
+    """
     if not existing_rxcuis or not new_rxcui:
         return {"has_critical": False, "interactions": []}
 
-    valid_existing = [c for c in existing_rxcuis if c]
+    valid_existing = list(dict.fromkeys(c for c in existing_rxcuis if c))
     if not valid_existing:
         return {"has_critical": False, "interactions": []}
 
+    verdicts, unattributed, unchecked = pair_interactions(new_rxcui, valid_existing, deadline)
+
     critical = []
     all_interactions = []
-    
-    # Get medication name for critical combo checking
-    # Note: new_rxcui is just the ID, we'll need to map it, but we can check via interactions
-    
+    seen = set()
+    for raw in [r for cui in valid_existing for r in verdicts.get(cui, [])] + unattributed:
+        # Deduplicate
+        if raw["description"] in seen:
+            continue
+        seen.add(raw["description"])
+        entry = interaction_entry(raw)
+        all_interactions.append(entry)
+        if entry["is_critical"]:
+            critical.append(entry)
+
+    return {
+        "has_critical": len(critical) > 0,
+        "critical_interactions": critical,
+        "all_interactions": all_interactions,
+        "partial": len(unchecked) > 0,
+        "unchecked_rxcuis": unchecked
+    }
+
+
+def pair_interactions(new_rxcui: str, existing_rxcuis: list, deadline: Deadline = None):
+    """
+    Raw interaction records for each (new_rxcui, existing) pair: local store
+    first, then the interaction cache, then RxNav. Returns ({existing rxcui:
+    [raw records]}, [RxNav records not attributable to one pair],
+    [existing rxcuis left without a verdict]).
+    """
+    verdicts, uncovered = interaction_store.lookup_pairs(new_rxcui, existing_rxcuis)
+
+    # Interaction verdicts are cached per unordered rxcui pair, including
+    # "no interaction" ones, so only never-seen pairs go out to RxNav.
+    uncached = []
+    for cui in uncovered:
+        cached = interaction_cache.get(interaction_pair_key(new_rxcui, cui))
+        if cached is None:
+            uncached.append(cui)
+        else:
+            verdicts[cui] = cached
+
+    unattributed = []
+    unchecked = []
+    if uncached and not RXNAV_FALLBACK:
+        unchecked = uncached
+    elif uncached:
+        fetched, unattributed, unchecked = _fetch_pair_interactions(
+            new_rxcui, uncached, deadline or Deadline(INTERACTION_CHECK_DEADLINE_SECONDS)
+        )
+        verdicts.update(fetched)
+    return verdicts, unattributed, unchecked
+
+
+def _fetch_pair_interactions(new_rxcui: str, existing_rxcuis: list, deadline: Deadline):
+    """
+    Query RxNav for (new_rxcui, existing) pairs and cache each confirmed verdict.
+
+    The bulk call and every pairwise call run concurrently on the shared worker
+    pool. Returns ({existing_rxcui: [raw pairs]}, [bulk results that could not
+    be attributed to a pair], [existing rxcuis left without a verdict]).
+    """
     url = f"{RXNAV_BASE}/interaction/list.json"
+    found = {cui: [] for cui in existing_rxcuis}
+    unattributed = []
+    unchecked = []
 
-    # Method 1: bulk check
-    all_cuis = [new_rxcui] + valid_existing
-    rxcui_str = "+".join(all_cuis)
-    try:
-        r = requests.get(url, params={"rxcuis": rxcui_str}, timeout=10)
-        data = r.json()
-        for group in data.get("fullInteractionTypeGroup", []):
-            for itype in group.get("fullInteractionType", []):
-                for pair in itype.get("interactionPair", []):
-                    sev = pair.get("severity", "")
-                    desc = pair.get("description", "")
-                    drugs = [c.get("minConceptItem", {}).get("name", "") for c in pair.get("interactionConcept", [])]
-                    is_crit = _classify_interaction(sev, desc)
-                    
-                    # Check if this is a known critical combo
-                    drug_names = [d.lower() for d in drugs]
-                    for combo in CRITICAL_DRUG_COMBOS:
-                        if (any(combo[0] in name for name in drug_names) and 
-                            any(combo[1] in name for name in drug_names)):
-                            is_crit = True
-                            break
-                    
-                    entry = {"severity": sev or "CRITICAL", "description": desc, "drugs": drugs,
-                             "source": group.get("sourceName", ""), "is_critical": is_crit}
-                    all_interactions.append(entry)
-                    if is_crit:
-                        critical.append(entry)
-    except Exception as e:
-        logger.warning(f"Bulk interaction check failed: {e}")
+    def fetch(rxcuis, timeout_cap):
+        r = upstream.get(url, params={"rxcuis": "+".join(rxcuis)}, timeout=timeout_cap, deadline=deadline, hedge=True)
+        r.raise_for_status()
+        return _parse_interaction_pairs(r.json())
 
+    # Method 1: bulk check (only worth it when more than one pair is missing)
+    bulk = None
+    if len(existing_rxcuis) > 1:
+        bulk = _executor.submit(fetch, [new_rxcui] + existing_rxcuis, 10)
     # Method 2: pairwise check (catches additional interactions)
-    for existing_cui in valid_existing:
+    pairwise = {_executor.submit(fetch, [new_rxcui, cui], 8): cui for cui in existing_rxcuis}
+
+    futures = list(pairwise) + ([bulk] if bulk else [])
+    done, not_done = wait(futures, timeout=deadline.remaining())
+    for f in not_done:
+        f.cancel()
+    if not_done:
+        logger.warning(f"Interaction check for {new_rxcui} hit its deadline with {len(not_done)} RxNav call(s) outstanding")
+
+    if bulk in done:
+        try:
+            for raw in bulk.result():
+                others = [c for c in raw["rxcuis"] if c != new_rxcui and c in found]
+                if new_rxcui in raw["rxcuis"] and others:
+                    for cui in others:
+                        found[cui].append(raw)
+                elif new_rxcui not in raw["rxcuis"] and len(raw["rxcuis"]) == 2 and all(raw["rxcuis"]):
+                    continue  # interaction between two existing meds, not ours
+                else:
+                    unattributed.append(raw)
+        except Exception as e:
+            logger.warning(f"Bulk interaction check failed: {e}")
+
+    for future, existing_cui in pairwise.items():
         try:
-            r2 = requests.get(url, params={"rxcuis": f"{new_rxcui}+{existing_cui}"}, timeout=8)
-            for group in r2.json().get("fullInteractionTypeGroup", []):
-                for itype in group.get("fullInteractionType", []):
-                    for pair in itype.get("interactionPair", []):
-                        sev = pair.get("severity", "")
-                        desc = pair.get("description", "")
-                        drugs = [c.get("minConceptItem", {}).get("name", "") for c in pair.get("interactionConcept", [])]
-                        is_crit = _classify_interaction(sev, desc)
-                        
-                        # Check if this is a known critical combo
-                        drug_names = [d.lower() for d in drugs]
-                        for combo in CRITICAL_DRUG_COMBOS:
-                            if (any(combo[0] in name for name in drug_names) and 
-                                any(combo[1] in name for name in drug_names)):
-                                is_crit = True
-                                break
-                        
-                        entry = {"severity": sev or ("CRITICAL" if is_crit else "N/A"), "description": desc, "drugs": drugs,
-                                 "source": group.get("sourceName", ""), "is_critical": is_crit}
-                        # Deduplicate
-                        if not any(e["description"] == desc for e in all_interactions):
-                            all_interactions.append(entry)
-                            if is_crit:
-                                critical.append(entry)
+            if future not in done:
+                raise DeadlineExceeded()
+            pairs = future.result()
         except Exception:
-            pass
+            # No confirmed verdict for this pair, so nothing is cached for it
+            unchecked.append(existing_cui)
+            continue
+        known = {p["description"] for p in found[existing_cui]}
+        found[existing_cui] += [p for p in pairs if p["description"] not in known]
+        interaction_cache.set(interaction_pair_key(new_rxcui, existing_cui), found[existing_cui])
+
+    return found, unattributed, unchecked
+
 
+def _generic_drug_info(drug_name: str):
     return {
-        "has_critical": len(critical) > 0,
-        "critical_interactions": critical,
-        "all_interactions": all_interactions
+        "description": f"{drug_name} is a medication. Please consult your healthcare provider for specific information about this drug.",
+        "side_effects": "",
+        "boxed_warnings": ""
     }
 
 
-def fetch_fda_drug_info(drug_name: str):
-    """Fetch drug info from multiple sources: FDA, RxNav, and Wikipedia"""
+def fetch_fda_drug_info(drug_name: str, resolve_rxcui=None):
+    """
+    Fetch drug info from multiple sources: FDA, RxNav, and Wikipedia (cached).
+    resolve_rxcui is an optional zero-argument callable used for the RxNav
+    fallback, so callers that already resolve the name don't resolve it twice.
+    """
+    return fetch_fda_label(drug_name, resolve_rxcui)[0]
+
+
+def cached_fda_drug_info(drug_name: str):
+    """fetch_fda_drug_info's answer if it is already cached, else None; never calls upstream."""
+    key = normalize_drug_name(drug_name)
+    cached = fda_info_cache.get(key) if key else None
+    if cached is None:
+        return None
+    return _generic_drug_info(drug_name) if cached is MISSING else dict(cached)
+
+
+def fetch_fda_label(drug_name: str, resolve_rxcui=None):
+    """
+    (info, final) for fetch_fda_drug_info. final is False when nothing was
+    found but a source was unavailable, so the generic text is worth a retry.
+    """
+    cached = cached_fda_drug_info(drug_name)
+    if cached is not None:
+        return cached, True
+
+    key = normalize_drug_name(drug_name)
+    info, upstream_failed = _lookup_fda_drug_info(drug_name, Deadline(DRUG_LOOKUP_DEADLINE_SECONDS), resolve_rxcui)
+    if info["description"]:
+        if key:
+            fda_info_cache.set(key, info)
+        return info, True
+
+    # Nothing found anywhere: remember that, unless a source was merely unavailable
+    if key and not upstream_failed:
+        fda_info_cache.set(key, MISSING)
+    return _generic_drug_info(drug_name), not upstream_failed
+
+
+def _lookup_fda_drug_info(drug_name: str, deadline: Deadline, resolve_rxcui=None):
+    """Walk FDA, RxNav and Wikipedia. Returns (info, upstream_failed)."""
     info = {
         "description": "",
         "side_effects": "",
         "boxed_warnings": ""
     }
+    upstream_failed = False
     
     # Try FDA database
     try:
@@ -262,7 +496,7 @@ def fetch_fda_drug_info(drug_name: str):
             f'openfda.generic_name:"{drug_name}"',
             drug_name
         ]:
-            r = requests.get(OPENFDA_BASE, params={"search": search_param, "limit": 1}, timeout=8)
+            r = upstream.get(OPENFDA_BASE, params={"search": search_param, "limit": 1}, timeout=8, deadline=deadline)
             if r.status_code == 200:
                 results = r.json().get("results", [])
                 if results:
@@ -271,22 +505,28 @@ def fetch_fda_drug_info(drug_name: str):
                     info["side_effects"] = " ".join(label.get("adverse_reactions", []))
                     info["boxed_warnings"] = " ".join(label.get("boxed_warning", []))
                     if info["description"]:  # Found it in FDA
-                        return info
+                        return info, False
+            elif r.status_code != 404:  # openFDA answers 404 for "no matches"
+                upstream_failed = True
     except Exception as e:
+        upstream_failed = True
         logger.warning(f"FDA lookup failed for {drug_name}: {e}")
     
     # If FDA didn't have it, try RxNav for drug properties
     try:
-        rxcui = get_rxcui(drug_name)
+        rxcui = resolve_rxcui() if resolve_rxcui else get_rxcui(drug_name, deadline)
         if rxcui:
             # Get drug properties from RxNav
-            r = requests.get(f"{RXNAV_BASE}/rxcui/{rxcui}/properties.json", timeout=8)
+            r = upstream.get(f"{RXNAV_BASE}/rxcui/{rxcui}/properties.json", timeout=8, deadline=deadline)
             if r.status_code == 200:
                 props = r.json().get("properties", {})
                 # Use the RxNav name as fallback
                 if not info["description"]:
                     info["description"] = f"Generic name: {props.get('name', drug_name)}. A medication used in clinical practice."
+            else:
+                upstream_failed = True
     except Exception as e:
+        upstream_failed = True
         logger.warning(f"RxNav drug properties lookup failed: {e}")
     
     # Try Wikipedia as final fallback
@@ -301,7 +541,7 @@ def fetch_fda_drug_info(drug_name: str):
                 "exsectionformat": "wiki",
                 "format": "json"
             }
-            r = requests.get(wiki_url, params=params, timeout=8)
+            r = upstream.get(wiki_url, params=params, timeout=8, deadline=deadline)
             if r.status_code == 200:
                 pages = r.json().get("query", {}).get("pages", {})
                 for page in pages.values():
@@ -310,11 +550,10 @@ def fetch_fda_drug_info(drug_name: str):
                         # Take first 500 chars
                         info["description"] = extract[:500].strip()
                         break
+            else:
+                upstream_failed = True
         except Exception as e:
+            upstream_failed = True
             logger.warning(f"Wikipedia lookup failed for {drug_name}: {e}")
     
-    # If still nothing, provide generic description
-    if not info["description"]:
-        info["description"] = f"{drug_name} is a medication. Please consult your healthcare provider for specific information about this drug."
-    
-    return info
\ No newline at end of file
+    return info, upstream_failed
@@ -0,0 +1,201 @@
+"""
+Background enrichment of medication labels.
+
+add_medication commits the medication with label_status 'pending' and an
+enrichment_jobs row in the same transaction, then hands the job to this
+process's worker pool. The worker walks the FDA / RxNav / Wikipedia lookup,
+writes the label fields and marks the medication 'ready'. While a source is
+unavailable the job is retried with exponential backoff; after
+ENRICHMENT_MAX_ATTEMPTS the generic description is kept and the medication
+is marked 'failed'.
+
+Jobs live in the database, so any process can run them: a worker claims a
+job with a conditional UPDATE, and the claim of a worker that died expires
+after ENRICHMENT_LOCK_SECONDS. poll_jobs(), registered with the scheduler,
+picks up retries, jobs left over from a restart and jobs queued by processes
+that have no pool running.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from .. import db
+from ..models import EnrichmentJob, Medication
+from .drug_api import fetch_fda_label, cached_fda_drug_info, get_rxcui, _generic_drug_info
+
+logger = logging.getLogger(__name__)
+
+ENRICHMENT_WORKERS = int(os.getenv('ENRICHMENT_WORKERS', '4'))
+ENRICHMENT_POLL_SECONDS = int(os.getenv('ENRICHMENT_POLL_SECONDS', '10'))
+ENRICHMENT_MAX_ATTEMPTS = int(os.getenv('ENRICHMENT_MAX_ATTEMPTS', '5'))
+ENRICHMENT_RETRY_BASE_SECONDS = float(os.getenv('ENRICHMENT_RETRY_BASE_SECONDS', '30'))
+ENRICHMENT_RETRY_MAX_SECONDS = float(os.getenv('ENRICHMENT_RETRY_MAX_SECONDS', '3600'))
+ENRICHMENT_LOCK_SECONDS = int(os.getenv('ENRICHMENT_LOCK_SECONDS', '120'))
+
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+_pool = ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS, thread_name_prefix='enrichment')
+# Job ids handed to the pool and not finished yet
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def fill_label(med, drug_name=None):
+    """
+    Give a new (flushed) medication its label: straight from the drug info
+    cache when it is there, otherwise mark it pending and queue a job in the
+    current transaction. Returns the job, or None.
+    """
+    cached = cached_fda_drug_info(drug_name or med.name)
+    if cached is not None:
+        _apply_label(med, cached, 'ready')
+        return None
+    med.label_status = 'pending'
+    job = EnrichmentJob(medication_id=med.id)
+    db.session.add(job)
+    return job
+
+
+def _apply_label(med, info, status):
+    med.description = info.get('description', '')
+    med.side_effects = info.get('side_effects', '')
+    med.boxed_warnings = info.get('boxed_warnings', '')
+    med.label_status = status
+
+
+def retry_delay(attempts):
+    """Backoff before attempt attempts + 1: doubling from the base, capped, with jitter."""
+    delay = min(ENRICHMENT_RETRY_MAX_SECONDS, ENRICHMENT_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def _claimable(now):
+    return (
+        ((EnrichmentJob.status == 'queued') & (EnrichmentJob.run_after <= now))
+        | ((EnrichmentJob.status == 'running') & (EnrichmentJob.locked_until < now))
+    )
+
+
+def _claim(job_id):
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        db.update(EnrichmentJob)
+        .where(EnrichmentJob.id == job_id, _claimable(now))
+        .values(status='running', attempts=EnrichmentJob.attempts + 1, locked_by=WORKER_ID,
+                locked_until=now + timedelta(seconds=ENRICHMENT_LOCK_SECONDS), updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    db.session.commit()
+    return claimed
+
+
+def run_job(job_id):
+    """Claim and run one job. Returns False if another worker has it or it isn't due."""
+    if not _claim(job_id):
+        return False
+    row = db.session.execute(
+        db.select(EnrichmentJob.medication_id, Medication.name, Medication.rxcui)
+        .join(Medication, Medication.id == EnrichmentJob.medication_id)
+        .where(EnrichmentJob.id == job_id)
+    ).first()
+    # No transaction stays open across the upstream calls
+    db.session.commit()
+
+    error = None
+    if row is None:
+        info, final = None, True
+    else:
+        try:
+            info, final = fetch_fda_label(row.name, lambda: row.rxcui or get_rxcui(row.name))
+            if not final:
+                error = 'A label source was unavailable'
+        except Exception as e:
+            info, final, error = None, False, str(e) or type(e).__name__
+
+    job = db.session.get(EnrichmentJob, job_id)
+    med = db.session.get(Medication, row.medication_id) if row is not None else None
+    if final or job.attempts >= ENRICHMENT_MAX_ATTEMPTS:
+        job.status = 'done' if final else 'failed'
+        if med is not None:
+            _apply_label(med, info or _generic_drug_info(med.name), 'ready' if final else 'failed')
+    else:
+        job.status = 'queued'
+        job.run_after = datetime.utcnow() + retry_delay(job.attempts)
+    job.last_error = error
+    job.locked_by = job.locked_until = None
+    db.session.commit()
+    if job.status == 'failed':
+        logger.warning(f"Label enrichment for medication {job.medication_id} gave up after {job.attempts} attempt(s): {error}")
+    return True
+
+
+def _run(app, job_id):
+    try:
+        with app.app_context():
+            run_job(job_id)
+    except Exception:
+        logger.exception(f"Enrichment job {job_id} failed")
+    finally:
+        with _inflight_lock:
+            _inflight.discard(job_id)
+
+
+def dispatch(app, job_ids):
+    """Hand committed jobs to this process's pool (no-op for jobs it is already running)."""
+    for job_id in job_ids:
+        with _inflight_lock:
+            if job_id in _inflight:
+                continue
+            _inflight.add(job_id)
+        _pool.submit(_run, app, job_id)
+
+
+def poll_jobs(app):
+    """Scheduler job: dispatch due jobs, as many as the pool has room for."""
+    with _inflight_lock:
+        room = ENRICHMENT_WORKERS - len(_inflight)
+        busy = set(_inflight)
+    if room <= 0:
+        return
+    due = db.session.execute(
+        db.select(EnrichmentJob.id).where(_claimable(datetime.utcnow()))
+        .order_by(EnrichmentJob.run_after).limit(room + len(busy))
+    ).scalars().all()
+    dispatch(app, [job_id for job_id in due if job_id not in busy][:room])
+
+
+def run_due_jobs():
+    """Run every due job inline in this process. Returns how many ran."""
+    ran = 0
+    for job_id in db.session.execute(
+        db.select(EnrichmentJob.id).where(_claimable(datetime.utcnow())).order_by(EnrichmentJob.run_after)
+    ).scalars().all():
+        ran += run_job(job_id)
+    return ran
+
+
+def label_status(medication_id):
+    """Label fields and the latest job's progress for one medication, or None if it doesn't exist."""
+    med = db.session.get(Medication, medication_id)
+    if med is None:
+        return None
+    job = db.session.execute(
+        db.select(EnrichmentJob).where(EnrichmentJob.medication_id == medication_id)
+        .order_by(EnrichmentJob.id.desc()).limit(1)
+    ).scalar()
+    body = {'medication_id': med.id, 'label_status': med.label_status}
+    if med.label_status != 'pending':
+        body.update(description=med.description, side_effects=med.side_effects, boxed_warnings=med.boxed_warnings)
+    if job is not None:
+        body['job'] = {
+            'status': job.status,
+            'attempts': job.attempts,
+            'max_attempts': ENRICHMENT_MAX_ATTEMPTS,
+            'next_attempt_at': job.run_after.isoformat() if job.status == 'queued' else None,
+            'last_error': job.last_error,
+        }
+    return body
@@ -0,0 +1,95 @@
+"""
+Regimen-wide interaction matrix.
+
+Every medication's RxCUI is resolved once (names without a stored RxCUI are
+looked up concurrently), each unordered pair of distinct RxCUIs is checked
+once against the interaction store / cache / RxNav, and the pharmacokinetic
+overlaps come from one sweep over the regimen. Upstream calls for the whole
+matrix share one deadline.
+"""
+from .cache import normalize_drug_name
+from .drug_api import (get_rxcui, pair_interactions, interaction_entry, submit,
+                       Deadline, INTERACTION_CHECK_DEADLINE_SECONDS)
+from .pk_overlaps import find_pk_overlaps
+
+
+def _resolve_rxcuis(meds, deadline):
+    """{medication id: rxcui or None}; each distinct unresolved name is looked up once."""
+    pending = {}
+    for med in meds:
+        key = normalize_drug_name(med.name)
+        if not med.rxcui and key and key not in pending:
+            pending[key] = submit(get_rxcui, med.name, deadline)
+    resolved = {}
+    for key, future in pending.items():
+        try:
+            resolved[key] = future.result(timeout=deadline.remaining())
+        except Exception:
+            resolved[key] = None
+    return {m.id: m.rxcui or resolved.get(normalize_drug_name(m.name)) for m in meds}
+
+
+def _pair_verdicts(cuis, deadline):
+    """({pair of rxcuis: [raw records]}, {unchecked pairs}) over each unordered pair once."""
+    verdicts, unchecked = {}, set()
+    for i, cui in enumerate(cuis[:-1]):
+        others = cuis[i + 1:]
+        found, _, missing = pair_interactions(cui, others, deadline)
+        for other in others:
+            verdicts[frozenset((cui, other))] = found.get(other, [])
+        unchecked.update(frozenset((cui, other)) for other in missing)
+    return verdicts, unchecked
+
+
+def interaction_matrix(meds):
+    """
+    Pairwise interactions across meds. Returns the medications (with their
+    rxcui), one entry per pair that interacts, and an n x n matrix of
+    'critical' / 'warning' / None in medication order.
+    """
+    deadline = Deadline(INTERACTION_CHECK_DEADLINE_SECONDS)
+    rxcuis = _resolve_rxcuis(meds, deadline)
+    cuis = sorted({c for c in rxcuis.values() if c})
+    verdicts, unchecked = _pair_verdicts(cuis, deadline)
+    overlaps = {frozenset((o['med1_id'], o['med2_id'])): o for o in find_pk_overlaps(meds)}
+
+    index = {med.id: i for i, med in enumerate(meds)}
+    matrix = [[None] * len(meds) for _ in meds]
+    pairs = []
+    unchecked_pairs = []
+    for i, med1 in enumerate(meds):
+        for med2 in meds[i + 1:]:
+            cui1, cui2 = rxcuis[med1.id], rxcuis[med2.id]
+            pair = frozenset((cui1, cui2))
+            if cui1 and cui2 and pair in unchecked:
+                unchecked_pairs.append([med1.id, med2.id])
+            seen = set()
+            entries = []
+            for raw in verdicts.get(pair, []) if cui1 != cui2 else []:
+                if raw["description"] not in seen:
+                    seen.add(raw["description"])
+                    entries.append(interaction_entry(raw))
+            overlap = overlaps.get(frozenset((med1.id, med2.id)))
+            if not entries and overlap is None:
+                continue
+            is_critical = overlap is not None or any(e["is_critical"] for e in entries)
+            severity = 'critical' if is_critical else 'warning'
+            matrix[i][index[med2.id]] = matrix[index[med2.id]][i] = severity
+            pairs.append({
+                'med1_id': med1.id, 'med2_id': med2.id,
+                'med1': med1.name, 'med2': med2.name,
+                'severity': severity,
+                'is_critical': is_critical,
+                'interactions': entries,
+                'pk_overlap': overlap,
+            })
+
+    return {
+        'medications': [{'id': m.id, 'name': m.name, 'rxcui': rxcuis[m.id]} for m in meds],
+        'pairs': pairs,
+        'matrix': matrix,
+        'has_critical': any(p['is_critical'] for p in pairs),
+        'partial': len(unchecked_pairs) > 0,
+        'unchecked_pairs': unchecked_pairs,
+        'unresolved_medication_ids': [m.id for m in meds if not rxcuis[m.id]],
+    }
@@ -0,0 +1,176 @@
+"""
+Local drug-interaction store, so interaction checks work without RxNav.
+
+`flask --app run interactions-import FILE` loads an interaction dataset into
+drug_interactions (one row per record, indexed by the unordered RxCUI pair)
+and records every RxCUI and drug name it mentions in drug_concepts.
+
+A pair whose two RxCUIs are both known to the store is answered from it
+alone: no rows means the dataset knows of no interaction. Pairs involving an
+RxCUI the dataset doesn't cover are left to RxNav (see RXNAV_FALLBACK in
+drug_api). Answers are memoised per process; an import clears the memo of
+the process that ran it, other processes pick the new data up within
+INTERACTION_STORE_CACHE_TTL_SECONDS.
+"""
+import csv
+import logging
+import os
+
+from flask import has_app_context
+
+from .. import db
+from ..models import DrugConcept, DrugInteraction
+from .cache import TTLCache, MISSING, normalize_drug_name, interaction_pair_key, rxcui_cache
+
+logger = logging.getLogger(__name__)
+
+INTERACTION_STORE_CACHE_SIZE = int(os.getenv('INTERACTION_STORE_CACHE_SIZE', '8192'))
+INTERACTION_STORE_CACHE_TTL_SECONDS = float(os.getenv('INTERACTION_STORE_CACHE_TTL_SECONDS', '3600'))
+IMPORT_BATCH_SIZE = 5000
+
+# Dataset columns; drug1 / drug2 / severity / source may be empty
+IMPORT_COLUMNS = ('rxcui1', 'rxcui2', 'drug1', 'drug2', 'severity', 'description', 'source')
+
+# Pair key -> tuple of raw records, or MISSING when the store doesn't cover the pair
+_pairs = TTLCache(INTERACTION_STORE_CACHE_SIZE, INTERACTION_STORE_CACHE_TTL_SECONDS)
+
+
+def _raw(row):
+    """A stored record in the shape drug_api._parse_interaction_pairs produces."""
+    return {
+        "rxcuis": [row.rxcui_a, row.rxcui_b],
+        "severity": row.severity or "",
+        "description": row.description,
+        "drugs": [row.drug_a or "", row.drug_b or ""],
+        "source": row.source,
+    }
+
+
+def lookup_pairs(new_rxcui, existing_rxcuis):
+    """
+    ({existing rxcui: [raw records]} for the pairs the store covers,
+    [existing rxcuis it does not cover]). Two indexed queries at most, none
+    when every pair is memoised.
+    """
+    found, uncovered, misses = {}, [], []
+    for cui in existing_rxcuis:
+        hit = _pairs.get(interaction_pair_key(new_rxcui, cui))
+        if hit is None:
+            misses.append(cui)
+        elif hit is MISSING:
+            uncovered.append(cui)
+        else:
+            found[cui] = list(hit)
+    if not misses:
+        return found, uncovered
+    if not has_app_context():
+        return found, uncovered + misses
+
+    known = set(db.session.execute(
+        db.select(DrugConcept.rxcui).where(DrugConcept.rxcui.in_([new_rxcui, *misses]))
+    ).scalars())
+    records = {interaction_pair_key(new_rxcui, cui): [] for cui in misses
+               if new_rxcui in known and cui in known}
+    if records:
+        for row in db.session.execute(
+            db.select(DrugInteraction.pair_key, DrugInteraction.rxcui_a, DrugInteraction.rxcui_b,
+                      DrugInteraction.drug_a, DrugInteraction.drug_b, DrugInteraction.severity,
+                      DrugInteraction.description, DrugInteraction.source)
+            .where(DrugInteraction.pair_key.in_(list(records)))
+        ).all():
+            records[row.pair_key].append(_raw(row))
+
+    for cui in misses:
+        key = interaction_pair_key(new_rxcui, cui)
+        if key in records:
+            _pairs.set(key, tuple(records[key]))
+            found[cui] = records[key]
+        else:
+            _pairs.set(key, MISSING)
+            uncovered.append(cui)
+    return found, uncovered
+
+
+def rxcui_for_name(drug_name):
+    """RxCUI of a drug name the imported dataset uses, or None."""
+    key = normalize_drug_name(drug_name)
+    if not key or not has_app_context():
+        return None
+    return db.session.execute(
+        db.select(DrugConcept.rxcui).where(DrugConcept.name_key == key).limit(1)
+    ).scalar()
+
+
+def _read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        missing = {'rxcui1', 'rxcui2', 'description'} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+        for line, row in enumerate(reader, start=2):
+            a, b = (row.get('rxcui1') or '').strip(), (row.get('rxcui2') or '').strip()
+            description = (row.get('description') or '').strip()
+            if not a or not b or not description:
+                raise ValueError(f"{path}:{line}: rxcui1, rxcui2 and description are required")
+            yield a, b, {c: (row.get(c) or '').strip() for c in IMPORT_COLUMNS}
+
+
+def _load(path, replace, default_source):
+    if replace:
+        db.session.execute(db.delete(DrugInteraction))
+        db.session.execute(db.delete(DrugConcept))
+    known = set(db.session.execute(db.select(DrugConcept.rxcui)).scalars())
+    cleared = set()
+    batch, concepts = [], {}
+    imported = added = 0
+
+    def flush():
+        nonlocal added
+        if batch:
+            db.session.execute(db.insert(DrugInteraction), batch)
+        if concepts:
+            db.session.execute(db.insert(DrugConcept), list(concepts.values()))
+        added += len(concepts)
+        known.update(concepts)
+        batch.clear()
+        concepts.clear()
+
+    for a, b, row in _read_rows(path):
+        source = row['source'] or default_source
+        if source not in cleared:
+            db.session.execute(db.delete(DrugInteraction).where(DrugInteraction.source == source))
+            cleared.add(source)
+        (cui_a, drug_a), (cui_b, drug_b) = sorted(((a, row['drug1']), (b, row['drug2'])))
+        batch.append({
+            'pair_key': interaction_pair_key(cui_a, cui_b), 'rxcui_a': cui_a, 'rxcui_b': cui_b,
+            'drug_a': drug_a or None, 'drug_b': drug_b or None, 'severity': row['severity'] or None,
+            'description': row['description'], 'source': source,
+        })
+        for cui, name in ((cui_a, drug_a), (cui_b, drug_b)):
+            if cui not in known and cui not in concepts:
+                concepts[cui] = {'rxcui': cui, 'name': name or cui, 'name_key': normalize_drug_name(name or cui)}
+        imported += 1
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+    flush()
+    return imported, added
+
+
+def import_interactions(path, replace=False, default_source='local'):
+    """
+    Load a CSV dataset (IMPORT_COLUMNS, header row required) in one
+    transaction. Each source named in the file replaces that source's
+    earlier rows, so re-importing a file is idempotent; replace=True drops
+    the whole store first. Returns (interaction rows, new drug concepts).
+    """
+    try:
+        imported, added = _load(path, replace, default_source)
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.commit()
+    _pairs.clear()
+    # Names the new dataset covers must resolve to its ids from now on
+    rxcui_cache.memory.clear()
+    logger.info(f"Imported {imported} interaction record(s) from {path}")
+    return imported, added
@@ -0,0 +1,91 @@
+import os
+from collections import deque
+
+# Below this many patterns, one C-level `in` per pattern beats walking the
+# automaton character by character in Python. benchmarks/bench_matcher.py
+# puts the crossover at ~64 patterns for drug names and ~256 for long
+# interaction descriptions.
+MATCHER_SCAN_THRESHOLD = int(os.getenv('MATCHER_SCAN_THRESHOLD', '64'))
+
+
+class PatternMatcher:
+    """
+    Multi-pattern substring matcher over a fixed set of patterns, built once.
+
+    matches(text) returns every pattern that occurs anywhere in text
+    (overlapping occurrences included), case-insensitively: the same answer
+    as `{p for p in patterns if p in text.lower()}`. Large pattern sets use an
+    Aho-Corasick automaton, so a lookup is one pass over the text whatever the
+    number of patterns; small ones just test each pattern.
+    """
+
+    def __init__(self, patterns):
+        # Keep the caller's order for the small path, so likelier patterns can go first
+        ordered = tuple(dict.fromkeys(p.lower() for p in patterns if p))
+        self.patterns = frozenset(ordered)
+        self._small = ordered if len(self.patterns) < MATCHER_SCAN_THRESHOLD else None
+        if self._small is None:
+            self._build()
+
+    def _build(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for pattern in self.patterns:
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] = (pattern,)
+        self._link()
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                # node is at depth >= 1, so goto[fail][ch] is always shallower than nxt
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                # A node also reports everything its failure target reports
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _scan(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                yield out[node]
+
+    def matches(self, text):
+        if self._small is not None:
+            text = (text or '').lower()
+            return {p for p in self._small if p in text}
+        found = set()
+        for hits in self._scan(text or ''):
+            found.update(hits)
+        return found
+
+    def search(self, text):
+        """True if any pattern occurs in text; stops at the first hit."""
+        if self._small is not None:
+            text = (text or '').lower()
+            return any(p in text for p in self._small)
+        for _ in self._scan(text or ''):
+            return True
+        return False
+
+    def __len__(self):
+        return len(self.patterns)
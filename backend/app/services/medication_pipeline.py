@@ -0,0 +1,185 @@
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .. import db
+from ..models import Medication, Alert
+from ..tasks import dose_timer, alert_if_stock_crossed
+from .cache import normalize_drug_name
+from .drug_api import (resolve_rxcui, RxcuiLookupFailed, check_drug_interactions, check_pharmacokinetic_interactions,
+                       submit, RXNAV_FALLBACK)
+from . import enrichment
+from .request_memo import request_memo, is_memoized, StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Retry-After for an add refused because the interaction check didn't finish
+INTERACTION_CHECK_RETRY_AFTER_SECONDS = 30
+
+
+class AddMedicationPipeline:
+    """
+    Adds a medication to a patient's regimen in a single pass:
+
+      resolve  - RxCUI lookup; if RxNav fails to answer while there are
+                 active medications to check against, the add fails
+                 closed with a 503 (below)
+      regimen  - the active regimen is loaded while the lookups are in flight
+      verdict  - the RxNav interaction check runs once and feeds both the
+                 critical block and the post-add warning alert. If RxNav
+                 did not answer for every pair in time the add fails
+                 closed with a 503; with RXNAV_FALLBACK off those pairs can
+                 never be checked, so the add goes ahead and the response's
+                 interaction_check says which were left unchecked
+      pk       - pharmacokinetic overlap check
+      persist  - medication and any warning alert are committed together
+
+    The FDA label is not waited for: it is filled from the drug info cache
+    when possible, otherwise the medication is committed with label_status
+    'pending' and services/enrichment.py fetches it in the background.
+
+    Lookups and the verdict go through the request memo so anything else in
+    the same request reuses them. Per-stage timings are kept on self.timer.
+    """
+
+    def __init__(self, patient_id, data):
+        self.patient_id = patient_id
+        self.data = data
+        self.name = data['name']
+        self.half_life = float(data.get('half_life_hours', 6.0))
+        self.timer = StageTimer()
+
+    def run(self):
+        """Returns (response_body, status_code)."""
+        if float(self.data['frequency_hours']) <= 0:
+            return {'error': 'frequency_hours must be greater than 0'}, 400
+        memo_key = ('rxcui', normalize_drug_name(self.name))
+        rxcui_future = None
+        if not is_memoized(memo_key):
+            with self.timer.stage('resolve'):
+                rxcui_future = submit(resolve_rxcui, self.name)
+
+        with self.timer.stage('regimen'):
+            existing = Medication.query.filter_by(patient_id=self.patient_id, is_active=True).all()
+
+        existing_cuis = [m.rxcui for m in existing if m.rxcui]
+        with self.timer.stage('resolve'):
+            try:
+                rxcui = request_memo(memo_key, rxcui_future.result if rxcui_future else lambda: resolve_rxcui(self.name))
+            except RxcuiLookupFailed:
+                # Without an RxCUI none of the pairs can be checked
+                if existing_cuis:
+                    return self._incomplete({'unchecked_rxcuis': existing_cuis})
+                rxcui = None
+
+        # Check 1: RxNav drug interaction database
+        verdict = None
+        if rxcui and existing_cuis:
+            with self.timer.stage('verdict'):
+                verdict = request_memo(
+                    ('interactions', rxcui, tuple(existing_cuis)),
+                    lambda: check_drug_interactions(rxcui, existing_cuis)
+                )
+            if verdict.get('has_critical'):
+                critical = verdict['critical_interactions']
+                return self._block(
+                    f'This medication has a HIGH-SEVERITY interaction with your current medications: {", ".join([c["drugs"][0] if c.get("drugs") else "" for c in critical[:2]])}. Please consult with your healthcare provider.',
+                    'This medication has been BLOCKED due to a high-severity drug interaction.',
+                    critical
+                )
+            if verdict.get('partial') and RXNAV_FALLBACK:
+                return self._incomplete(verdict)
+
+        # Check 2: Pharmacokinetic overlap (active time window collision)
+        if existing:
+            with self.timer.stage('pk'):
+                temp_med = Medication(name=self.name, half_life_hours=self.half_life)
+                pk_critical = check_pharmacokinetic_interactions(temp_med, existing)
+            if pk_critical:
+                return self._block(
+                    f'This medication will be active in your body at the same time as {", ".join([i["med2"] for i in pk_critical])}. This combination is dangerous. Please consult with your healthcare provider.',
+                    'This medication has been BLOCKED due to pharmacokinetic overlap with active medications.',
+                    pk_critical
+                )
+
+        with self.timer.stage('persist'):
+            med = self._create_medication(rxcui)
+            db.session.flush()
+            job = enrichment.fill_label(med)
+            alert_if_stock_crossed(med, previous_stock=float('inf'))
+            self._warn_non_critical(verdict)
+            db.session.commit()
+        if job is not None:
+            enrichment.dispatch(current_app._get_current_object(), [job.id])
+        dose_timer.schedule(med.id, med.next_dose_time)
+
+        logger.info(f"add_medication {self.name!r} for patient {self.patient_id}: {self.timer.server_timing()}")
+        return {
+            **med.to_dict(),
+            'interaction_check': {
+                'partial': bool(verdict and verdict.get('partial')),
+                'unchecked_rxcuis': verdict.get('unchecked_rxcuis', []) if verdict else [],
+            },
+        }, 201
+
+    def _incomplete(self, verdict):
+        logger.warning(f"add_medication {self.name!r} for patient {self.patient_id} refused: "
+                       f"interaction check incomplete for {verdict['unchecked_rxcuis']}")
+        return {
+            'error': 'INTERACTION_CHECK_INCOMPLETE',
+            'message': 'The drug interaction check could not be completed right now. Please try again shortly.',
+            'unchecked_rxcuis': verdict['unchecked_rxcuis'],
+            'retry_after': INTERACTION_CHECK_RETRY_AFTER_SECONDS,
+        }, 503
+
+    def _block(self, alert_message, error_message, interactions):
+        with self.timer.stage('persist'):
+            db.session.add(Alert(
+                user_id=self.patient_id,
+                type='drug_interaction',
+                severity='critical',
+                title=f'CRITICAL: Cannot add {self.name}',
+                message=alert_message,
+                is_read=False
+            ))
+            db.session.commit()
+        return {
+            'error': 'FATAL_INTERACTION_BLOCKED',
+            'message': error_message,
+            'interactions': interactions
+        }, 409
+
+    def _create_medication(self, rxcui):
+        data = self.data
+        med = Medication(
+            patient_id=self.patient_id,
+            name=self.name,
+            rxcui=rxcui,
+            form=data.get('form', 'pill'),
+            dose_amount=float(data['dose_amount']),
+            dose_unit=data.get('dose_unit', 'mg'),
+            frequency_hours=float(data['frequency_hours']),
+            half_life_hours=self.half_life,
+            current_stock=float(data['current_stock']),
+            stock_threshold=float(data.get('stock_threshold', 5.0)),
+            next_dose_time=datetime.utcnow() + timedelta(hours=1)
+        )
+        db.session.add(med)
+        return med
+
+    def _warn_non_critical(self, verdict):
+        # Create a warning alert if there are any interactions (even non-critical)
+        if not verdict:
+            return
+        for interaction in verdict.get('all_interactions', []):
+            if not interaction.get('is_critical'):  # Only warn about non-critical ones here
+                db.session.add(Alert(
+                    user_id=self.patient_id,
+                    type='drug_interaction',
+                    severity='warning',
+                    title=f'Drug Interaction: {self.name}',
+                    message=f'Moderate interaction detected: {interaction.get("description", "")}. Monitor for side effects.',
+                    is_read=False
+                ))
+                break  # Only create one warning alert per medication
@@ -0,0 +1,262 @@
+"""
+Concentration curves by superposition of first-order elimination.
+
+Every dose contributes DOSE_PEAK_PERCENT * 0.5 ** (hours since dose / half-life)
+from the moment it is taken, so a curve is the sum of those decays over the
+patient's logged doses plus the doses still scheduled inside the horizon. All
+timepoints are evaluated against all doses in one NumPy pass (in blocks of
+timepoints to bound memory). Steady-state figures for regular dosing are
+closed-form geometric series.
+
+Curves are computed on a grid anchored to the current resolution step and
+memoised in pk_cache by (half-life, interval, window, hash of dose offsets).
+"""
+import hashlib
+import math
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .. import db
+from ..models import DoseLog, RECENT_DOSE_RING_SIZE
+from .cache import TTLCache
+from .drug_api import DRUG_CLEARANCE_MULTIPLIER
+
+# Concentration is reported as % of a single dose's peak
+DOSE_PEAK_PERCENT = 100.0
+PK_DEFAULT_RESOLUTION_MINUTES = float(os.getenv('PK_DEFAULT_RESOLUTION_MINUTES', '15'))
+PK_MAX_WINDOW_HOURS = float(os.getenv('PK_MAX_WINDOW_HOURS', str(24 * 30)))
+PK_MAX_POINTS = int(os.getenv('PK_MAX_POINTS', '50000'))
+# Doses older than this many half-lives contribute < 0.1% and are not loaded
+PK_TAIL_HALF_LIVES = 10
+# Upper bound on timepoints x doses held in memory at once
+_BLOCK_CELLS = 2_000_000
+# A medication counts as active in the combined overlay down to the level
+# left after DRUG_CLEARANCE_MULTIPLIER half-lives (the PK overlap check's window)
+ACTIVE_THRESHOLD_PERCENT = DOSE_PEAK_PERCENT * 0.5 ** DRUG_CLEARANCE_MULTIPLIER
+
+PK_CACHE_SIZE = int(os.getenv('PK_CACHE_SIZE', '512'))
+PK_CACHE_TTL_SECONDS = float(os.getenv('PK_CACHE_TTL_SECONDS', '900'))
+pk_cache = TTLCache(PK_CACHE_SIZE, PK_CACHE_TTL_SECONDS)
+
+
+def superpose(hours, dose_hours, half_life_hours):
+    """
+    Concentration at each time in `hours` from doses taken at `dose_hours`
+    (both in hours on the same axis). Returns a float array shaped like hours.
+    """
+    hours = np.asarray(hours, dtype=float)
+    dose_hours = np.asarray(dose_hours, dtype=float)
+    out = np.zeros(hours.shape)
+    if dose_hours.size == 0:
+        return out
+    k = math.log(2) / half_life_hours
+    block = max(1, _BLOCK_CELLS // dose_hours.size)
+    for start in range(0, hours.size, block):
+        elapsed = hours[start:start + block, None] - dose_hours[None, :]
+        # Doses in the future of a timepoint contribute nothing
+        decay = np.where(elapsed >= 0, np.exp(-k * np.maximum(elapsed, 0.0)), 0.0)
+        out[start:start + block] = DOSE_PEAK_PERCENT * decay.sum(axis=1)
+    return out
+
+
+def steady_state(half_life_hours, frequency_hours):
+    """Closed-form steady state for one dose every frequency_hours."""
+    r = 0.5 ** (frequency_hours / half_life_hours)  # fraction left after one interval
+    k = math.log(2) / half_life_hours
+    peak = DOSE_PEAK_PERCENT / (1 - r)
+    return {
+        'peak': round(peak, 2),
+        'trough': round(peak * r, 2),
+        'average': round(DOSE_PEAK_PERCENT / (k * frequency_hours), 2),
+        'accumulation_factor': round(1 / (1 - r), 3),
+        # 90% of steady state is reached after log2(10) half-lives
+        'time_to_90_percent_hours': round(half_life_hours * math.log2(10), 1),
+    }
+
+
+def _from_ring(med, since):
+    """
+    Taken doses at or after since from the medication's recent-dose ring, or
+    None when the ring may not hold all of them (it is full and its oldest
+    entry is not before since).
+    """
+    ring = med.recent_taken()
+    if len(ring) < RECENT_DOSE_RING_SIZE or ring[0] < since:
+        return [t for t in ring if t >= since]
+    return None
+
+
+def taken_dose_times(med, since):
+    """Taken doses at or after since, oldest first; dose_logs is only read for long windows."""
+    taken = _from_ring(med, since)
+    if taken is not None:
+        return taken
+    return list(db.session.execute(
+        db.select(DoseLog.taken_time)
+        .where(DoseLog.medication_id == med.id, DoseLog.status == 'taken',
+               DoseLog.taken_time >= since)
+        .order_by(DoseLog.taken_time)
+    ).scalars())
+
+
+def projected_dose_times(next_dose_time, frequency_hours, now, until):
+    """Scheduled doses up to `until`; an overdue dose is assumed to be taken now."""
+    if next_dose_time is None or frequency_hours <= 0:
+        return []
+    t = max(next_dose_time, now)
+    step = timedelta(hours=frequency_hours)
+    times = []
+    while t <= until:
+        times.append(t)
+        t += step
+    return times
+
+
+def curve_window(frequency_hours, history_hours=None, horizon_hours=None, resolution_minutes=None):
+    """
+    Validate and default the curve window: two dosing intervals either side
+    of now at PK_DEFAULT_RESOLUTION_MINUTES. Raises ValueError when out of range.
+    """
+    history = 2 * frequency_hours if history_hours is None else history_hours
+    horizon = 2 * frequency_hours if horizon_hours is None else horizon_hours
+    step = PK_DEFAULT_RESOLUTION_MINUTES if resolution_minutes is None else resolution_minutes
+    if history < 0 or horizon < 0 or history + horizon <= 0:
+        raise ValueError('history_hours and horizon_hours must be non-negative and not both zero')
+    if history + horizon > PK_MAX_WINDOW_HOURS:
+        raise ValueError(f'history_hours + horizon_hours must be at most {PK_MAX_WINDOW_HOURS:g}')
+    if step <= 0 or (history + horizon) * 60 / step + 1 > PK_MAX_POINTS:
+        raise ValueError(f'resolution_minutes too fine: at most {PK_MAX_POINTS} points per curve')
+    return history, horizon, step
+
+
+def _anchor(now, resolution_minutes):
+    """now rounded down to the resolution grid, so curves computed within one step share a cache entry."""
+    step = timedelta(minutes=resolution_minutes)
+    return now - (now - datetime.min) % step
+
+
+def _grid(history_hours, horizon_hours, resolution_minutes):
+    return np.arange(-history_hours, horizon_hours + 1e-9, resolution_minutes / 60.0)
+
+
+def _point(hours, conc, i):
+    return {'time': round(float(hours[i]), 2), 'concentration': round(float(conc[i]), 2)}
+
+
+def _curve(half_life_hours, frequency_hours, dose_hours, history_hours, horizon_hours, resolution_minutes):
+    """
+    Memoised curve for doses at dose_hours (relative to the anchor). Returns
+    (concentration array, summary dict). The cache key covers the
+    regimen, the window and a hash of the dose offsets, so identical
+    regimens share an entry whichever medication they belong to; once a
+    dose is logged or the regimen changes the old entry is simply never hit
+    again and ages out of pk_cache.
+    """
+    digest = hashlib.sha1(np.round(np.asarray(dose_hours, dtype=float), 4).tobytes()).hexdigest()
+    key = (half_life_hours, frequency_hours, history_hours, horizon_hours, resolution_minutes, digest)
+    hit = pk_cache.get(key)
+    if hit is None:
+        hours = _grid(history_hours, horizon_hours, resolution_minutes)
+        conc = superpose(hours, dose_hours, half_life_hours)
+        hit = (conc, {
+            'accumulation': [{'time': round(float(t), 2), 'concentration': round(float(c), 2)}
+                             for t, c in zip(hours, conc)],
+            'peak': _point(hours, conc, int(conc.argmax())),
+            'trough': _point(hours, conc, int(conc.argmin())),
+            'steady_state': steady_state(half_life_hours, frequency_hours) if frequency_hours > 0 else None,
+        })
+        pk_cache.set(key, hit)
+    return hit
+
+
+def _window_meta(anchor, history_hours, horizon_hours, resolution_minutes):
+    return {
+        'start_time': (anchor - timedelta(hours=history_hours)).isoformat(),
+        'end_time': (anchor + timedelta(hours=horizon_hours)).isoformat(),
+        'resolution_minutes': resolution_minutes,
+    }
+
+
+def _profile(med, taken, anchor, now, history, horizon, step):
+    """(concentration array, profile dict) for one medication on the anchored grid."""
+    end = anchor + timedelta(hours=horizon)
+    # Overdue doses are projected at the anchor so the dose offsets (and cache key) hold for the whole step
+    projected = projected_dose_times(med.next_dose_time, med.frequency_hours, anchor, end) if med.is_active else []
+    dose_hours = [(t - anchor).total_seconds() / 3600 for t in (*taken, *projected)]
+    conc, summary = _curve(med.half_life_hours, med.frequency_hours, dose_hours, history, horizon, step)
+    now_hours = (now - anchor).total_seconds() / 3600
+    return conc, {
+        **summary,
+        'current_concentration': round(float(superpose([now_hours], dose_hours, med.half_life_hours)[0]), 2),
+        'doses': {'taken': len(taken), 'projected': len(projected)},
+    }
+
+
+def _tail_start(med, anchor, history_hours):
+    return anchor - timedelta(hours=history_hours + PK_TAIL_HALF_LIVES * med.half_life_hours)
+
+
+def medication_profile(med, now, history_hours=None, horizon_hours=None, resolution_minutes=None):
+    """
+    Curve plus summary for one medication. Times are hours relative to the
+    start of the current resolution step (negative = past).
+    """
+    history, horizon, step = curve_window(med.frequency_hours, history_hours, horizon_hours, resolution_minutes)
+    anchor = _anchor(now, step)
+    taken = taken_dose_times(med, _tail_start(med, anchor, history))
+    _, profile = _profile(med, taken, anchor, now, history, horizon, step)
+    return {**profile, **_window_meta(anchor, history, horizon, step)}
+
+
+def regimen_profiles(meds, now, history_hours=None, horizon_hours=None, resolution_minutes=None):
+    """
+    Curves for several medications on one shared grid (default window sized
+    for the longest dosing interval) plus the combined overlay: the summed
+    level and how many medications are above ACTIVE_THRESHOLD_PERCENT at
+    each point. Dose logs are read (in one query) only for medications whose
+    recent-dose ring doesn't cover the window.
+    """
+    meds = [m for m in meds if m.half_life_hours and m.half_life_hours > 0]
+    longest = max((m.frequency_hours for m in meds), default=24)
+    history, horizon, step = curve_window(longest, history_hours, horizon_hours, resolution_minutes)
+    anchor = _anchor(now, step)
+    window = _window_meta(anchor, history, horizon, step)
+    if not meds:
+        return [], {'accumulation': [], 'peak': None, 'max_active_medications': 0}, window
+
+    cutoffs = {m.id: _tail_start(m, anchor, history) for m in meds}
+    taken = {m.id: _from_ring(m, cutoffs[m.id]) for m in meds}
+    uncovered = [med_id for med_id, times in taken.items() if times is None]
+    if uncovered:
+        for med_id in uncovered:
+            taken[med_id] = []
+        for med_id, taken_time in db.session.execute(
+            db.select(DoseLog.medication_id, DoseLog.taken_time)
+            .where(DoseLog.medication_id.in_(uncovered), DoseLog.status == 'taken',
+                   DoseLog.taken_time >= min(cutoffs[i] for i in uncovered))
+            .order_by(DoseLog.taken_time)
+        ).all():
+            if taken_time >= cutoffs[med_id]:
+                taken[med_id].append(taken_time)
+
+    hours = _grid(history, horizon, step)
+    total = np.zeros(hours.shape)
+    active = np.zeros(hours.shape, dtype=int)
+    curves = []
+    for med in meds:
+        conc, profile = _profile(med, taken[med.id], anchor, now, history, horizon, step)
+        total += conc
+        active += conc >= ACTIVE_THRESHOLD_PERCENT
+        curves.append((med, profile))
+
+    combined = {
+        'accumulation': [
+            {'time': round(float(t), 2), 'concentration': round(float(c), 2), 'active_medications': int(n)}
+            for t, c, n in zip(hours, total, active)
+        ],
+        'peak': _point(hours, total, int(total.argmax())),
+        'max_active_medications': int(active.max()),
+    }
+    return curves, combined, window
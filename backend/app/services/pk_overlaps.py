@@ -0,0 +1,84 @@
+"""
+Pharmacokinetic overlap detection across a whole regimen (or caregiver roster).
+
+Each medication's active window is computed once (see active_window).
+Windows are swept in start order; open windows are indexed by the
+CRITICAL_DRUG_COMBOS members in their drug name and expire from a heap by
+end time, so a new window is only compared with open windows of its combo
+partners. Medications that are in no combo never enter the sweep. The last
+taken dose is read from the medication itself (Medication.last_taken_time).
+"""
+import heapq
+from datetime import datetime
+
+from .drug_api import calculate_drug_active_window, combo_members, combo_partners
+
+OVERLAP_REASON = ('Pharmacokinetic overlap: Both medications will be active in your body at the same time, '
+                  'creating a dangerous interaction')
+
+
+def active_window(med, last_dose, now):
+    """
+    (start, end) of a medication's current active window: from its last
+    taken dose while that is still in the body, otherwise from its next
+    scheduled dose.
+    """
+    if last_dose is not None:
+        start, end = calculate_drug_active_window(last_dose, med.half_life_hours)
+        if end is not None and end > now:
+            return start, end
+    return calculate_drug_active_window(med.next_dose_time or now, med.half_life_hours)
+
+
+def find_pk_overlaps(meds, last_doses=None, now=None):
+    """
+    Critical-combo medication pairs of the same patient whose active windows
+    intersect. Returns one dict per pair with the overlap interval.
+    """
+    now = now or datetime.utcnow()
+    if last_doses is None:
+        last_doses = {m.id: m.last_taken_time for m in meds}
+
+    windows = []
+    for med in meds:
+        members = combo_members(med.name)
+        if not members:
+            continue
+        start, end = active_window(med, last_doses.get(med.id), now)
+        if start is not None:
+            windows.append((start, end, med, members))
+    windows.sort(key=lambda w: (w[0], w[2].id))
+
+    overlaps = []
+    expiry = []   # (end, seq, patient_id, members) of open windows
+    open_by_member = {}   # (patient_id, member) -> {seq: (start, end, med)}
+    for seq, (start, end, med, members) in enumerate(windows):
+        # Windows that ended at or before this start no longer overlap anything
+        while expiry and expiry[0][0] <= start:
+            _, old_seq, patient_id, old_members = heapq.heappop(expiry)
+            for member in old_members:
+                open_by_member[(patient_id, member)].pop(old_seq, None)
+
+        matched = {}
+        for member in members:
+            for partner in combo_partners(member):
+                matched.update(open_by_member.get((med.patient_id, partner), {}))
+        for other_seq in sorted(matched):
+            other_start, other_end, other = matched[other_seq]
+            overlap_end = min(end, other_end)
+            overlaps.append({
+                'med1': other.name,
+                'med2': med.name,
+                'med1_id': other.id,
+                'med2_id': med.id,
+                'reason': OVERLAP_REASON,
+                'is_critical': True,
+                'overlap_start': start.isoformat(),
+                'overlap_end': overlap_end.isoformat(),
+                'overlap_hours': round((overlap_end - start).total_seconds() / 3600, 2),
+            })
+
+        heapq.heappush(expiry, (end, seq, med.patient_id, members))
+        for member in members:
+            open_by_member.setdefault((med.patient_id, member), {})[seq] = (start, end, med)
+    return overlaps
@@ -0,0 +1,42 @@
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+
+def request_memo(key, compute):
+    """
+    Return compute() once per request for a given key.
+
+    Results live on flask.g, so they are shared by everything that runs in the
+    same request and dropped when it ends. Outside a request this is a plain call.
+    """
+    if not has_request_context():
+        return compute()
+    memo = g.setdefault('_request_memo', {})
+    if key not in memo:
+        memo[key] = compute()
+    return memo[key]
+
+
+def is_memoized(key):
+    """True if request_memo already holds a result for key in this request."""
+    return has_request_context() and key in g.get('_request_memo', {})
+
+
+class StageTimer:
+    """Wall-clock breakdown of a multi-stage request, rendered as a Server-Timing header."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def server_timing(self):
+        return ', '.join(f'{name};dur={ms:.1f}' for name, ms in self.stages.items())
@@ -0,0 +1,250 @@
+"""
+Shared outbound HTTP client for the drug data upstreams (RxNav, openFDA, Wikipedia).
+
+- Pools: one keep-alive session per host, so a slow host can't take the
+  connections another one needs.
+- Circuit breaker per host: after UPSTREAM_BREAKER_FAILURES consecutive
+  failures (connection errors, timeouts, 5xx, 429) calls to that host fail
+  at once with CircuitOpen for UPSTREAM_BREAKER_RESET_SECONDS; then a single
+  trial call decides whether it closes again.
+- Deadlines: a Deadline is a time budget shared by every call made for one
+  operation. The innermost one is kept in a context variable, and a new
+  Deadline never outlives the one it is created under, so an operation
+  started inside a request can't run past the request's own budget
+  (UPSTREAM_REQUEST_DEADLINE_SECONDS, set per request in create_app).
+- Hedging: get(..., hedge=True) is for idempotent GETs. If no answer has
+  come after UPSTREAM_HEDGE_AFTER_SECONDS, or the first attempt fails fast,
+  the same request goes out once more and the first good response wins;
+  an attempt still queued for a worker is cancelled, one already on the
+  wire is left to finish in the background. Off when the setting is 0.
+- stats(): per-host counters, breaker state and latency percentiles.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', os.getenv('DRUG_API_POOL_SIZE', '16')))
+UPSTREAM_BREAKER_FAILURES = int(os.getenv('UPSTREAM_BREAKER_FAILURES', '5'))
+UPSTREAM_BREAKER_RESET_SECONDS = float(os.getenv('UPSTREAM_BREAKER_RESET_SECONDS', '30'))
+UPSTREAM_HEDGE_AFTER_SECONDS = float(os.getenv('UPSTREAM_HEDGE_AFTER_SECONDS', '0'))
+UPSTREAM_HEDGE_WORKERS = int(os.getenv('UPSTREAM_HEDGE_WORKERS', '16'))
+# Budget for all upstream calls made while serving one API request (0 = none)
+UPSTREAM_REQUEST_DEADLINE_SECONDS = float(os.getenv('UPSTREAM_REQUEST_DEADLINE_SECONDS', '20'))
+UPSTREAM_STATS_WINDOW = 512
+
+
+class DeadlineExceeded(requests.Timeout):
+    pass
+
+
+class CircuitOpen(requests.ConnectionError):
+    pass
+
+
+_current_deadline = contextvars.ContextVar('upstream_deadline', default=None)
+
+
+class Deadline:
+    """Time budget shared by every upstream call made for one operation."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        enclosing = _current_deadline.get()
+        if enclosing is not None:
+            self.expires_at = min(self.expires_at, enclosing.expires_at)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float) -> float:
+        """Per-call timeout: the call's own cap, clipped to what is left of the budget."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("upstream deadline exceeded")
+        return min(cap, remaining)
+
+
+def begin_request():
+    """before_request hook: give this request its upstream budget."""
+    _current_deadline.set(None)
+    if UPSTREAM_REQUEST_DEADLINE_SECONDS > 0:
+        _current_deadline.set(Deadline(UPSTREAM_REQUEST_DEADLINE_SECONDS))
+
+
+def end_request(exc=None):
+    """teardown_request hook; worker threads are reused, so the budget must not leak."""
+    _current_deadline.set(None)
+
+
+class _Host:
+    """Session, breaker and statistics for one upstream host."""
+
+    def __init__(self, name):
+        self.name = name
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=UPSTREAM_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.latencies = deque(maxlen=UPSTREAM_STATS_WINDOW)
+        self.counts = dict.fromkeys(
+            ('requests', 'errors', 'timeouts', 'short_circuited', 'hedged', 'hedge_wins', 'breaker_opened'), 0
+        )
+
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < UPSTREAM_BREAKER_RESET_SECONDS:
+            return 'open'
+        return 'half-open'
+
+    def admit(self):
+        """
+        Raise CircuitOpen unless a call may go out now. Returns True if the
+        call is the half-open trial, which must pass trial=True to record().
+        """
+        with self.lock:
+            state = self.state()
+            if state == 'closed':
+                return False
+            if state == 'half-open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            self.counts['short_circuited'] += 1
+        raise CircuitOpen(f"{self.name} is unavailable (circuit open)")
+
+    def record(self, elapsed, ok, timed_out=False, trial=False):
+        with self.lock:
+            self.counts['requests'] += 1
+            self.latencies.append(elapsed)
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.counts['timeouts' if timed_out else 'errors'] += 1
+                self.failures += 1
+                if self.opened_at is not None or self.failures >= UPSTREAM_BREAKER_FAILURES:
+                    if self.opened_at is None:
+                        self.counts['breaker_opened'] += 1
+                        logger.warning(f"Upstream {self.name} failing; circuit open for {UPSTREAM_BREAKER_RESET_SECONDS:g}s")
+                    self.opened_at = time.monotonic()
+            # Calls admitted before the breaker opened may finish during the
+            # trial; only the trial itself lets the next one through
+            if trial:
+                self.trial_in_flight = False
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            counts = dict(self.counts)
+            state = self.state()
+            failures = self.failures
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+        return {
+            **counts,
+            'state': state,
+            'consecutive_failures': failures,
+            'latency_ms': {'p50': pct(0.5), 'p95': pct(0.95), 'p99': pct(0.99), 'max': pct(1.0)},
+        }
+
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=UPSTREAM_HEDGE_WORKERS, thread_name_prefix='upstream-hedge')
+
+
+def _host(url):
+    name = urlsplit(url).netloc
+    host = _hosts.get(name)
+    if host is None:
+        with _hosts_lock:
+            host = _hosts.setdefault(name, _Host(name))
+    return host
+
+
+def _attempt(host, url, params, timeout):
+    """One call through the breaker; returns the response or raises."""
+    trial = host.admit()
+    started = time.monotonic()
+    try:
+        r = host.session.get(url, params=params, timeout=timeout)
+    except requests.RequestException as e:
+        host.record(time.monotonic() - started, ok=False, timed_out=isinstance(e, requests.Timeout), trial=trial)
+        raise
+    except BaseException:
+        host.record(time.monotonic() - started, ok=False, trial=trial)
+        raise
+    host.record(time.monotonic() - started, ok=r.status_code < 500 and r.status_code != 429, trial=trial)
+    return r
+
+
+def _hedged(host, url, params, timeout, deadline):
+    first = _hedge_executor.submit(_attempt, host, url, params, timeout)
+    done, _ = wait([first], timeout=UPSTREAM_HEDGE_AFTER_SECONDS)
+    if done and (isinstance(first.exception(), CircuitOpen)
+                 or first.exception() is None and first.result().status_code < 500):
+        return first.result()
+    # Slow, failed or 5xx: one more try if there is budget left for it
+    try:
+        second_timeout = deadline.timeout(timeout) if deadline is not None else timeout
+        second = _hedge_executor.submit(_attempt, host, url, params, second_timeout)
+    except DeadlineExceeded:
+        return first.result()
+    with host.lock:
+        host.counts['hedged'] += 1
+    pending = {first, second}
+    result = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None and f.result().status_code < 500:
+                if f is second:
+                    with host.lock:
+                        host.counts['hedge_wins'] += 1
+                for loser in pending:
+                    loser.cancel()
+                return f.result()
+            result = f
+    return result.result()
+
+
+def get(url, params=None, timeout=10, deadline=None, hedge=False):
+    """
+    GET through the host's pool and breaker. timeout caps this call; the
+    explicit deadline (or else the one in context) clips it further.
+    Raises DeadlineExceeded once the budget is spent and CircuitOpen while
+    the host's breaker is open.
+    """
+    deadline = deadline or _current_deadline.get()
+    if deadline is not None:
+        timeout = deadline.timeout(timeout)
+    host = _host(url)
+    if hedge and UPSTREAM_HEDGE_AFTER_SECONDS > 0 and timeout > UPSTREAM_HEDGE_AFTER_SECONDS:
+        return _hedged(host, url, params, timeout, deadline)
+    return _attempt(host, url, params, timeout)
+
+
+def stats():
+    """{host: counters, breaker state and latency percentiles} for this process."""
+    with _hosts_lock:
+        hosts = list(_hosts.values())
+    return {host.name: host.snapshot() for host in hosts}
@@ -1,77 +1,243 @@
 from datetime import datetime, timedelta
 from .models import Medication, DoseLog, Alert, User, CaregiverLink
+from .dose_timer import DoseTimer
+from .services import adherence
 from . import db
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
 
-def check_missed_doses():
-    threshold = datetime.utcnow() - timedelta(minutes=15)
-    overdue_meds = Medication.query.filter(
+MISSED_DOSE_GRACE = timedelta(minutes=15)
+MISSED_DOSE_CHUNK_SIZE = 2000
+# How soon the dose timer tries again for a medication that is still overdue after a scan
+MISSED_DOSE_RETRY = timedelta(seconds=int(os.getenv('MISSED_DOSE_RETRY_SECONDS', '60')))
+# Full-table safety net behind the event-driven dose timer
+MISSED_DOSE_RECONCILE_MINUTES = int(os.getenv('MISSED_DOSE_RECONCILE_MINUTES', '10'))
+
+dose_timer = DoseTimer(MISSED_DOSE_GRACE.total_seconds())
+
+
+def overdue_medications_query(threshold, after_id, limit, medication_ids=None):
+    """
+    One keyset chunk of the missed-dose scan: overdue meds with id > after_id,
+    joined to their patient and (one row per) caregiver link. miss_logged is
+    true for meds whose miss is already logged (e.g. by hand).
+    """
+    # The scan logs a miss with scheduled_time == the next_dose_time it was
+    # for; >= also counts a miss logged for a later slot as covering this one.
+    already_logged = db.exists().where(
+        DoseLog.medication_id == Medication.id,
+        DoseLog.status == 'missed',
+        DoseLog.scheduled_time >= Medication.next_dose_time
+    )
+    chunk_filter = [
         Medication.is_active == True,
-        Medication.next_dose_time <= threshold
-    ).all()
+        Medication.next_dose_time <= threshold,
+        Medication.id > after_id,
+    ]
+    if medication_ids is not None:
+        chunk_filter.append(Medication.id.in_(medication_ids))
+    chunk = (
+        db.select(Medication.id, already_logged.label('miss_logged'))
+        .where(*chunk_filter).order_by(Medication.id).limit(limit).subquery()
+    )
 
-    for med in overdue_meds:
-        already_logged = DoseLog.query.filter(
-            DoseLog.medication_id == med.id,
-            DoseLog.status == 'missed',
-            DoseLog.scheduled_time >= med.next_dose_time - timedelta(minutes=1)
-        ).first()
-        if already_logged:
-            continue
-
-        log = DoseLog(medication_id=med.id, scheduled_time=med.next_dose_time, status='missed')
-        db.session.add(log)
-
-        alert = Alert(
-            user_id=med.patient_id, type='missed_dose', severity='warning',
-            title=f'Missed Dose: {med.name}',
-            message=f'You missed your scheduled dose of {med.name} at {med.next_dose_time.strftime("%H:%M UTC")}.',
-            medication_id=med.id
+    return (
+        db.select(
+            Medication.id, Medication.patient_id, Medication.name,
+            Medication.next_dose_time, Medication.frequency_hours, chunk.c.miss_logged,
+            User.name.label('patient_name'), CaregiverLink.caregiver_id
         )
-        db.session.add(alert)
+        .join(chunk, chunk.c.id == Medication.id)
+        .outerjoin(User, User.id == Medication.patient_id)
+        .outerjoin(CaregiverLink, CaregiverLink.patient_id == Medication.patient_id)
+        .order_by(Medication.id)
+    )
 
-        patient = User.query.get(med.patient_id)
-        for link in CaregiverLink.query.filter_by(patient_id=med.patient_id).all():
-            db.session.add(Alert(
-                user_id=link.caregiver_id, type='missed_dose', severity='warning',
-                title=f'Missed Dose — {patient.name}: {med.name}',
-                message=f'{patient.name} missed their {med.name} dose.',
-                medication_id=med.id
-            ))
 
-        med.next_dose_time = datetime.utcnow() + timedelta(hours=med.frequency_hours)
+def check_missed_doses(chunk_size=MISSED_DOSE_CHUNK_SIZE, medication_ids=None):
+    """
+    Log a missed dose (plus patient and caregiver alerts) for every active
+    medication more than MISSED_DOSE_GRACE past its next_dose_time.
 
-    try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"check_missed_doses error: {e}")
+    Works set-based in keyset chunks of medication ids: one query per chunk
+    joins overdue meds to their patient and caregiver links, then logs,
+    alerts and next_dose_time updates are written in bulk and committed per
+    chunk. A med whose miss is already logged only has its next_dose_time
+    moved on, so it doesn't stay overdue.
+    Returns the number of missed doses logged.
+    """
+    now = datetime.utcnow()
+    threshold = now - MISSED_DOSE_GRACE
+    last_id = 0
+    processed = 0
 
+    while True:
+        rows = db.session.execute(
+            overdue_medications_query(threshold, last_id, chunk_size, medication_ids)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
 
-def check_low_stock():
-    low_meds = Medication.query.filter(
+        logs, alerts, updates, misses = [], [], [], []
+        seen = set()
+        for row in rows:
+            first = row.id not in seen
+            if first:
+                seen.add(row.id)
+                updates.append({'id': row.id, 'next_dose_time': now + timedelta(hours=row.frequency_hours)})
+            if row.miss_logged:
+                continue
+            if first:
+                logs.append({'medication_id': row.id, 'scheduled_time': row.next_dose_time,
+                             'status': 'missed', 'created_at': now})
+                misses.append((row.id, row.patient_id, now.date(), 'missed'))
+                alerts.append({
+                    'user_id': row.patient_id, 'type': 'missed_dose', 'severity': 'warning',
+                    'title': f'Missed Dose: {row.name}',
+                    'message': f'You missed your scheduled dose of {row.name} at {row.next_dose_time.strftime("%H:%M UTC")}.',
+                    'medication_id': row.id
+                })
+            if row.caregiver_id is not None:
+                alerts.append({
+                    'user_id': row.caregiver_id, 'type': 'missed_dose', 'severity': 'warning',
+                    'title': f'Missed Dose — {row.patient_name}: {row.name}',
+                    'message': f'{row.patient_name} missed their {row.name} dose.',
+                    'medication_id': row.id
+                })
+
+        if updates:
+            try:
+                if logs:
+                    db.session.execute(db.insert(DoseLog), logs)
+                    adherence.record_doses(misses)
+                    db.session.execute(db.insert(Alert), alerts)
+                db.session.execute(db.update(Medication), updates)
+                db.session.commit()
+                processed += len(logs)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"check_missed_doses error: {e}")
+                break
+
+    return processed
+
+
+def handle_due_doses(medication_ids):
+    """
+    Dose timer callback: log the misses that just came due and re-arm those
+    medications. One that is still overdue (the scan failed) is retried after
+    MISSED_DOSE_RETRY rather than at its past deadline.
+    """
+    check_missed_doses(medication_ids=medication_ids)
+    rows = db.session.execute(
+        db.select(Medication.id, Medication.next_dose_time)
+        .where(Medication.id.in_(medication_ids), Medication.is_active == True)
+    ).all()
+    retry_at = datetime.utcnow() - MISSED_DOSE_GRACE + MISSED_DOSE_RETRY
+    for med_id, next_dose_time in rows:
+        if next_dose_time is not None:
+            next_dose_time = max(next_dose_time, retry_at)
+        dose_timer.schedule(med_id, next_dose_time)
+
+
+def load_dose_timer():
+    rows = db.session.execute(
+        db.select(Medication.id, Medication.next_dose_time)
+        .where(Medication.is_active == True, Medication.next_dose_time.isnot(None))
+        .execution_options(yield_per=10000)
+    )
+    dose_timer.load(rows)
+
+
+def reconcile_missed_doses():
+    """Catch anything the dose timer missed (e.g. writes made by other processes) and reseed it."""
+    logged = check_missed_doses()
+    if logged:
+        logger.info(f"Missed-dose reconciliation logged {logged} miss(es) the dose timer did not fire")
+    load_dose_timer()
+
+
+LOW_STOCK_WATERMARK_OVERLAP = timedelta(minutes=1)
+
+# updated_at high-water mark of the last low-stock reconciliation in this process
+_low_stock_watermark = None
+
+
+def low_stock_key(medication_id):
+    """Alert.dedupe_key held by a medication's unread low-stock alert."""
+    return f'low_stock:{medication_id}'
+
+
+def insert_alerts(rows):
+    """Bulk-insert alert rows, skipping any whose dedupe_key is already held by another alert."""
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(Alert).on_conflict_do_nothing()
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(Alert).on_conflict_do_nothing()
+    else:
+        stmt = db.insert(Alert).prefix_with('IGNORE')
+    db.session.execute(stmt, rows)
+
+
+def _low_stock_alert(med_id, patient_id, name, current_stock, dose_unit):
+    return {
+        'user_id': patient_id, 'type': 'low_stock', 'severity': 'warning',
+        'title': f'Low Stock: {name}',
+        'message': f'Only {current_stock:.1f} {dose_unit} remaining.',
+        'medication_id': med_id, 'dedupe_key': low_stock_key(med_id)
+    }
+
+
+def alert_if_stock_crossed(med, previous_stock, previous_threshold=None):
+    """
+    Called by write paths that change stock or threshold. Adds a low-stock
+    alert to the current transaction when the medication has just dropped to
+    or below its threshold; the dedupe_key makes a repeat a no-op.
+    """
+    if previous_threshold is None:
+        previous_threshold = med.stock_threshold
+    was_low = previous_stock <= previous_threshold
+    if med.is_active and not was_low and med.current_stock <= med.stock_threshold:
+        insert_alerts([_low_stock_alert(med.id, med.patient_id, med.name, med.current_stock, med.dose_unit)])
+
+
+def low_stock_query(changed_since=None):
+    query = db.select(
+        Medication.id, Medication.patient_id, Medication.name,
+        Medication.current_stock, Medication.dose_unit
+    ).where(
         Medication.is_active == True,
         Medication.current_stock <= Medication.stock_threshold
-    ).all()
+    )
+    if changed_since is not None:
+        query = query.where(Medication.updated_at >= changed_since)
+    return query
 
-    for med in low_meds:
-        recent = Alert.query.filter_by(
-            user_id=med.patient_id, medication_id=med.id, type='low_stock', is_read=False
-        ).first()
-        if recent:
-            continue
-        db.session.add(Alert(
-            user_id=med.patient_id, type='low_stock', severity='warning',
-            title=f'Low Stock: {med.name}',
-            message=f'Only {med.current_stock:.1f} {med.dose_unit} remaining.',
-            medication_id=med.id
-        ))
+
+def check_low_stock():
+    """
+    Reconciliation for alert_if_stock_crossed: only medications updated since
+    the previous run are looked at (everything on the first run after start).
+    """
+    global _low_stock_watermark
+    started = datetime.utcnow()
+    query = low_stock_query(_low_stock_watermark)
 
     try:
+        insert_alerts([_low_stock_alert(*row) for row in db.session.execute(query).all()])
         db.session.commit()
     except Exception as e:
         db.session.rollback()
-        logger.error(f"check_low_stock error: {e}")
\ No newline at end of file
+        logger.error(f"check_low_stock error: {e}")
+        return
+    # Overlap the next window so rows committed while this scan ran aren't skipped
+    _low_stock_watermark = started - LOW_STOCK_WATERMARK_OVERLAP
@@ -0,0 +1,33 @@
+"""Shared setup for the benchmark scripts: a throwaway app on a temporary SQLite database."""
+import os
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+def temp_app():
+    """A fresh app on its own empty database, with no scheduler running."""
+    os.environ['SCHEDULER_MODE'] = 'off'
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='pulseguard-bench-'), 'bench.db')
+    from app import create_app
+    return create_app()
+
+
+class StatementCounter:
+    """Counts SQL statements sent to the app's engine."""
+
+    def __init__(self, app):
+        from sqlalchemy import event
+        from app import db
+        self.count = 0
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._seen)
+
+    def _seen(self, *args):
+        self.count += 1
+
+    def reset(self):
+        count, self.count = self.count, 0
+        return count
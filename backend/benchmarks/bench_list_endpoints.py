@@ -0,0 +1,92 @@
+"""
+Latency, SQL statement count and payload size of the list endpoints.
+
+    python benchmarks/bench_list_endpoints.py [--requests 30]
+
+Seeds 20 patients x 5 medications with 5 KB FDA label texts, 40 dose logs
+per medication and 30 unread alerts per patient, all linked to one
+caregiver. Each endpoint is requested --requests times with the response
+cache cleared, with and without ?include=label where it applies.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from _app import temp_app, StatementCounter
+
+LABEL = 'Lorem ipsum label text. ' * 200
+
+
+def seed(app, client):
+    from app import db
+    from app.models import Medication, DoseLog, Alert, CaregiverLink, UserProfile
+
+    def register(email, role='patient'):
+        body = client.post('/api/auth/register', json={'email': email, 'password': 'pw', 'name': email,
+                                                       'role': role}).get_json()
+        return {'Authorization': f"Bearer {body['token']}"}, body['user']['id']
+
+    caregiver_headers, caregiver_id = register('carer@example.com', 'caregiver')
+    patients = [register(f'p{i}@example.com') for i in range(20)]
+    now = datetime.utcnow()
+    with app.app_context():
+        for _, patient_id in patients:
+            db.session.add(CaregiverLink(caregiver_id=caregiver_id, patient_id=patient_id))
+            db.session.add(UserProfile(user_id=patient_id, age=40, allergies='none'))
+            for j in range(5):
+                db.session.add(Medication(
+                    patient_id=patient_id, name=f'Med {j}', form='tablet', dose_amount=1, dose_unit='mg',
+                    frequency_hours=8, half_life_hours=6, current_stock=50, next_dose_time=now,
+                    description=LABEL, side_effects=LABEL, boxed_warnings=LABEL if j == 0 else None))
+        db.session.commit()
+        db.session.execute(db.insert(DoseLog), [
+            {'medication_id': med_id, 'scheduled_time': now - timedelta(hours=k), 'status': 'taken',
+             'taken_time': now - timedelta(hours=k), 'created_at': now - timedelta(hours=k)}
+            for med_id in db.session.execute(db.select(Medication.id)).scalars() for k in range(40)
+        ])
+        db.session.execute(db.insert(Alert), [
+            {'user_id': patient_id, 'type': 'missed_dose', 'severity': 'info', 'title': 't', 'message': 'm' * 100,
+             'is_read': False, 'created_at': now}
+            for _, patient_id in patients for _ in range(30)
+        ])
+        db.session.commit()
+        first_med = db.session.execute(
+            db.select(Medication.id).where(Medication.patient_id == patients[0][1]).limit(1)
+        ).scalar()
+    return caregiver_headers, patients[0], first_med
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=30)
+    args = parser.parse_args()
+
+    app = temp_app()
+    client = app.test_client()
+    caregiver, (patient, patient_id), med_id = seed(app, client)
+    from app.services.data_version import response_cache
+    statements = StatementCounter(app)
+    cases = [
+        ('GET /medications/', patient, '/api/medications/'),
+        ('GET /medications/?include=label', patient, '/api/medications/?include=label'),
+        ('GET /alerts/', patient, '/api/alerts/'),
+        ('GET /doses/<id>/history', patient, f'/api/doses/{med_id}/history'),
+        ('GET /caregiver/patients', caregiver, '/api/caregiver/patients'),
+        ('GET /caregiver/patients?include=label', caregiver, '/api/caregiver/patients?include=label'),
+        ('GET /caregiver/patient-profile', caregiver, f'/api/caregiver/patient-profile/{patient_id}'),
+    ]
+    for name, headers, url in cases:
+        elapsed = 0.0
+        for _ in range(args.requests):
+            response_cache.clear()
+            statements.reset()
+            started = time.perf_counter()
+            r = client.get(url, headers=headers)
+            elapsed += time.perf_counter() - started
+            assert r.status_code == 200, (url, r.status_code)
+        print(f'{name:40s} {elapsed / args.requests * 1000:6.1f} ms  {statements.reset():3d} SQL  '
+              f'{len(r.data) / 1024:7.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
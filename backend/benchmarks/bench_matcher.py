@@ -0,0 +1,75 @@
+"""
+PatternMatcher against the substring loops it replaced.
+
+    python benchmarks/bench_matcher.py
+
+For each pattern-set size, times one lookup on a drug name and on an
+RxNav-style interaction description: the old substring loop, and
+PatternMatcher on its scan path and on its Aho-Corasick path. The production tables (18 keywords, ~30 combo members) sit below
+MATCHER_SCAN_THRESHOLD and use the scan path; the automaton pays off once a
+CRITICAL_COMBOS_FILE makes the combo table large.
+"""
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import matcher  # noqa: E402
+from app.services.drug_api import HIGH_SEVERITY_KEYWORDS, _COMBO_PARTNERS  # noqa: E402
+from app.services.matcher import PatternMatcher  # noqa: E402
+
+TEXTS = {
+    'name': 'Warfarin Sodium 5 MG Oral Tablet',
+    'description': 'The risk or severity of bleeding and hemorrhage can be increased when Warfarin is '
+                   'combined with Aspirin. Monitor closely; the combination may be life-threatening.',
+}
+SIZES = (18, 64, 256, 1024, 4096)
+
+
+def _patterns(n, rng):
+    base = list(dict.fromkeys(HIGH_SEVERITY_KEYWORDS + list(_COMBO_PARTNERS)))
+    extra = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12))) for _ in range(n)]
+    return (base + extra)[:n]
+
+
+def _build(patterns, automaton):
+    saved = matcher.MATCHER_SCAN_THRESHOLD
+    matcher.MATCHER_SCAN_THRESHOLD = 0 if automaton else 10 ** 9
+    try:
+        return PatternMatcher(patterns)
+    finally:
+        matcher.MATCHER_SCAN_THRESHOLD = saved
+
+
+def substring_matches(patterns, text):
+    """What the interaction checks did before PatternMatcher."""
+    text = text.lower()
+    return {p for p in patterns if p in text}
+
+
+def _per_call_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    rng = random.Random(0)
+    print(f"{'patterns':>8} {'text':>12} {'substring':>11} {'scan':>9} {'automaton':>10}   (us per lookup)")
+    for n in SIZES:
+        patterns = _patterns(n, rng)
+        scan, automaton = _build(patterns, False), _build(patterns, True)
+        number = max(200, 200000 // n)
+        for label, text in TEXTS.items():
+            expected = substring_matches(patterns, text)
+            assert scan.matches(text) == automaton.matches(text) == expected
+            old = _per_call_us(lambda: substring_matches(patterns, text), number)
+            new_scan = _per_call_us(lambda: scan.matches(text), number)
+            new_auto = _per_call_us(lambda: automaton.matches(text), number)
+            print(f'{n:>8} {label:>12} {old:>11.1f} {new_scan:>9.1f} {new_auto:>10.1f}')
+    print(f'MATCHER_SCAN_THRESHOLD = {matcher.MATCHER_SCAN_THRESHOLD}')
+
+
+if __name__ == '__main__':
+    main()
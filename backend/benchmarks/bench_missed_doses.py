@@ -0,0 +1,96 @@
+"""
+The set-based, keyset-chunked missed-dose scan against the per-medication
+loop it replaced.
+
+    python benchmarks/bench_missed_doses.py [--meds 20000] [--skip-per-row]
+
+Seeds --meds active medications (half of them overdue) over meds/4 patients,
+a third of whom have a caregiver, then times one scan of each kind on its
+own copy of the data, and a second scan that should find nothing left to do.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from _app import temp_app, StatementCounter
+
+
+def per_row_check_missed_doses():
+    """check_missed_doses as it was: one query per medication, patient and caregiver list."""
+    from app import db
+    from app.models import Medication, DoseLog, Alert, User, CaregiverLink
+    threshold = datetime.utcnow() - timedelta(minutes=15)
+    overdue_meds = Medication.query.filter(
+        Medication.is_active == True, Medication.next_dose_time <= threshold
+    ).all()
+    for med in overdue_meds:
+        if DoseLog.query.filter(
+            DoseLog.medication_id == med.id, DoseLog.status == 'missed',
+            DoseLog.scheduled_time >= med.next_dose_time - timedelta(minutes=1)
+        ).first():
+            continue
+        db.session.add(DoseLog(medication_id=med.id, scheduled_time=med.next_dose_time, status='missed'))
+        db.session.add(Alert(user_id=med.patient_id, type='missed_dose', severity='warning',
+                             title=f'Missed Dose: {med.name}', message='missed', medication_id=med.id))
+        patient = db.session.get(User, med.patient_id)
+        for link in CaregiverLink.query.filter_by(patient_id=med.patient_id).all():
+            db.session.add(Alert(user_id=link.caregiver_id, type='missed_dose', severity='warning',
+                                 title=f'Missed Dose — {patient.name}: {med.name}', message='missed',
+                                 medication_id=med.id))
+        med.next_dose_time = datetime.utcnow() + timedelta(hours=med.frequency_hours)
+    db.session.commit()
+    return len(overdue_meds)
+
+
+def seed(app, n):
+    from app import db
+    from app.models import Medication, User, CaregiverLink
+    now = datetime.utcnow()
+    patients = n // 4 + 1
+    caregiver = patients + 1
+    with app.app_context():
+        db.session.execute(db.insert(User), [
+            {'id': i, 'email': f'p{i}@example.com', 'password_hash': 'x', 'name': f'Patient {i}', 'role': 'patient'}
+            for i in range(1, patients + 1)
+        ] + [{'id': caregiver, 'email': 'cg@example.com', 'password_hash': 'x', 'name': 'Carer', 'role': 'caregiver'}])
+        db.session.execute(db.insert(CaregiverLink), [
+            {'caregiver_id': caregiver, 'patient_id': i} for i in range(1, patients + 1, 3)
+        ])
+        db.session.execute(db.insert(Medication), [
+            {'patient_id': i // 4 + 1, 'name': f'Med {i}', 'form': 'tablet', 'dose_amount': 1, 'dose_unit': 'mg',
+             'frequency_hours': 8, 'current_stock': 10, 'stock_threshold': 5, 'is_active': True,
+             'next_dose_time': now - timedelta(minutes=30) if i % 2 else now + timedelta(minutes=30)}
+            for i in range(n)
+        ])
+        db.session.commit()
+
+
+def run(label, n, scan):
+    app = temp_app()
+    seed(app, n)
+    statements = StatementCounter(app)
+    with app.app_context():
+        started = time.perf_counter()
+        scan()
+        elapsed = time.perf_counter() - started
+        first = statements.reset()
+        started = time.perf_counter()
+        scan()
+        again = time.perf_counter() - started
+    print(f'{label:>10}: {elapsed:7.2f} s  {first:7d} SQL   second run {again:6.2f} s  {statements.reset():6d} SQL')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--meds', type=int, default=20000)
+    parser.add_argument('--skip-per-row', action='store_true', help="don't time the old per-medication loop")
+    args = parser.parse_args()
+    from app.tasks import check_missed_doses
+    print(f'{args.meds} active medications, {args.meds // 2} overdue')
+    run('set-based', args.meds, check_missed_doses)
+    if not args.skip_per_row:
+        run('per-row', args.meds, per_row_check_missed_doses)
+
+
+if __name__ == '__main__':
+    main()
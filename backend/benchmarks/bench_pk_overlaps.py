@@ -0,0 +1,55 @@
+"""
+The sweep-line PK overlap search against the pairwise check it replaced.
+
+    python benchmarks/bench_pk_overlaps.py
+
+Builds random regimens from the CRITICAL_DRUG_COMBOS members plus a few
+drugs in no combo, then times find_pk_overlaps against calling
+check_pharmacokinetic_interactions on every pair. The pairwise check treats
+its first medication as dosed right now, so hit counts differ. That the
+sweep finds exactly the overlapping pairs is tested in tests/test_pk_overlaps.py.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import _app  # noqa: F401  (puts the backend on sys.path)
+from app.services.drug_api import check_pharmacokinetic_interactions, CRITICAL_DRUG_COMBOS
+from app.services.pk_overlaps import find_pk_overlaps
+
+NAMES = sorted({name for combo in CRITICAL_DRUG_COMBOS for name in combo}) + [
+    'vitamin d', 'lisinopril', 'amlodipine', 'atorvastatin', 'omeprazole',
+]
+
+
+def regimen(n, patients=1, seed=1, now=None):
+    rng = random.Random(seed)
+    return [SimpleNamespace(
+        id=i, patient_id=i % patients, name=f'{rng.choice(NAMES)} {i}', half_life_hours=rng.uniform(1, 48),
+        next_dose_time=now + timedelta(hours=rng.uniform(-72, 24)), last_taken_time=None,
+    ) for i in range(n)]
+
+
+def main():
+    now = datetime.utcnow()
+    for n in (50, 200, 500):
+        meds = regimen(n, now=now)
+        started = time.perf_counter()
+        sweep = find_pk_overlaps(meds, last_doses={}, now=now)
+        t_sweep = time.perf_counter() - started
+        started = time.perf_counter()
+        pairwise = [hit for i, a in enumerate(meds) for b in meds[i + 1:]
+                    for hit in check_pharmacokinetic_interactions(a, [b])]
+        t_pairwise = time.perf_counter() - started
+        print(f'{n:>5} meds: sweep {t_sweep * 1000:7.1f} ms ({len(sweep)} hits)   '
+              f'pairwise {t_pairwise * 1000:8.1f} ms ({len(pairwise)} hits)')
+
+    meds = regimen(5000, patients=500, now=now)
+    started = time.perf_counter()
+    hits = find_pk_overlaps(meds, last_doses={}, now=now)
+    print(f'roster of 500 patients x 10 meds: sweep {(time.perf_counter() - started) * 1000:.1f} ms ({len(hits)} hits)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+from apscheduler.schedulers.blocking import BlockingScheduler
+import os
+
+# This process runs the periodic jobs itself, so create_app must not start the embedded scheduler
+os.environ['SCHEDULER_MODE'] = 'external'
+
+from app import create_app, start_scheduler
+
+app = create_app()
+
+if __name__ == '__main__':
+    start_scheduler(app, BlockingScheduler())
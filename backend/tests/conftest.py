@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['SCHEDULER_MODE'] = 'off'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    from app import create_app
+    from app.services.data_version import response_cache
+    app = create_app()
+    app.config['TESTING'] = True
+    # ETags are built from ids and versions, which repeat from one test database to the next
+    response_cache.clear()
+    yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def register(client):
+    """register(email, role='patient') -> (auth headers, user id)"""
+    def register(email, role='patient', password='pw', name='Test User'):
+        r = client.post('/api/auth/register', json={'email': email, 'password': password, 'name': name, 'role': role})
+        assert r.status_code == 201, r.get_json()
+        body = r.get_json()
+        return {'Authorization': f"Bearer {body['token']}"}, body['user']['id']
+    return register
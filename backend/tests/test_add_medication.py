@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Medication
+from app.services import medication_pipeline
+
+NEW_MED = {'name': 'Warfarin', 'form': 'tablet', 'dose_amount': 5, 'dose_unit': 'mg',
+           'frequency_hours': 24, 'current_stock': 30, 'half_life_hours': 1}
+
+
+@pytest.fixture
+def patient(app, register):
+    headers, patient_id = register('pat@example.com')
+    with app.app_context():
+        db.session.add(Medication(patient_id=patient_id, name='Aspirin', rxcui='1191', form='tablet',
+                                  dose_amount=1, dose_unit='mg', frequency_hours=24, half_life_hours=1,
+                                  current_stock=30, next_dose_time=datetime.utcnow() + timedelta(hours=30)))
+        db.session.commit()
+    return headers
+
+
+@pytest.fixture
+def verdict(monkeypatch):
+    verdict = {'has_critical': False, 'critical_interactions': [], 'all_interactions': [],
+               'partial': False, 'unchecked_rxcuis': []}
+    monkeypatch.setattr(medication_pipeline, 'resolve_rxcui', lambda name, deadline=None: '11289')
+    monkeypatch.setattr(medication_pipeline, 'check_drug_interactions', lambda new, existing: verdict)
+    monkeypatch.setattr(medication_pipeline.enrichment, 'fill_label', lambda med: None)
+    return verdict
+
+
+def test_add_reports_complete_interaction_check(client, patient, verdict):
+    r = client.post('/api/medications/', json=NEW_MED, headers=patient)
+    assert r.status_code == 201
+    assert r.get_json()['interaction_check'] == {'partial': False, 'unchecked_rxcuis': []}
+
+
+def test_add_fails_closed_when_interaction_check_is_partial(client, patient, verdict):
+    verdict.update(partial=True, unchecked_rxcuis=['1191'])
+    r = client.post('/api/medications/', json=NEW_MED, headers=patient)
+    assert r.status_code == 503
+    assert r.headers['Retry-After'] == str(medication_pipeline.INTERACTION_CHECK_RETRY_AFTER_SECONDS)
+    assert r.get_json()['unchecked_rxcuis'] == ['1191']
+    assert client.get('/api/medications/', headers=patient).get_json()[-1]['name'] == 'Aspirin'
+
+
+def test_add_fails_closed_when_rxcui_lookup_fails(client, patient, verdict, monkeypatch):
+    def down(name, deadline=None):
+        raise medication_pipeline.RxcuiLookupFailed(name)
+    monkeypatch.setattr(medication_pipeline, 'resolve_rxcui', down)
+    r = client.post('/api/medications/', json=NEW_MED, headers=patient)
+    assert r.status_code == 503
+    assert r.get_json()['error'] == 'INTERACTION_CHECK_INCOMPLETE'
+    assert r.get_json()['unchecked_rxcuis'] == ['1191']
+    assert 'Retry-After' in r.headers
+    assert [m['name'] for m in client.get('/api/medications/', headers=patient).get_json()] == ['Aspirin']
+
+
+def test_failed_rxcui_lookup_with_nothing_to_check_adds(client, register, verdict, monkeypatch):
+    def down(name, deadline=None):
+        raise medication_pipeline.RxcuiLookupFailed(name)
+    monkeypatch.setattr(medication_pipeline, 'resolve_rxcui', down)
+    headers, _ = register('new@example.com')
+    r = client.post('/api/medications/', json=NEW_MED, headers=headers)
+    assert r.status_code == 201
+    assert r.get_json()['rxcui'] is None
+
+
+def test_partial_check_without_rxnav_is_reported(client, patient, verdict, monkeypatch):
+    monkeypatch.setattr(medication_pipeline, 'RXNAV_FALLBACK', False)
+    verdict.update(partial=True, unchecked_rxcuis=['1191'])
+    r = client.post('/api/medications/', json=NEW_MED, headers=patient)
+    assert r.status_code == 201
+    assert r.get_json()['interaction_check'] == {'partial': True, 'unchecked_rxcuis': ['1191']}
+
+
+def test_memoized_rxcui_is_not_looked_up_again(app, patient, verdict, monkeypatch):
+    from app.services.request_memo import request_memo
+    from app.services.cache import normalize_drug_name
+
+    def no_submit(*args):
+        raise AssertionError('rxcui lookup submitted although it was memoized')
+    monkeypatch.setattr(medication_pipeline, 'submit', no_submit)
+    with app.test_request_context():
+        request_memo(('rxcui', normalize_drug_name('Warfarin')), lambda: '11289')
+        patient_id = db.session.execute(db.select(Medication.patient_id)).scalar()
+        body, status = medication_pipeline.AddMedicationPipeline(patient_id, NEW_MED).run()
+    assert status == 201
+    assert body['rxcui'] == '11289'
+
+
+def test_zero_frequency_is_rejected(client, patient, verdict):
+    r = client.post('/api/medications/', json={**NEW_MED, 'frequency_hours': 0}, headers=patient)
+    assert r.status_code == 400
+    med_id = client.get('/api/medications/', headers=patient).get_json()[-1]['id']
+    r = client.put(f'/api/medications/{med_id}', json={'frequency_hours': 0}, headers=patient)
+    assert r.status_code == 400
+    assert client.get('/api/medications/', headers=patient).get_json()[-1]['frequency_hours'] == 24
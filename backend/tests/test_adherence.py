@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Medication
+from app.services import adherence
+
+
+def test_compliance_window_covers_exactly_days_calendar_days(app, register):
+    _, patient_id = register('pat@example.com')
+    with app.app_context():
+        med = Medication(patient_id=patient_id, name='Aspirin', form='tablet', dose_amount=1, dose_unit='mg',
+                         frequency_hours=24, current_stock=30)
+        db.session.add(med)
+        db.session.flush()
+        today = datetime.utcnow().date()
+        adherence.record_doses([
+            (med.id, patient_id, today, 'taken'),
+            (med.id, patient_id, today - timedelta(days=6), 'taken'),
+            # One day before a 7-day window
+            (med.id, patient_id, today - timedelta(days=7), 'missed'),
+        ])
+        db.session.commit()
+
+        assert adherence.compliance_by_patient([patient_id], 7) == {patient_id: 100.0}
+        assert adherence.compliance_by_patient([patient_id], 8) == {patient_id: 66.7}
+        assert adherence.compliance_by_patient([patient_id], 1) == {patient_id: 100.0}
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Alert
+from app.services.alert_bus import AlertBus, Relay
+
+
+def _token(headers):
+    return headers['Authorization'].split()[1]
+
+
+def test_query_string_token_only_accepted_by_stream(client, register):
+    headers, _ = register('pat@example.com')
+    token = _token(headers)
+    assert client.get(f'/api/alerts/?jwt={token}').status_code == 401
+    assert client.get(f'/api/medications/?jwt={token}').status_code == 401
+
+    r = client.get(f'/api/alerts/stream?jwt={token}', buffered=False)
+    assert r.status_code == 200
+    assert next(r.response) == b'retry: 5000\n\n'
+    r.close()
+
+
+def test_relay_publishes_alerts_committed_elsewhere(app, register):
+    _, uid = register('pat@example.com')
+    bus = AlertBus()
+    relay = Relay(bus, interval=1)
+    sub = bus.subscribe({uid})
+    with app.app_context():
+        relay.poll()
+        # Written straight through the engine, as another process would: the session events never see it
+        with db.engine.begin() as conn:
+            conn.execute(db.insert(Alert).values(user_id=uid, type='missed_dose', title='t', message='m'))
+        assert relay.poll() == {uid}
+        assert sub.wait(0) == {uid}
+        assert relay.poll() == set()
+
+
+@pytest.fixture
+def alerts(app, register):
+    """(auth headers, alert ids oldest first) for a patient with seven alerts an hour apart"""
+    headers, uid = register('pat@example.com')
+    _, other = register('other@example.com')
+    start = datetime(2026, 1, 1, 8, 0)
+    with app.app_context():
+        db.session.add(Alert(user_id=other, type='missed_dose', title='not yours', message='m', created_at=start))
+        rows = [Alert(user_id=uid, type='missed_dose', title=f'a{i}', message='m', is_read=i % 2 == 0,
+                      created_at=start + timedelta(hours=i)) for i in range(7)]
+        db.session.add_all(rows)
+        db.session.commit()
+        return headers, [a.id for a in rows]
+
+
+def _page(client, headers, query):
+    r = client.get(f'/api/alerts/?{query}', headers=headers)
+    assert r.status_code == 200, r.get_json()
+    return [a['id'] for a in r.get_json()], r.headers.get('X-Next-Cursor')
+
+
+def test_since_pages_forward_without_gaps(client, alerts):
+    headers, ids = alerts
+    seen, cursor = [], ids[0]
+    while True:
+        page, cursor = _page(client, headers, f'since={cursor}&limit=2')
+        if not page:
+            break
+        assert page == sorted(page, reverse=True)
+        seen += page[::-1]
+        assert cursor == str(page[0])
+    assert seen == ids[1:]
+    assert cursor == str(ids[-1])
+
+
+def test_since_accepts_an_iso_timestamp(client, alerts):
+    headers, ids = alerts
+    assert _page(client, headers, 'since=2026-01-01T11:30:00')[0] == ids[:3:-1]
+    assert _page(client, headers, 'since=2026-01-01T11:30:00Z')[0] == ids[:3:-1]
+    assert _page(client, headers, 'since=2026-01-01T12:30:00%2B01:00')[0] == ids[:3:-1]
+
+
+def test_invalid_since_is_a_bad_request(client, alerts):
+    headers, _ = alerts
+    r = client.get('/api/alerts/?since=yesterday', headers=headers)
+    assert r.status_code == 400
+    assert 'since' in r.get_json()['error']
+
+
+def test_before_pages_back_through_history(client, alerts):
+    headers, ids = alerts
+    assert _page(client, headers, 'limit=3') == (ids[:3:-1], None)
+    seen, cursor = [], ids[-1] + 1
+    while cursor:
+        page, cursor = _page(client, headers, f'before={cursor}&limit=3')
+        seen += page
+    assert seen == ids[::-1]
+
+    unread, _ = _page(client, headers, f'before={ids[-1]}&unread=true')
+    assert unread == [ids[5], ids[3], ids[1]]
+
+
+def test_limit_is_clamped(client, alerts, monkeypatch):
+    from app.routes import alerts as alerts_route
+    headers, ids = alerts
+    assert len(_page(client, headers, 'limit=0')[0]) == 1
+    assert len(_page(client, headers, 'limit=-5')[0]) == 1
+    monkeypatch.setattr(alerts_route, 'ALERTS_MAX_PAGE', 4)
+    assert len(_page(client, headers, 'limit=1000')[0]) == 4
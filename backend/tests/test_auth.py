@@ -0,0 +1,29 @@
+def test_login_and_me_include_profile(client, register):
+    headers, user_id = register('pat@example.com')
+    r = client.post('/api/profile', json={'age': 70, 'blood_type': 'O+'}, headers=headers)
+    assert r.status_code == 201
+
+    r = client.post('/api/auth/login', json={'email': 'pat@example.com', 'password': 'pw'})
+    assert r.status_code == 200
+    user = r.get_json()['user']
+    assert user['id'] == user_id
+    assert user['profile']['age'] == 70
+    assert user['profile']['blood_type'] == 'O+'
+
+    r = client.get('/api/auth/me', headers=headers)
+    assert r.status_code == 200
+    assert r.get_json()['profile']['user_id'] == user_id
+
+
+def test_user_without_profile(client, register):
+    headers, _ = register('new@example.com')
+    assert client.get('/api/auth/me', headers=headers).get_json()['profile'] is None
+
+
+def test_link_patient_with_profile(client, register):
+    patient_headers, patient_id = register('p@example.com')
+    client.post('/api/profile', json={'age': 80}, headers=patient_headers)
+    caregiver_headers, _ = register('c@example.com', role='caregiver')
+    r = client.post('/api/caregiver/link-patient', json={'patient_email': 'p@example.com'}, headers=caregiver_headers)
+    assert r.status_code == 201
+    assert r.get_json()['patient']['profile']['age'] == 80
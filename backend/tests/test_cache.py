@@ -0,0 +1,88 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import DrugLookupCache
+from app.services.cache import TTLCache, DrugCache, MISSING, interaction_pair_key
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl_seconds=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)  # evicts b, the least recently used
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    cache.set('short', 4, ttl_seconds=0.05)
+    time.sleep(0.1)
+    assert cache.get('short', 'gone') == 'gone'
+
+
+@pytest.fixture
+def cache(app):
+    with app.app_context():
+        yield DrugCache('test', ttl_hours=1, negative_ttl_hours=0.5)
+
+
+def test_memory_miss_falls_through_to_the_shared_tier(cache):
+    cache.set('warfarin', {'rxcui': '11289'})
+    assert cache.get('warfarin') == {'rxcui': '11289'}
+    assert cache.counters['memory_hits'] == 1
+
+    cache.memory.clear()  # as another worker process would see it
+    assert cache.get_memory('warfarin') is None
+    assert cache.get('warfarin') == {'rxcui': '11289'}
+    assert cache.counters['db_hits'] == 1
+    assert cache.get_memory('warfarin') == {'rxcui': '11289'}  # refilled from the shared tier
+
+    assert cache.get('aspirin') is None
+    assert cache.counters['misses'] == 1
+
+
+def test_expired_shared_entries_are_misses(cache):
+    cache.set('warfarin', '11289')
+    cache.memory.clear()
+    with db.engine.begin() as conn:
+        conn.execute(db.update(DrugLookupCache).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    assert cache.get('warfarin') is None
+
+
+def test_memory_tier_never_outlives_the_shared_entry(cache):
+    cache.set('warfarin', '11289')
+    cache.memory.clear()
+    with db.engine.begin() as conn:
+        conn.execute(db.update(DrugLookupCache).values(expires_at=datetime.utcnow() + timedelta(seconds=0.3)))
+    assert cache.get('warfarin') == '11289'
+    time.sleep(0.4)
+    assert cache.get_memory('warfarin') is None
+
+
+def test_negative_entries(cache):
+    cache.set('nosuchdrug', MISSING)
+    assert cache.get('nosuchdrug') is MISSING
+    cache.memory.clear()
+    assert cache.get('nosuchdrug') is MISSING
+    assert cache.counters['negative_hits'] == 2
+
+    row = db.session.execute(db.select(DrugLookupCache).where(DrugLookupCache.lookup_key == 'nosuchdrug')).scalar()
+    assert row.value is None
+    assert row.expires_at - datetime.utcnow() < timedelta(hours=0.5)
+
+    cache.invalidate('nosuchdrug')
+    assert cache.get('nosuchdrug') is None
+
+
+def test_memory_only_outside_an_app_context():
+    cache = DrugCache('test')
+    cache.set('warfarin', '11289')
+    assert cache.get('warfarin') == '11289'
+    cache.memory.clear()
+    assert cache.get('warfarin') is None
+
+
+def test_interaction_pair_key_ignores_argument_order():
+    assert interaction_pair_key('11289', '1191') == interaction_pair_key('1191', '11289')
+    assert interaction_pair_key(11289, '1191') == interaction_pair_key('1191', 11289)
+    assert interaction_pair_key('1', '12') != interaction_pair_key('11', '2')
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Medication, DoseLog, Alert
+from app.services.data_version import response_cache
+
+
+# name -> (taken hours ago, missed hours ago, critical alert, current stock)
+PATIENTS = {
+    'steady': ([30, 20, 10], [], False, 30),
+    'critical': ([5], [], True, 30),
+    'low-stock': ([5], [], False, 2),
+    'just-missed': ([30, 20, 10, 5], [0.5], False, 30),
+    'lapsed': ([30], [20, 10], False, 30),
+    'new': ([], [], False, 30),
+    'steady-too': ([12], [], False, 30),
+}
+
+
+@pytest.fixture(scope='module')
+def linked(tmp_path_factory):
+    """(app, caregiver auth headers, {patient id: name}) for a caregiver linked to every patient in PATIENTS"""
+    from app import create_app
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', f"sqlite:///{tmp_path_factory.mktemp('caregiver') / 'test.db'}")
+        app = create_app()
+    response_cache.clear()
+    client = app.test_client()
+
+    def register(email, role='patient'):
+        body = client.post('/api/auth/register', json={'email': email, 'password': 'pw', 'name': email,
+                                                       'role': role}).get_json()
+        return {'Authorization': f"Bearer {body['token']}"}, body['user']['id']
+
+    headers, _ = register('care@example.com', role='caregiver')
+    patients = {}
+    for name, (taken, missed, critical, stock) in PATIENTS.items():
+        patient, patient_id = register(f'{name}@example.com')
+        patients[patient_id] = name
+        with app.app_context():
+            med = Medication(patient_id=patient_id, name=f'{name} pill', form='tablet', dose_amount=1,
+                             dose_unit='mg', frequency_hours=8, half_life_hours=1, current_stock=stock + len(taken),
+                             stock_threshold=5, next_dose_time=datetime.utcnow() + timedelta(hours=1))
+            db.session.add(med)
+            if critical:
+                db.session.add(Alert(user_id=patient_id, type='drug_interaction', severity='critical',
+                                     title='Critical', message='...'))
+            db.session.commit()
+            med_id = med.id
+        events = [('taken', h) for h in taken] + [('missed', h) for h in missed]
+        if events:
+            r = client.post('/api/doses/batch', headers=patient, json={'doses': [
+                {'medication_id': med_id, 'idempotency_key': f'{status}-{h}', 'status': status,
+                 'taken_time': (datetime.utcnow() - timedelta(hours=h)).isoformat()}
+                for status, h in events
+            ]})
+            assert r.get_json()['created'] == len(events)
+        r = client.post('/api/caregiver/link-patient', json={'patient_email': f'{name}@example.com'}, headers=headers)
+        assert r.status_code == 201
+    return app, headers, patients
+
+
+def per_patient_summary(patient_id):
+    """The summary figures as the original one-patient-at-a-time loop worked them out."""
+    now = datetime.utcnow()
+    meds = Medication.query.filter_by(patient_id=patient_id, is_active=True).all()
+    logs = DoseLog.query.join(Medication).filter(
+        Medication.patient_id == patient_id, DoseLog.created_at >= now - timedelta(days=6)
+    ).all()
+    taken = sum(1 for log in logs if log.status == 'taken')
+    compliance = round((taken / len(logs) * 100) if logs else 100, 1)
+    critical = Alert.query.filter_by(user_id=patient_id, is_read=False, severity='critical').count()
+    low_stock = [m.name for m in meds if m.current_stock <= m.stock_threshold]
+    missed_recent = DoseLog.query.join(Medication).filter(
+        Medication.patient_id == patient_id, DoseLog.status == 'missed',
+        DoseLog.created_at >= now - timedelta(hours=2)
+    ).first() is not None
+    status = 'red' if (critical or compliance < 60) else \
+             'yellow' if (missed_recent or low_stock or compliance < 80) else 'green'
+    return {'compliance_percent': compliance, 'critical_alert_count': critical,
+            'low_stock_meds': low_stock, 'has_missed_dose': missed_recent, 'status': status}
+
+
+def pages(client, headers, query):
+    """(page sizes, patient ids in order) following X-Next-Cursor to the end."""
+    sizes, ids, cursor = [], [], None
+    while True:
+        r = client.get(f'/api/caregiver/patients?{query}' + (f'&cursor={cursor}' if cursor else ''), headers=headers)
+        assert r.status_code == 200
+        sizes.append(len(r.get_json()))
+        ids += [p['patient']['id'] for p in r.get_json()]
+        cursor = r.headers.get('X-Next-Cursor')
+        if cursor is None:
+            return sizes, ids
+
+
+def test_summaries_match_the_per_patient_computation(linked):
+    app, headers, patients = linked
+    client = app.test_client()
+    body = client.get('/api/caregiver/patients', headers=headers).get_json()
+    assert [p['patient']['id'] for p in body] == sorted(patients)
+    with app.app_context():
+        for summary in body:
+            expected = per_patient_summary(summary['patient']['id'])
+            assert {k: summary[k] for k in expected} == expected, patients[summary['patient']['id']]
+    statuses = {patients[p['patient']['id']]: p['status'] for p in body}
+    assert statuses == {'steady': 'green', 'critical': 'red', 'low-stock': 'yellow', 'just-missed': 'yellow',
+                        'lapsed': 'red', 'new': 'green', 'steady-too': 'green'}
+
+
+def test_cursor_pages_cover_every_patient_once(linked):
+    app, headers, patients = linked
+    client = app.test_client()
+    sizes, ids = pages(client, headers, 'limit=3')
+    assert sizes == [3, 3, 1]
+    assert ids == sorted(patients)
+
+
+def test_status_filter_pages(linked):
+    app, headers, patients = linked
+    client = app.test_client()
+    sizes, ids = pages(client, headers, 'status=yellow,red&limit=2')
+    assert sizes == [2, 2]
+    assert sorted(patients[i] for i in ids) == ['critical', 'just-missed', 'lapsed', 'low-stock']
+    body = client.get('/api/caregiver/patients?status=green', headers=headers).get_json()
+    assert {patients[p['patient']['id']] for p in body} == {'steady', 'new', 'steady-too'}
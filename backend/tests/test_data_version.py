@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Medication, DoseLog, Alert, User
+from app.services import medication_pipeline
+
+
+@pytest.fixture
+def patient(app, register):
+    """(patient auth headers, patient id, id of one of their medications)"""
+    headers, patient_id = register('pat@example.com')
+    with app.app_context():
+        med = Medication(patient_id=patient_id, name='Aspirin', form='tablet', dose_amount=1, dose_unit='mg',
+                         frequency_hours=8, half_life_hours=1, current_stock=30,
+                         next_dose_time=datetime.utcnow() + timedelta(hours=1))
+        db.session.add(med)
+        db.session.add(Alert(user_id=patient_id, type='info', severity='info', title='Hello', message='...'))
+        db.session.commit()
+        return headers, patient_id, med.id
+
+
+def version(app, patient_id):
+    with app.app_context():
+        return db.session.get(User, patient_id).data_version
+
+
+def etag(client, headers):
+    r = client.get('/api/medications/', headers=headers)
+    assert r.status_code == 200
+    return r.headers['ETag']
+
+
+def test_unchanged_list_answers_304(client, patient):
+    headers = patient[0]
+    tag = etag(client, headers)
+    assert tag
+    r = client.get('/api/medications/', headers={**headers, 'If-None-Match': tag})
+    assert r.status_code == 304
+    assert r.headers['ETag'] == tag
+    assert not r.data
+
+
+def test_writes_bump_the_version_and_the_etag(app, client, patient, monkeypatch):
+    headers, patient_id, med_id = patient
+    monkeypatch.setattr(medication_pipeline, 'resolve_rxcui', lambda name, deadline=None: None)
+    monkeypatch.setattr(medication_pipeline.enrichment, 'fill_label', lambda med: None)
+
+    def bumped(write):
+        before_version, before_tag = version(app, patient_id), etag(client, headers)
+        write()
+        assert version(app, patient_id) > before_version
+        assert etag(client, headers) != before_tag
+
+    bumped(lambda: client.post('/api/medications/', headers=headers, json={
+        'name': 'Ibuprofen', 'dose_amount': 1, 'frequency_hours': 8, 'current_stock': 30}))
+    bumped(lambda: client.post(f'/api/doses/{med_id}/log', headers=headers, json={'status': 'taken'}))
+    with app.app_context():
+        alert_id = db.session.execute(db.select(Alert.id).where(Alert.user_id == patient_id)).scalar()
+    bumped(lambda: client.put(f'/api/alerts/{alert_id}/read', headers=headers))
+
+
+def test_bulk_statements_bump_the_version(app, patient):
+    _, patient_id, med_id = patient
+    now = datetime.utcnow()
+
+    before = version(app, patient_id)
+    with app.app_context():
+        db.session.execute(db.insert(DoseLog), [
+            {'medication_id': med_id, 'scheduled_time': now, 'status': 'missed', 'created_at': now},
+        ])
+        db.session.commit()
+    assert version(app, patient_id) == before + 1
+
+    with app.app_context():
+        db.session.execute(db.update(Medication), [{'id': med_id, 'next_dose_time': now + timedelta(hours=8)}])
+        db.session.commit()
+    assert version(app, patient_id) == before + 2
+
+    with app.app_context():
+        db.session.execute(db.insert(Alert), [
+            {'user_id': patient_id, 'type': 'info', 'severity': 'info', 'title': 'Bulk', 'message': '...'},
+        ])
+        db.session.commit()
+    assert version(app, patient_id) == before + 3
+
+
+def test_rolled_back_writes_do_not_bump(app, patient):
+    _, patient_id, med_id = patient
+    before = version(app, patient_id)
+    with app.app_context():
+        db.session.get(Medication, med_id).current_stock = 1
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+    assert version(app, patient_id) == before
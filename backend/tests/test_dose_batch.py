@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Medication, DoseLog
+from app.services import dose_batch
+
+
+@pytest.fixture
+def patient(app, register):
+    """(patient auth headers, id of one of their medications)"""
+    headers, patient_id = register('pat@example.com')
+    with app.app_context():
+        med = Medication(patient_id=patient_id, name='Aspirin', form='tablet', dose_amount=1, dose_unit='mg',
+                         frequency_hours=8, half_life_hours=1, current_stock=30,
+                         next_dose_time=datetime.utcnow() + timedelta(hours=1))
+        db.session.add(med)
+        db.session.commit()
+        return headers, med.id
+
+
+def dose(med_id, key, hours_ago, status='taken'):
+    return {'medication_id': med_id, 'idempotency_key': key, 'status': status,
+            'taken_time': (datetime.utcnow() - timedelta(hours=hours_ago)).isoformat()}
+
+
+def post(client, headers, *doses):
+    r = client.post('/api/doses/batch', json={'doses': list(doses)}, headers=headers)
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()
+
+
+def medication(app, med_id):
+    with app.app_context():
+        med = db.session.get(Medication, med_id)
+        db.session.expunge(med)
+        return med
+
+
+def log_count(app):
+    with app.app_context():
+        return db.session.execute(db.select(db.func.count(DoseLog.id))).scalar()
+
+
+def test_replayed_batch_is_idempotent(app, client, patient):
+    headers, med_id = patient
+    doses = [dose(med_id, 'a', 3), dose(med_id, 'b', 2)]
+    first = post(client, headers, *doses)
+    assert first['created'] == 2
+    second = post(client, headers, *doses)
+    assert (second['created'], second['duplicates']) == (0, 2)
+    assert [r['log']['id'] for r in second['results']] == [r['log']['id'] for r in first['results']]
+    assert log_count(app) == 2
+    assert medication(app, med_id).current_stock == 28
+
+
+def test_key_repeated_within_a_batch_is_logged_once(app, client, patient):
+    headers, med_id = patient
+    body = post(client, headers, dose(med_id, 'a', 2), dose(med_id, 'a', 1))
+    first, repeat = body['results']
+    assert (first['result'], repeat['result']) == ('created', 'duplicate')
+    assert repeat['log']['id'] == first['log']['id']
+    assert log_count(app) == 1
+
+
+def test_out_of_order_events_keep_the_ring_in_time_order(app, client, patient):
+    headers, med_id = patient
+    post(client, headers, dose(med_id, 'a', 1), dose(med_id, 'b', 3), dose(med_id, 'c', 2))
+    med = medication(app, med_id)
+    ring = med.recent_taken()
+    assert ring == sorted(ring) and len(ring) == 3
+    assert med.last_taken_time == ring[-1]
+    assert med.next_dose_time == ring[-1] + timedelta(hours=8)
+
+    # A late event older than everything recorded moves neither the last dose nor the schedule
+    post(client, headers, dose(med_id, 'd', 5))
+    late = medication(app, med_id)
+    assert late.last_taken_time == med.last_taken_time
+    assert late.next_dose_time == med.next_dose_time
+    assert late.recent_taken()[0] < ring[0]
+
+
+def test_caregiver_may_log_only_for_linked_patients(client, register, patient):
+    _, med_id = patient
+    caregiver, _ = register('care@example.com', role='caregiver')
+    body = post(client, caregiver, dose(med_id, 'a', 1), dose(med_id + 100, 'b', 1))
+    assert [(r['result'], r['code']) for r in body['results']] == [('error', 403), ('error', 404)]
+
+    client.post('/api/caregiver/link-patient', json={'patient_email': 'pat@example.com'}, headers=caregiver)
+    assert post(client, caregiver, dose(med_id, 'a', 1))['created'] == 1
+
+
+def test_key_stored_concurrently_is_retried_as_a_duplicate(app, client, patient, monkeypatch):
+    headers, med_id = patient
+    apply_medication = dose_batch._apply_medication
+    racer = {}
+
+    def race(med, events):
+        # Another request commits the same key between the duplicate lookup and our flush
+        if not racer:
+            with db.engine.begin() as conn:
+                racer['id'] = conn.execute(db.insert(DoseLog).values(
+                    medication_id=med.id, client_key=events[0][1], status='taken',
+                    scheduled_time=events[0][2], taken_time=events[0][2], created_at=events[0][2],
+                )).inserted_primary_key[0]
+        return apply_medication(med, events)
+    monkeypatch.setattr(dose_batch, '_apply_medication', race)
+
+    body = post(client, headers, dose(med_id, 'a', 1))
+    assert body['results'][0]['result'] == 'duplicate'
+    assert body['results'][0]['log']['id'] == racer['id']
+    assert log_count(app) == 1
+    assert medication(app, med_id).current_stock == 30
@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+import requests
+
+from app.services import drug_api, interaction_store
+from app.services.cache import rxcui_cache, interaction_cache
+
+
+@pytest.fixture
+def store_lookups(monkeypatch):
+    calls = []
+
+    def rxcui_for_name(name):
+        calls.append(name)
+        return '11289' if name.lower() == 'warfarin' else None
+    monkeypatch.setattr(interaction_store, 'rxcui_for_name', rxcui_for_name)
+    monkeypatch.setattr(drug_api, 'RXNAV_FALLBACK', False)
+    rxcui_cache.memory.clear()
+    yield calls
+    rxcui_cache.memory.clear()
+
+
+def test_get_rxcui_checks_memory_before_the_store(app, store_lookups):
+    with app.app_context():
+        assert drug_api.get_rxcui('Warfarin') == '11289'
+        assert drug_api.get_rxcui('warfarin ') == '11289'
+    assert store_lookups == ['Warfarin']
+
+
+def test_get_rxcui_store_answer_is_kept_in_memory_only(app, store_lookups):
+    with app.app_context():
+        drug_api.get_rxcui('Warfarin')
+        rxcui_cache.memory.clear()
+        assert rxcui_cache.get('warfarin') is None
+
+
+def test_resolve_rxcui_tells_a_failed_lookup_from_an_unknown_name(app, store_lookups, monkeypatch):
+    monkeypatch.setattr(drug_api, 'RXNAV_FALLBACK', True)
+    monkeypatch.setattr(drug_api, '_lookup_rxcui', lambda name, deadline: None)
+    with app.app_context():
+        assert drug_api.resolve_rxcui('Nosuchdrug') is None
+
+    def down(name, deadline):
+        raise drug_api.upstream.CircuitOpen('rxnav is unavailable')
+    monkeypatch.setattr(drug_api, '_lookup_rxcui', down)
+    with app.app_context():
+        with pytest.raises(drug_api.RxcuiLookupFailed):
+            drug_api.resolve_rxcui('Otherdrug')
+        assert drug_api.get_rxcui('Otherdrug') is None
+        assert rxcui_cache.get('otherdrug') is None
+
+
+def _rxnav_response(*pairs):
+    """A stand-in for RxNav's interaction/list.json answer listing (rxcui1, rxcui2, description) pairs."""
+    body = {'fullInteractionTypeGroup': [{'sourceName': 'DrugBank', 'fullInteractionType': [{'interactionPair': [
+        {'severity': 'N/A', 'description': description,
+         'interactionConcept': [{'minConceptItem': {'rxcui': a, 'name': a}}, {'minConceptItem': {'rxcui': b, 'name': b}}]}
+        for a, b, description in pairs
+    ]}]}]}
+    return type('Response', (), {'raise_for_status': lambda self: None, 'json': lambda self: body})()
+
+
+@pytest.fixture
+def rxnav(monkeypatch):
+    """Stubbed upstream.get: list of (rxcuis asked for, timeout, deadline) per call; 'slow' never answers in time."""
+    calls = []
+    release = threading.Event()
+
+    def get(url, params=None, timeout=10, deadline=None, hedge=False):
+        rxcuis = params['rxcuis'].split('+')
+        calls.append((rxcuis, timeout, deadline))
+        if 'slow' in rxcuis and len(rxcuis) == 2:
+            release.wait(5)
+            raise requests.Timeout('read timed out')
+        if 'down' in rxcuis and len(rxcuis) == 2:
+            raise requests.ConnectionError('connection refused')
+        if len(rxcuis) > 2:
+            return _rxnav_response(('new', 'quiet', 'Seen by the bulk call only.'))
+        return _rxnav_response(*[('new', 'bleeder', 'Increased bleeding.')] if 'bleeder' in rxcuis else [])
+    monkeypatch.setattr(drug_api, 'RXNAV_FALLBACK', True)
+    monkeypatch.setattr(drug_api.upstream, 'get', get)
+    interaction_cache.memory.clear()
+    yield calls
+    release.set()
+    interaction_cache.memory.clear()
+
+
+def test_bulk_and_pairwise_calls_share_one_deadline(app, rxnav):
+    with app.app_context():
+        drug_api.pair_interactions('new', ['bleeder', 'quiet'])
+    assert sorted(len(rxcuis) for rxcuis, _, _ in rxnav) == [2, 2, 3]
+    deadlines = {id(deadline) for _, _, deadline in rxnav}
+    assert len(deadlines) == 1 and None not in {deadline for _, _, deadline in rxnav}
+
+
+def test_only_confirmed_verdicts_are_cached(app, rxnav):
+    deadline = drug_api.Deadline(0.5)
+    with app.app_context():
+        found, _, unchecked = drug_api.pair_interactions('new', ['bleeder', 'quiet', 'slow', 'down'], deadline)
+        assert all(d is deadline for _, _, d in rxnav)
+        assert sorted(unchecked) == ['down', 'slow']
+        assert [r['description'] for r in found['bleeder']] == ['Increased bleeding.']
+        assert [r['description'] for r in found['quiet']] == ['Seen by the bulk call only.']
+
+        rxcui_pair = drug_api.interaction_pair_key
+        assert [r['description'] for r in interaction_cache.get(rxcui_pair('new', 'bleeder'))] == ['Increased bleeding.']
+        assert interaction_cache.get(rxcui_pair('new', 'quiet')) is not None
+        assert interaction_cache.get(rxcui_pair('new', 'slow')) is None
+        assert interaction_cache.get(rxcui_pair('new', 'down')) is None
+
+        verdict = drug_api.check_drug_interactions('new', ['bleeder', 'slow'], drug_api.Deadline(0.3))
+    assert verdict['partial'] and verdict['unchecked_rxcuis'] == ['slow']
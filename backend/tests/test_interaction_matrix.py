@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from itertools import combinations
+
+import pytest
+
+from app import db
+from app.models import Medication
+from app.services import interaction_matrix
+
+W, A, L, N = '11289', '1191', '6448', '7258'
+# RxNav records per pair; the lithium / naproxen one is only critical because both combo members are named
+RECORDS = {
+    frozenset((W, L)): [{'severity': 'N/A', 'description': 'Monitor INR.', 'drugs': ['warfarin', 'lithium'],
+                         'source': 'DrugBank'}],
+    frozenset((L, N)): [{'severity': 'N/A', 'description': 'Levels may rise.', 'drugs': ['lithium', 'nsaid naproxen'],
+                         'source': 'DrugBank'}] * 2,
+}
+
+
+@pytest.fixture
+def regimen(app, register, monkeypatch):
+    """(auth headers, [warfarin, aspirin, lithium, naproxen, tonic ids], pairs asked for)"""
+    headers, patient_id = register('pat@example.com')
+    now = datetime.utcnow()
+    with app.app_context():
+        meds = [Medication(patient_id=patient_id, name=name, rxcui=rxcui, form='tablet', dose_amount=1,
+                           dose_unit='mg', frequency_hours=24, half_life_hours=4, current_stock=30,
+                           last_taken_time=now - timedelta(minutes=10) if taken else None,
+                           next_dose_time=now + timedelta(hours=next_in))
+                for name, rxcui, taken, next_in in [
+                    ('Warfarin', W, True, 20), ('Aspirin', A, True, 20), ('Lithium', L, False, 1),
+                    ('Naproxen', N, False, 48), ('Mystery tonic', None, False, 1)]]
+        db.session.add_all(meds)
+        db.session.commit()
+        ids = [m.id for m in meds]
+
+    asked = []
+
+    def pair_interactions(cui, others, deadline=None):
+        asked.extend(frozenset((cui, other)) for other in others)
+        found = {other: RECORDS.get(frozenset((cui, other)), []) for other in others
+                 if frozenset((cui, other)) != frozenset((A, N))}
+        return found, [], [other for other in others if other not in found]
+    monkeypatch.setattr(interaction_matrix, 'pair_interactions', pair_interactions)
+    monkeypatch.setattr(interaction_matrix, 'get_rxcui', lambda name, deadline=None: None)
+    return headers, ids, asked
+
+
+def test_matrix_covers_each_pair_once(client, regimen):
+    headers, ids, asked = regimen
+    warfarin, aspirin, lithium, naproxen, tonic = ids
+    body = client.get('/api/medications/interaction-matrix', headers=headers).get_json()
+
+    assert sorted(asked, key=sorted) == sorted((frozenset(p) for p in combinations([W, A, L, N], 2)), key=sorted)
+    pairs = {(p['med1_id'], p['med2_id']): p for p in body['pairs']}
+    assert len(pairs) == len(body['pairs'])
+
+    # Critical from the PK overlap alone, from the combo named in the RxNav record alone, and a plain warning
+    assert set(pairs) == {(warfarin, aspirin), (warfarin, lithium), (lithium, naproxen)}
+    pk = pairs[(warfarin, aspirin)]
+    assert pk['is_critical'] and pk['interactions'] == [] and pk['pk_overlap']['med2_id'] == aspirin
+    combo = pairs[(lithium, naproxen)]
+    assert combo['is_critical'] and combo['pk_overlap'] is None
+    assert [e['description'] for e in combo['interactions']] == ['Levels may rise.']
+    warning = pairs[(warfarin, lithium)]
+    assert warning['severity'] == 'warning' and not warning['is_critical']
+
+    matrix = body['matrix']
+    assert all(matrix[i][j] == matrix[j][i] for i in range(5) for j in range(5))
+    assert matrix[0][1] == matrix[2][3] == 'critical' and matrix[0][2] == 'warning' and matrix[0][0] is None
+    assert body['has_critical']
+
+    assert body['unresolved_medication_ids'] == [tonic]
+    assert body['medications'][4]['rxcui'] is None
+    assert body['partial'] and body['unchecked_pairs'] == [[aspirin, naproxen]]
@@ -0,0 +1,70 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, _run_as_leader
+from app import leader
+from app.leader import LeaderLease
+from app.models import SchedulerLease
+
+
+@pytest.fixture
+def leases(app):
+    with app.app_context():
+        yield LeaderLease(holder='a'), LeaderLease(holder='b')
+
+
+def holder():
+    return db.session.execute(db.select(SchedulerLease.holder)).scalar()
+
+
+def test_only_one_holder_gets_the_lease(leases):
+    a, b = leases
+    assert a.heartbeat() and a.is_leader
+    assert not b.heartbeat() and not b.is_leader
+    assert a.heartbeat()
+    assert holder() == 'a'
+
+
+def test_lapsed_lease_is_taken_over(leases):
+    a, b = leases
+    a.heartbeat()
+    # a stops renewing; once the row has expired the next heartbeat elsewhere wins it
+    with db.engine.begin() as conn:
+        conn.execute(db.update(SchedulerLease).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    assert b.heartbeat() and b.is_leader
+    assert not a.heartbeat() and not a.is_leader
+    assert holder() == 'b'
+
+
+def test_leader_steps_down_when_its_own_view_of_the_lease_expires(app):
+    with app.app_context():
+        a = LeaderLease(holder='a', ttl_seconds=0.2)
+        assert a.heartbeat()
+        time.sleep(0.3)
+        assert not a.is_leader
+        assert LeaderLease(holder='b').heartbeat()
+
+
+def test_release_frees_the_lease(leases):
+    a, b = leases
+    a.heartbeat()
+    a.release()
+    assert not a.is_leader
+    assert b.heartbeat()
+    a.release()  # no longer the holder: leaves b's lease alone
+    assert b.heartbeat() and holder() == 'b'
+
+
+def test_scheduled_work_runs_only_on_the_leader(app, monkeypatch):
+    with app.app_context():
+        lease = LeaderLease(holder='a')
+    monkeypatch.setattr(leader, 'scheduler_lease', lease)
+    ran = []
+    _run_as_leader(app, lambda: ran.append(1))
+    assert ran == []
+    with app.app_context():
+        lease.heartbeat()
+    _run_as_leader(app, lambda: ran.append(1))
+    assert ran == [1]
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, tasks
+from app.models import Medication, Alert
+
+
+@pytest.fixture
+def patient(app, register, monkeypatch):
+    """(patient auth headers, patient id, id of a medication with 30 in stock and a threshold of 5)"""
+    monkeypatch.setattr(tasks, '_low_stock_watermark', None)
+    headers, patient_id = register('pat@example.com')
+    with app.app_context():
+        med = Medication(patient_id=patient_id, name='Aspirin', form='tablet', dose_amount=1, dose_unit='mg',
+                         frequency_hours=8, half_life_hours=1, current_stock=30, stock_threshold=5,
+                         next_dose_time=datetime.utcnow() + timedelta(hours=1))
+        db.session.add(med)
+        db.session.commit()
+        return headers, patient_id, med.id
+
+
+def low_stock_alerts(app):
+    with app.app_context():
+        return db.session.execute(
+            db.select(Alert.id, Alert.is_read).where(Alert.type == 'low_stock').order_by(Alert.id)
+        ).all()
+
+
+def set_stock(client, headers, med_id, stock):
+    assert client.put(f'/api/medications/{med_id}', json={'current_stock': stock}, headers=headers).status_code == 200
+
+
+def test_crossing_twice_raises_one_alert_until_it_is_read(app, client, patient):
+    headers, _, med_id = patient
+    set_stock(client, headers, med_id, 3)
+    set_stock(client, headers, med_id, 20)
+    set_stock(client, headers, med_id, 2)
+    with app.app_context():
+        tasks.check_low_stock()
+    [(alert_id, _)] = low_stock_alerts(app)
+
+    # Reading the alert frees its dedupe_key, so the next crossing alerts again
+    assert client.put(f'/api/alerts/{alert_id}/read', headers=headers).status_code == 200
+    set_stock(client, headers, med_id, 20)
+    set_stock(client, headers, med_id, 1)
+    assert [read for _, read in low_stock_alerts(app)] == [True, False]
+
+
+def test_reconciliation_only_scans_rows_changed_since_the_last_run(app, patient):
+    _, _, med_id = patient
+    with app.app_context():
+        # Written straight through the engine, as another process would: no alert on the way
+        with db.engine.begin() as conn:
+            conn.execute(db.update(Medication).where(Medication.id == med_id)
+                         .values(current_stock=1, updated_at=datetime.utcnow() - timedelta(minutes=10)))
+        tasks.check_low_stock()
+        [(alert_id, _)] = low_stock_alerts(app)
+        db.session.execute(db.update(Alert).where(Alert.id == alert_id).values(is_read=True, dedupe_key=None))
+        db.session.commit()
+
+        # Still low, but unchanged since the watermark: not looked at again
+        tasks.check_low_stock()
+        assert len(low_stock_alerts(app)) == 1
+
+        # A change inside the overlap window is picked up
+        with db.engine.begin() as conn:
+            conn.execute(db.update(Medication).where(Medication.id == med_id).values(current_stock=0.5))
+        tasks.check_low_stock()
+        assert [read for _, read in low_stock_alerts(app)] == [True, False]
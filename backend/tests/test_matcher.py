@@ -0,0 +1,104 @@
+"""
+PatternMatcher must classify exactly like the substring loops it replaced
+(kept below as the reference), on both its paths: the plain scan used for
+small pattern sets and the Aho-Corasick automaton used for large ones.
+"""
+import random
+import string
+
+import pytest
+
+from app.services import drug_api, matcher
+from app.services.matcher import PatternMatcher
+
+KEYWORDS = drug_api.HIGH_SEVERITY_KEYWORDS
+COMBOS = drug_api.CRITICAL_DRUG_COMBOS
+
+
+def old_classify(severity, description):
+    desc_lower, sev_lower = description.lower(), severity.lower()
+    return (sev_lower in ('high', 'critical') or any(kw in desc_lower for kw in KEYWORDS)
+            or any(kw in sev_lower for kw in KEYWORDS))
+
+
+def old_pair_is_critical(name_a, name_b):
+    a, b = name_a.lower(), name_b.lower()
+    return any((d1 in a and d2 in b) or (d2 in a and d1 in b) for d1, d2 in COMBOS)
+
+
+def old_entry_is_critical(drug_names):
+    names = [n.lower() for n in drug_names]
+    return any(any(d1 in n for n in names) and any(d2 in n for n in names) for d1, d2 in COMBOS)
+
+
+def _corpus(seed=1, size=2000):
+    rng = random.Random(seed)
+    words = list(drug_api._COMBO_PARTNERS) + KEYWORDS + [
+        'tablet', 'oral', '5 mg', 'sodium', 'the', 'risk', 'minor', 'moderate', 'N/A', 'High', 'Critical',
+        'Ibuprofen 200 MG', 'Warfarin Sodium', 'NSAIDs', 'SSRIs', 'maoi', 'lithium carbonate', 'aspirin/ssri',
+    ]
+
+    def phrase(n):
+        text = ' '.join(rng.choice(words) for _ in range(n))
+        return text.title() if rng.random() < 0.5 else text
+    names = [phrase(rng.randint(1, 3)) for _ in range(size)]
+    descriptions = [phrase(rng.randint(3, 20)) for _ in range(size)]
+    severities = [rng.choice(['high', 'High', 'critical', 'N/A', '', 'moderate', 'minor', phrase(1)]) for _ in range(size)]
+    return names, descriptions, severities
+
+
+@pytest.fixture(params=['scan', 'automaton'])
+def matchers(request, monkeypatch):
+    """drug_api's matchers rebuilt on the path under test."""
+    threshold = 10 ** 6 if request.param == 'scan' else 0
+    monkeypatch.setattr(matcher, 'MATCHER_SCAN_THRESHOLD', threshold)
+    keyword = PatternMatcher(KEYWORDS)
+    combo = PatternMatcher(drug_api._COMBO_PARTNERS)
+    assert (keyword._small is None) == (request.param == 'automaton')
+    monkeypatch.setattr(drug_api, '_keyword_matcher', keyword)
+    monkeypatch.setattr(drug_api, '_combo_matcher', combo)
+
+
+def test_severity_classification_matches_substring_checks(matchers):
+    names, descriptions, severities = _corpus()
+    for severity, description in zip(severities, descriptions):
+        assert drug_api._classify_interaction(severity, description) == old_classify(severity, description)
+
+
+def test_pair_combo_check_matches_substring_checks(matchers):
+    names, _, _ = _corpus()
+    hits = 0
+    for a, b in zip(names, reversed(names)):
+        expected = old_pair_is_critical(a, b)
+        assert drug_api.is_critical_combo(drug_api.combo_members(a), drug_api.combo_members(b)) == expected, (a, b)
+        hits += expected
+    assert hits  # the corpus does exercise the critical branch
+
+
+def test_interaction_entry_matches_substring_checks(matchers):
+    names, descriptions, severities = _corpus(seed=2)
+    for i, (severity, description) in enumerate(zip(severities, descriptions)):
+        drugs = [names[i], names[-i - 1]]
+        entry = drug_api.interaction_entry({'severity': severity, 'description': description,
+                                            'drugs': drugs, 'source': ''})
+        assert entry['is_critical'] == (old_classify(severity, description) or old_entry_is_critical(drugs))
+
+
+@pytest.mark.parametrize('threshold', [0, 10 ** 6])
+def test_random_patterns_match_like_in(monkeypatch, threshold):
+    monkeypatch.setattr(matcher, 'MATCHER_SCAN_THRESHOLD', threshold)
+    rng = random.Random(0)
+    for _ in range(2000):
+        # A tiny alphabet forces overlapping and nested patterns
+        patterns = {''.join(rng.choice('abc') for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 12))}
+        text = ''.join(rng.choice('abcABC ') for _ in range(rng.randint(0, 30)))
+        m = PatternMatcher(patterns)
+        expected = {p for p in patterns if p in text.lower()}
+        assert m.matches(text) == expected, (patterns, text)
+        assert m.search(text) == bool(expected)
+
+
+def test_empty_and_missing_text():
+    m = PatternMatcher(['warfarin'] + [''.join(random.Random(i).choices(string.ascii_lowercase, k=8)) for i in range(100)])
+    assert m.matches('') == set() and m.matches(None) == set()
+    assert not m.search(None)
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Medication
+
+
+@pytest.fixture
+def patient(app, register):
+    """(patient auth headers, id of one of their medications)"""
+    headers, patient_id = register('pat@example.com')
+    with app.app_context():
+        med = Medication(patient_id=patient_id, name='Aspirin', rxcui='1191', form='tablet', dose_amount=1,
+                         dose_unit='mg', frequency_hours=24, half_life_hours=1, current_stock=30,
+                         label_status='ready', description='Pain relief',
+                         next_dose_time=datetime.utcnow() + timedelta(hours=1))
+        db.session.add(med)
+        db.session.commit()
+        return headers, med.id
+
+
+def test_label_is_served_to_the_patient_and_linked_caregiver(client, register, patient):
+    headers, med_id = patient
+    r = client.get(f'/api/medications/{med_id}/label', headers=headers)
+    assert r.status_code == 200
+    assert r.get_json()['description'] == 'Pain relief'
+
+    caregiver, _ = register('care@example.com', role='caregiver')
+    assert client.get(f'/api/medications/{med_id}/label', headers=caregiver).status_code == 404
+    client.post('/api/caregiver/link-patient', json={'patient_email': 'pat@example.com'}, headers=caregiver)
+    assert client.get(f'/api/medications/{med_id}/label', headers=caregiver).status_code == 200
+
+
+def test_other_patients_medication_is_not_found(client, register, patient):
+    headers, med_id = patient
+    other, _ = register('other@example.com')
+    r = client.get(f'/api/medications/{med_id}/label', headers=other)
+    assert r.status_code == 404
+    assert 'description' not in r.get_json()
+    assert client.put(f'/api/medications/{med_id}', json={'current_stock': 0}, headers=other).status_code == 404
+    assert client.delete(f'/api/medications/{med_id}', headers=other).status_code == 404
+    assert client.get('/api/medications/', headers=headers).get_json()[0]['current_stock'] == 30
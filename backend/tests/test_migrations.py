@@ -0,0 +1,108 @@
+import sqlite3
+
+from sqlalchemy import inspect
+
+# Schema as it was before versioned migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY, email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(256) NOT NULL,
+    name VARCHAR(100) NOT NULL, role VARCHAR(20) NOT NULL, created_at DATETIME
+);
+CREATE TABLE user_profiles (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL UNIQUE REFERENCES users (id), age INTEGER,
+    height_cm FLOAT, weight_kg FLOAT, blood_type VARCHAR(5), allergies TEXT, medical_history TEXT,
+    medications_history TEXT, emergency_contact_name VARCHAR(100), emergency_contact_phone VARCHAR(20),
+    emergency_contact_relationship VARCHAR(50), notes TEXT, updated_at DATETIME, created_at DATETIME
+);
+CREATE TABLE caregiver_links (
+    id INTEGER PRIMARY KEY, caregiver_id INTEGER NOT NULL REFERENCES users (id),
+    patient_id INTEGER NOT NULL REFERENCES users (id), created_at DATETIME
+);
+CREATE TABLE medications (
+    id INTEGER PRIMARY KEY, patient_id INTEGER NOT NULL REFERENCES users (id), name VARCHAR(100) NOT NULL,
+    rxcui VARCHAR(50), form VARCHAR(20) NOT NULL, dose_amount FLOAT NOT NULL, dose_unit VARCHAR(20) NOT NULL,
+    frequency_hours FLOAT NOT NULL, half_life_hours FLOAT, current_stock FLOAT NOT NULL,
+    stock_threshold FLOAT NOT NULL, next_dose_time DATETIME, is_active BOOLEAN, created_at DATETIME,
+    description TEXT, side_effects TEXT, boxed_warnings TEXT
+);
+CREATE TABLE dose_logs (
+    id INTEGER PRIMARY KEY, medication_id INTEGER NOT NULL REFERENCES medications (id),
+    scheduled_time DATETIME NOT NULL, taken_time DATETIME, status VARCHAR(20) NOT NULL, notes TEXT,
+    created_at DATETIME
+);
+CREATE TABLE alerts (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), type VARCHAR(50) NOT NULL,
+    severity VARCHAR(20) NOT NULL, title VARCHAR(200) NOT NULL, message TEXT NOT NULL,
+    medication_id INTEGER REFERENCES medications (id), is_read BOOLEAN, created_at DATETIME
+);
+INSERT INTO users VALUES (1, 'old@example.com', 'x', 'Old User', 'patient', '2024-01-01 08:00:00');
+INSERT INTO medications VALUES (1, 1, 'Aspirin', NULL, 'tablet', 1, 'mg', 24, 6, 30, 5,
+    '2024-01-02 08:00:00', 1, '2024-01-01 08:00:00', '', '', '');
+INSERT INTO dose_logs VALUES (1, 1, '2024-01-01 08:00:00', '2024-01-01 08:05:00', 'taken', '', '2024-01-01 08:05:00');
+"""
+
+
+def test_upgrade_from_baseline(tmp_path, monkeypatch):
+    path = tmp_path / 'baseline.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{path}')
+
+    from app import create_app, db
+    from app.migrations import MIGRATIONS, current_version
+    from app.models import Medication
+
+    app = create_app()
+    with app.app_context():
+        assert current_version() == max(m[0] for m in MIGRATIONS)
+        inspector = inspect(db.engine)
+        for table in ('medications', 'dose_logs', 'alerts', 'caregiver_links'):
+            expected = {index.name for index in db.metadata.tables[table].indexes}
+            assert expected <= {i['name'] for i in inspector.get_indexes(table)}, table
+        med = db.session.get(Medication, 1)
+        assert med.last_taken_time.isoformat() == '2024-01-01T08:05:00'
+        assert med.label_status == 'ready'
+
+
+def test_migrations_are_idempotent_on_a_current_schema(app):
+    from app import db
+    from app.migrations import MIGRATIONS, run_migrations
+    with app.app_context():
+        with db.engine.begin() as conn:
+            for _, _, fn in MIGRATIONS:
+                fn(conn)
+        assert run_migrations() == max(m[0] for m in MIGRATIONS)
+
+
+def test_concurrent_workers_migrate_once(tmp_path):
+    import os
+    import subprocess
+    import sys
+    path = tmp_path / 'shared.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+    env = {**os.environ, 'DATABASE_URL': f'sqlite:///{path}', 'SCHEDULER_MODE': 'off'}
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workers = [subprocess.Popen([sys.executable, '-c', 'from app import create_app; create_app()'],
+                                cwd=backend, env=env, stderr=subprocess.PIPE) for _ in range(4)]
+    for worker in workers:
+        _, err = worker.communicate(timeout=60)
+        assert worker.returncode == 0, err.decode()
+
+    from app.migrations import MIGRATIONS
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT version FROM schema_version').fetchall() == [(max(m[0] for m in MIGRATIONS),)]
+        assert conn.execute('SELECT COUNT(*) FROM medications WHERE last_taken_time IS NOT NULL').fetchone() == (1,)
+
+
+def test_migrate_on_start_off_leaves_the_schema_to_db_upgrade(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'release.db'}")
+    monkeypatch.setenv('MIGRATE_ON_START', 'off')
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+    result = app.test_cli_runner().invoke(args=['db-upgrade'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert 'medications' in inspect(db.engine).get_table_names()
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, tasks
+from app.models import Medication, DoseLog
+
+
+@pytest.fixture
+def armed(monkeypatch):
+    """{medication_id: next_dose_time} the dose timer was re-armed with."""
+    armed = {}
+    monkeypatch.setattr(tasks.dose_timer, 'schedule', lambda med_id, t: armed.__setitem__(med_id, t))
+    return armed
+
+
+def _overdue_medication(client, register, hours=2):
+    headers, patient_id = register('pat@example.com')
+    med = Medication(patient_id=patient_id, name='Aspirin', form='tablet', dose_amount=1, dose_unit='mg',
+                     frequency_hours=8, current_stock=30, stock_threshold=5,
+                     next_dose_time=datetime.utcnow() - timedelta(hours=hours))
+    db.session.add(med)
+    db.session.commit()
+    return headers, med
+
+
+def test_manually_logged_miss_then_timer_fires(app, client, register, armed):
+    with app.app_context():
+        headers, med = _overdue_medication(client, register)
+        due = med.next_dose_time
+        r = client.post(f'/api/doses/{med.id}/log', json={'status': 'missed'}, headers=headers)
+        assert r.status_code == 201
+
+        tasks.handle_due_doses([med.id])
+
+        db.session.expire_all()
+        med = db.session.get(Medication, med.id)
+        assert med.next_dose_time > datetime.utcnow()
+        assert armed[med.id] == med.next_dose_time
+        misses = db.session.execute(
+            db.select(DoseLog).where(DoseLog.medication_id == med.id, DoseLog.status == 'missed')
+        ).scalars().all()
+        assert [log.scheduled_time for log in misses] == [due]
+
+
+def test_timer_backs_off_when_scan_leaves_medication_overdue(app, client, register, armed, monkeypatch):
+    with app.app_context():
+        _, med = _overdue_medication(client, register)
+        monkeypatch.setattr(tasks, 'check_missed_doses', lambda **kwargs: 0)
+        before = datetime.utcnow()
+
+        tasks.handle_due_doses([med.id])
+
+        deadline = armed[med.id] + tasks.MISSED_DOSE_GRACE
+        assert deadline >= before + tasks.MISSED_DOSE_RETRY
+
+
+def test_overdue_dose_is_logged_once(app, client, register, armed):
+    with app.app_context():
+        _, med = _overdue_medication(client, register)
+        assert tasks.check_missed_doses() == 1
+        assert tasks.check_missed_doses() == 0
+        assert armed == {}
+
+
+def test_dose_due_exactly_at_the_cutoff_is_missed(app, client, register, monkeypatch):
+    now = datetime(2026, 1, 1, 12, 0)
+
+    class frozen(datetime):
+        @classmethod
+        def utcnow(cls):
+            return now
+    monkeypatch.setattr(tasks, 'datetime', frozen)
+    with app.app_context():
+        _, med = _overdue_medication(client, register)
+        med.next_dose_time = now - tasks.MISSED_DOSE_GRACE + timedelta(microseconds=1)
+        db.session.commit()
+        assert tasks.check_missed_doses() == 0
+
+        med.next_dose_time = now - tasks.MISSED_DOSE_GRACE
+        db.session.commit()
+        assert tasks.check_missed_doses() == 1
+        [miss] = db.session.execute(
+            db.select(DoseLog).where(DoseLog.medication_id == med.id, DoseLog.status == 'missed')
+        ).scalars().all()
+        assert miss.scheduled_time == now - tasks.MISSED_DOSE_GRACE
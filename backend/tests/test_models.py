@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+from app.models import Medication, RECENT_DOSE_RING_SIZE
+
+START = datetime(2026, 1, 1, 8, 0)
+
+
+def test_ring_keeps_the_newest_doses_in_time_order():
+    med = Medication()
+    doses = [START + timedelta(hours=h) for h in range(RECENT_DOSE_RING_SIZE + 4)]
+    for t in doses[::2] + doses[1::2]:
+        med.record_taken(t)
+    assert med.recent_taken() == doses[-RECENT_DOSE_RING_SIZE:]
+    assert med.last_taken_time == doses[-1]
+
+
+def test_backdated_dose_does_not_move_the_last_dose_back():
+    med = Medication()
+    med.record_taken(START + timedelta(hours=10))
+    med.record_taken(START)
+    assert med.last_taken_time == START + timedelta(hours=10)
+    assert med.recent_taken() == [START, START + timedelta(hours=10)]
+
+    # Older than everything in a full ring: it falls off at once
+    for h in range(1, RECENT_DOSE_RING_SIZE):
+        med.record_taken(START + timedelta(hours=10 + h))
+    ring = med.recent_taken()
+    med.record_taken(START - timedelta(days=1))
+    assert med.recent_taken() == ring
+    assert med.last_taken_time == ring[-1]
+
+
+def test_last_dose_recorded_before_the_ring_existed_is_kept():
+    med = Medication(last_taken_time=START + timedelta(hours=5))
+    med.record_taken(START)
+    assert med.last_taken_time == START + timedelta(hours=5)
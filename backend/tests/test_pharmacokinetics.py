@@ -0,0 +1,71 @@
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.models import Medication
+from app.services import pharmacokinetics as pk
+
+
+def test_superpose_matches_a_per_dose_loop():
+    rng = np.random.default_rng(3)
+    hours = np.linspace(-48, 24, 577)
+    doses = np.sort(rng.uniform(-60, 20, 40))
+    expected = [sum(100 * 0.5 ** ((t - d) / 7.5) for d in doses if d <= t) for t in hours]
+    np.testing.assert_allclose(pk.superpose(hours, doses, 7.5), expected, rtol=1e-9, atol=1e-9)
+
+
+def test_superpose_blocks_give_the_same_answer(monkeypatch):
+    hours, doses = np.linspace(0, 10, 101), np.arange(0, 10, 0.5)
+    whole = pk.superpose(hours, doses, 3)
+    monkeypatch.setattr(pk, '_BLOCK_CELLS', 50)
+    np.testing.assert_array_equal(pk.superpose(hours, doses, 3), whole)
+
+
+def test_steady_state_is_the_limit_of_repeated_single_doses():
+    half_life, interval = 6.0, 8.0
+    doses = np.arange(0, 400 * interval, interval)
+    last = doses[-1]
+    ss = pk.steady_state(half_life, interval)
+    # Just after the last dose, just before the next one, and averaged over the interval
+    assert pk.superpose([last], doses, half_life)[0] == pytest.approx(ss['peak'], abs=0.01)
+    assert pk.superpose([last + interval - 1e-9], doses, half_life)[0] == pytest.approx(ss['trough'], abs=0.01)
+    within = pk.superpose(np.linspace(last, last + interval, 20001)[:-1], doses, half_life)
+    assert within.mean() == pytest.approx(ss['average'], abs=0.01)
+    r = 0.5 ** (interval / half_life)
+    assert ss['accumulation_factor'] == pytest.approx(1 / (1 - r), abs=1e-3)
+    assert ss['time_to_90_percent_hours'] == pytest.approx(half_life * math.log2(10), abs=0.1)
+
+
+def test_curve_window_defaults_and_bounds(monkeypatch):
+    assert pk.curve_window(12) == (24, 24, pk.PK_DEFAULT_RESOLUTION_MINUTES)
+    assert pk.curve_window(12, history_hours=0, horizon_hours=6, resolution_minutes=5) == (0, 6, 5)
+    monkeypatch.setattr(pk, 'PK_MAX_WINDOW_HOURS', 100)
+    monkeypatch.setattr(pk, 'PK_MAX_POINTS', 1000)
+    assert pk.curve_window(12, 40, 60, 7.5) == (40, 60, 7.5)  # at the window limit
+    for history, horizon, step in [(-1, 10, 15), (0, 0, 15), (60, 50, 15), (10, 10, 0), (50, 50, 5)]:
+        with pytest.raises(ValueError):
+            pk.curve_window(12, history, horizon, step)
+
+
+def test_a_new_dose_is_not_served_from_the_cached_curve(monkeypatch):
+    now = datetime(2026, 1, 1, 12, 0)
+    med = Medication(id=1, half_life_hours=4, frequency_hours=8, is_active=True,
+                     next_dose_time=now + timedelta(hours=6))
+    med.record_taken(now - timedelta(hours=2))
+    pk.pk_cache.clear()
+    calls = []
+    superpose = pk.superpose
+    monkeypatch.setattr(pk, 'superpose', lambda *a: calls.append(a) or superpose(*a))
+
+    first = pk.medication_profile(med, now)
+    again = pk.medication_profile(med, now + timedelta(minutes=1))
+    assert again['accumulation'] == first['accumulation']
+    grids = len(calls)
+
+    med.record_taken(now)
+    after = pk.medication_profile(med, now + timedelta(minutes=1))
+    assert len(calls) > grids + 1  # the grid was computed again, not just the current level
+    assert after['doses']['taken'] == 2
+    assert after['current_concentration'] > first['current_concentration']
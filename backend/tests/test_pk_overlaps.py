@@ -0,0 +1,71 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.drug_api import CRITICAL_DRUG_COMBOS, check_pharmacokinetic_interactions, combo_members, \
+    is_critical_combo
+from app.services.pk_overlaps import find_pk_overlaps, active_window
+
+NOW = datetime(2026, 1, 1, 12, 0)
+NAMES = sorted({name for combo in CRITICAL_DRUG_COMBOS for name in combo}) + [
+    'vitamin d', 'lisinopril', 'amlodipine', 'atorvastatin', 'omeprazole',
+]
+
+
+def med(id, name, half_life, next_in=None, last_ago=None, patient_id=1, now=NOW):
+    return SimpleNamespace(
+        id=id, patient_id=patient_id, name=name, half_life_hours=half_life,
+        next_dose_time=now + timedelta(hours=next_in) if next_in is not None else None,
+        last_taken_time=now - timedelta(hours=last_ago) if last_ago is not None else None,
+    )
+
+
+def regimen(n, patients, seed):
+    rng = random.Random(seed)
+    return [med(i, f'{rng.choice(NAMES)} {i}', rng.uniform(1, 48), next_in=rng.uniform(-72, 24),
+                last_ago=rng.choice([None, rng.uniform(0, 200)]), patient_id=i % patients)
+            for i in range(n)]
+
+
+def brute_force(meds):
+    """Every same-patient critical-combo pair whose active windows intersect."""
+    windows = {m.id: active_window(m, m.last_taken_time, NOW) for m in meds}
+    pairs = set()
+    for a in meds:
+        for b in meds:
+            if a.id < b.id and a.patient_id == b.patient_id:
+                (sa, ea), (sb, eb) = windows[a.id], windows[b.id]
+                if sa < eb and sb < ea and is_critical_combo(combo_members(a.name), combo_members(b.name)):
+                    pairs.add((a.id, b.id))
+    return pairs
+
+
+@pytest.mark.parametrize('n, patients, seed', [(40, 1, 1), (200, 1, 2), (400, 20, 3)])
+def test_sweep_matches_brute_force(n, patients, seed):
+    meds = regimen(n, patients, seed)
+    overlaps = find_pk_overlaps(meds, now=NOW)
+    found = [tuple(sorted((o['med1_id'], o['med2_id']))) for o in overlaps]
+    assert len(found) == len(set(found))
+    assert set(found) == brute_force(meds)
+
+
+def test_overlap_interval():
+    warfarin = med(1, 'Warfarin', 10, next_in=8, last_ago=2)      # active from 2h ago for 50h
+    aspirin = med(2, 'Aspirin', 4, next_in=6)                       # not taken yet: from 6h ahead for 20h
+    [hit] = find_pk_overlaps([warfarin, aspirin], now=NOW)
+    assert (hit['med1_id'], hit['med2_id']) == (1, 2)
+    assert hit['overlap_start'] == (NOW + timedelta(hours=6)).isoformat()
+    assert hit['overlap_hours'] == 20
+
+
+def test_windows_start_at_the_next_dose_once_the_last_one_has_cleared():
+    # Warfarin's last dose cleared long ago and the next is two days out. The
+    # original pairwise check treated the first medication as dosed right now
+    # and reported this pair; the sweep doesn't.
+    now = datetime.utcnow()  # the pairwise check reads the clock itself
+    warfarin = med(1, 'Warfarin', 5, next_in=48, last_ago=100, now=now)
+    aspirin = med(2, 'Aspirin', 4, next_in=1, last_ago=3, now=now)
+    assert check_pharmacokinetic_interactions(warfarin, [aspirin])
+    assert find_pk_overlaps([warfarin, aspirin], now=now) == []
@@ -0,0 +1,86 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Medication, DoseLog, Alert, CaregiverLink, User
+from app.query_plans import _hot_queries, check_query_plans, explain
+
+# Index each hot query should search with (any one of them where several fit)
+EXPECTED_INDEXES = {
+    'missed_doses_chunk': {'ix_medications_active_next_dose', 'ix_dose_logs_medication_status_scheduled'},
+    'active_medications_for_patient': {'ix_medications_patient_active'},
+    'dose_logs_for_patient_since': {'ix_medications_patient_active'},
+    'recent_dose_logs': {'ix_dose_logs_created_at'},
+    'unread_alerts_for_user': {'ix_alerts_user_read_created'},
+    'alerts_since_id': {'ix_alerts_user_id'},
+    'alert_history_page': {'ix_alerts_user_id'},
+    'caregiver_patients': {'ix_caregiver_links_caregiver'},
+    'low_stock_changed_since': {'ix_medications_updated_at'},
+    'local_interaction_pairs': {'ix_drug_interactions_pair_key'},
+    'local_rxcui_for_name': {'ix_drug_concepts_name_key'},
+    'due_enrichment_jobs': {'ix_enrichment_jobs_status_run_after'},
+    'adherence_window': {'ix_adherence_daily_patient_day'},
+}
+
+
+@pytest.fixture(scope='module')
+def seeded(tmp_path_factory):
+    """A few hundred patients' worth of rows, with ANALYZE statistics, so plans are the ones production gets."""
+    from app import create_app
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+        app = create_app()
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(db.insert(User), [
+            {'id': i, 'email': f'u{i}@example.com', 'password_hash': 'x', 'name': f'U{i}',
+             'role': 'caregiver' if i % 10 == 0 else 'patient', 'created_at': now}
+            for i in range(1, 301)
+        ])
+        db.session.execute(db.insert(CaregiverLink), [
+            {'caregiver_id': c, 'patient_id': c - k} for c in range(10, 301, 10) for k in range(1, 6)
+        ])
+        db.session.execute(db.insert(Medication), [
+            {'id': i, 'patient_id': rng.randint(1, 300), 'name': f'Med {i}', 'form': 'tablet', 'dose_amount': 1,
+             'dose_unit': 'mg', 'frequency_hours': 12, 'current_stock': rng.randint(0, 60), 'stock_threshold': 5,
+             'is_active': i % 8 != 0, 'next_dose_time': now + timedelta(minutes=rng.randint(-600, 720)),
+             'created_at': now - timedelta(days=60), 'updated_at': now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))}
+            for i in range(1, 1501)
+        ])
+        db.session.execute(db.insert(DoseLog), [
+            {'medication_id': rng.randint(1, 1500), 'scheduled_time': now - timedelta(hours=h),
+             'taken_time': now - timedelta(hours=h), 'status': rng.choice(['taken', 'taken', 'taken', 'missed']),
+             'created_at': now - timedelta(hours=h)}
+            for h in range(0, 20000)
+        ])
+        db.session.execute(db.insert(Alert), [
+            {'user_id': rng.randint(1, 300), 'type': 'missed_dose', 'severity': 'warning', 'title': 't',
+             'message': 'm', 'is_read': rng.random() < 0.9, 'created_at': now - timedelta(minutes=m)}
+            for m in range(0, 10000)
+        ])
+        db.session.commit()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('ANALYZE')
+        yield app
+
+
+def test_hot_queries_avoid_full_scans(seeded):
+    with seeded.app_context():
+        results = check_query_plans()
+    assert {name: scans for name, (plan, scans) in results.items() if scans} == {}
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED_INDEXES))
+def test_hot_query_uses_intended_index(seeded, name):
+    with seeded.app_context(), db.engine.connect() as conn:
+        plan = explain(conn, _hot_queries()[name])
+    used = {index for line in plan for index in EXPECTED_INDEXES[name] if f' INDEX {index} ' in f'{line} '}
+    assert used, f'{name} does not use {" / ".join(sorted(EXPECTED_INDEXES[name]))}:\n' + '\n'.join(plan)
+
+
+def test_every_hot_query_has_an_expectation(app):
+    with app.app_context():
+        assert set(_hot_queries()) == set(EXPECTED_INDEXES)
@@ -0,0 +1,128 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+from app.services import upstream
+
+
+class _Stub(BaseHTTPRequestHandler):
+    """GET /<anything>?delay=<seconds>&status=<code>; counts hits per path."""
+    hits = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        _Stub.hits[url.path] = _Stub.hits.get(url.path, 0) + 1
+        time.sleep(float(query.get('delay', ['0'])[0]))
+        body = b'{}'
+        self.send_response(int(query.get('status', ['200'])[0]))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Stub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Stub.hits = {}
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setattr(upstream, 'UPSTREAM_BREAKER_FAILURES', 2)
+    monkeypatch.setattr(upstream, 'UPSTREAM_BREAKER_RESET_SECONDS', 0.3)
+
+
+def _state(base):
+    return upstream.stats()[urlsplit(base).netloc]['state']
+
+
+def test_breaker_opens_half_opens_and_closes(stub, breaker):
+    for _ in range(2):
+        assert upstream.get(f'{stub}/fail', params={'status': 503}).status_code == 503
+    assert _state(stub) == 'open'
+    with pytest.raises(upstream.CircuitOpen):
+        upstream.get(f'{stub}/ok')
+    assert 'ok' not in str(_Stub.hits)
+
+    time.sleep(0.35)
+    assert _state(stub) == 'half-open'
+    assert upstream.get(f'{stub}/ok').status_code == 200
+    assert _state(stub) == 'closed'
+    assert upstream.get(f'{stub}/ok').status_code == 200
+
+
+def test_failed_trial_reopens(stub, breaker):
+    for _ in range(2):
+        upstream.get(f'{stub}/fail', params={'status': 503})
+    time.sleep(0.35)
+    upstream.get(f'{stub}/fail', params={'status': 503})
+    assert _state(stub) == 'open'
+    with pytest.raises(upstream.CircuitOpen):
+        upstream.get(f'{stub}/ok')
+
+
+def test_only_the_trial_lets_the_next_call_through(stub, breaker):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        # Admitted while closed, finishes (failing) in the middle of the half-open trial
+        stale = pool.submit(upstream.get, f'{stub}/stale', params={'delay': 0.6, 'status': 503})
+        time.sleep(0.05)
+        for _ in range(2):
+            upstream.get(f'{stub}/fail', params={'status': 503})
+        time.sleep(0.35)
+        trial = pool.submit(upstream.get, f'{stub}/trial', params={'delay': 1.2})
+        stale.result()
+        # The stale failure re-opened the breaker; once that lapses the trial is still out
+        time.sleep(0.35)
+        assert not trial.done()
+        with pytest.raises(upstream.CircuitOpen):
+            upstream.get(f'{stub}/second-trial')
+        assert trial.result().status_code == 200
+    assert '/second-trial' not in _Stub.hits
+    assert _state(stub) == 'closed'
+
+
+def test_hedge_answers_without_waiting_for_the_slow_attempt(stub, monkeypatch):
+    monkeypatch.setattr(upstream, 'UPSTREAM_HEDGE_AFTER_SECONDS', 0.05)
+    calls = []
+    real_attempt = upstream._attempt
+
+    def attempt(host, url, params, timeout):
+        calls.append(url)
+        # The first attempt hangs, the hedge answers at once
+        return real_attempt(host, url, {'delay': 1.0} if len(calls) == 1 else {}, timeout)
+    monkeypatch.setattr(upstream, '_attempt', attempt)
+
+    started = time.monotonic()
+    assert upstream.get(f'{stub}/slow', timeout=5, hedge=True).status_code == 200
+    assert time.monotonic() - started < 0.5
+    counts = upstream.stats()[urlsplit(stub).netloc]
+    assert counts['hedged'] == 1 and counts['hedge_wins'] == 1
+
+
+def test_hedge_still_queued_is_cancelled_when_the_first_attempt_wins(stub, monkeypatch):
+    monkeypatch.setattr(upstream, 'UPSTREAM_HEDGE_AFTER_SECONDS', 0.2)
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(upstream, '_hedge_executor', pool)
+    # One saturated worker: queue is [hold, first attempt, busy, hedge]
+    hold, busy = threading.Event(), threading.Event()
+    pool.submit(hold.wait)
+    threading.Timer(0.1, lambda: pool.submit(busy.wait)).start()
+    threading.Timer(0.4, hold.set).start()
+
+    assert upstream.get(f'{stub}/once', timeout=5, hedge=True).status_code == 200
+    busy.set()
+    pool.shutdown(wait=True)
+    assert _Stub.hits['/once'] == 1
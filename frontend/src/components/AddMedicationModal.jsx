@@ -111,6 +111,8 @@ export default function AddMedicationModal({ onClose, onAdded, patientId }) {
       const data = err.response?.data;
       if (data?.error === "FATAL_INTERACTION_BLOCKED") {
         setInteractionWarning(data);
+      } else if (data?.error === "INTERACTION_CHECK_INCOMPLETE") {
+        setError(data.message);
       } else {
         setError(data?.error || "Failed to add medication");
       }
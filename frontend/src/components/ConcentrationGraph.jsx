@@ -5,16 +5,18 @@ import api from '../utils/api';
 
 ChartJS.register(CategoryScale, LinearScale, PointElement, LineElement, Title, Tooltip, Legend, Filler);
 
-export default function ConcentrationGraph({ medicationId, medicationName }) {
-  const [data, setData] = useState(null);
+// `curve` (from /medications/concentration-curves) saves the per-medication request
+export default function ConcentrationGraph({ medicationId, medicationName, curve }) {
+  const [fetched, setFetched] = useState(null);
+  const data = curve || fetched;
 
   useEffect(() => {
-    if (medicationId) {
-      api.get(`/doses/${medicationId}/concentration`).then(r => setData(r.data)).catch(() => {});
+    if (medicationId && !curve) {
+      api.get(`/doses/${medicationId}/concentration`).then(r => setFetched(r.data)).catch(() => {});
     } else {
-      setData(null);
+      setFetched(null);
     }
-  }, [medicationId]);
+  }, [medicationId, curve]);
 
   if (!medicationId || !data) return (
     <div className="rounded-3xl p-8 flex flex-col items-center justify-center text-center"
@@ -26,7 +28,7 @@ export default function ConcentrationGraph({ medicationId, medicationName }) {
   );
 
   const chartData = {
-    labels: data.accumulation.map(p => `${p.time}h`),
+    labels: data.accumulation.map(p => `${p.time > 0 ? "+" : ""}${p.time}h`),
     datasets: [{
       label: 'Blood Concentration',
       data: data.accumulation.map(p => p.concentration),
@@ -62,7 +64,7 @@ export default function ConcentrationGraph({ medicationId, medicationName }) {
       y: {
         ticks: { color: '#475569', callback: v => v + '%', font: { size: 10 } },
         grid: { color: 'rgba(255,255,255,0.03)' },
-        min: 0, max: 120
+        min: 0, suggestedMax: 120
       }
     }
   };
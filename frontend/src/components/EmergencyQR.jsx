@@ -10,7 +10,7 @@ export default function EmergencyQR({ user, medications }) {
       name: m.name,
       dose: `${m.dose_amount} ${m.dose_unit}`,
       frequency: `Every ${m.frequency_hours}h`,
-      warnings: m.boxed_warnings ? 'YES' : 'None'
+      warnings: m.has_boxed_warning ? 'YES' : 'None'
     })),
     generated: new Date().toISOString(),
     note: 'EMERGENCY USE — Show to paramedics'
@@ -36,7 +36,7 @@ export default function EmergencyQR({ user, medications }) {
               {medications?.slice(0, 3).map(m => (
                 <div key={m.id} className="text-gray-600">
                   • {m.name} — {m.dose_amount}{m.dose_unit} every {m.frequency_hours}h
-                  {m.boxed_warnings && <span className="text-red-600 font-bold"> ⚠️ Boxed Warning</span>}
+                  {m.has_boxed_warning && <span className="text-red-600 font-bold"> ⚠️ Boxed Warning</span>}
                 </div>
               ))}
               {medications?.length > 3 && <div className="text-gray-500">+{medications.length - 3} more...</div>}
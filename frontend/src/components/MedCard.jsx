@@ -165,7 +165,7 @@ export default function MedCard({
               Low Stock
             </span>
           )}
-          {med.boxed_warnings && (
+          {med.has_boxed_warning && (
             <span
               className="text-xs font-bold px-2 py-0.5 rounded-full text-white"
               style={{
@@ -16,7 +16,7 @@ export default function ViewPatientProfileModal({
     setLoading(true);
     setError("");
     api
-      .get(`/caregiver/patient-profile/${patientId}`)
+      .get(`/caregiver/patient-profile/${patientId}?include=label`)
       .then((r) => setProfile(r.data))
       .catch(() => setError("Failed to load patient profile."))
       .finally(() => setLoading(false));
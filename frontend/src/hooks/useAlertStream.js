@@ -0,0 +1,45 @@
+import { useEffect, useRef, useCallback } from 'react';
+import api from '../utils/api';
+
+// Subscribes to /alerts/stream. New alerts are prepended to the list through
+// onNewAlerts (a state setter); caregivers also get onPatientUpdate(patientId)
+// when one of their patients receives an alert. The browser reconnects on its
+// own and resumes from the last event id it saw.
+export function useAlertStream(onNewAlerts, onPatientUpdate) {
+  const onPatientUpdateRef = useRef(onPatientUpdate);
+  onPatientUpdateRef.current = onPatientUpdate;
+
+  const requestNotifPermission = useCallback(async () => {
+    if ('Notification' in window && Notification.permission === 'default') {
+      await Notification.requestPermission();
+    }
+  }, []);
+
+  const showBrowserNotif = useCallback((title, body, severity) => {
+    if ('Notification' in window && Notification.permission === 'granted') {
+      const icons = { critical: '🚨', warning: '⚠️', info: 'ℹ️' };
+      new Notification(`${icons[severity] || '🔔'} PulseGuard: ${title}`, {
+        body,
+        requireInteraction: severity === 'critical'
+      });
+    }
+  }, []);
+
+  useEffect(() => {
+    requestNotifPermission();
+    const token = localStorage.getItem('token');
+    if (!token) return;
+    const source = new EventSource(`${api.defaults.baseURL}/alerts/stream?jwt=${encodeURIComponent(token)}`);
+
+    source.addEventListener('alert', (e) => {
+      const alert = JSON.parse(e.data);
+      showBrowserNotif(alert.title, alert.message, alert.severity);
+      onNewAlerts?.(prev => [alert, ...prev.filter(a => a.id !== alert.id)]);
+    });
+    source.addEventListener('patient_update', (e) => {
+      onPatientUpdateRef.current?.(JSON.parse(e.data).patient_id);
+    });
+
+    return () => source.close();
+  }, [onNewAlerts, showBrowserNotif, requestNotifPermission]);
+}
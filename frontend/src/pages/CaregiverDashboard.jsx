@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useCallback } from "react";
 import { useAuth } from "../context/AuthContext";
-import { useAlertPolling } from "../hooks/useAlertPolling";
+import { useAlertStream } from "../hooks/useAlertStream";
 import api from "../utils/api";
 import ViewPatientProfileModal from "../components/ViewPatientProfileModal";
 
@@ -63,7 +63,7 @@ export default function CaregiverDashboard() {
     loadPatients();
     loadAlerts();
   }, [loadPatients, loadAlerts]);
-  useAlertPolling(setAlerts);
+  useAlertStream(setAlerts, loadPatients);
 
   const linkPatient = async (e) => {
     e.preventDefault();
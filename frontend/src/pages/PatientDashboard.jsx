@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useCallback } from "react";
 import { useAuth } from "../context/AuthContext";
-import { useAlertPolling } from "../hooks/useAlertPolling";
+import { useAlertStream } from "../hooks/useAlertStream";
 import { useMedicationReminders } from "../hooks/useMedicationReminders";
 import api from "../utils/api";
 import SafetyLight from "../components/SafetyLight";
@@ -22,47 +22,45 @@ export default function PatientDashboard() {
   const [showInteractionWarning, setShowInteractionWarning] = useState(false);
   const [pendingMedication, setPendingMedication] = useState(null);
   const [fatalInteractions, setFatalInteractions] = useState([]);
+  const [curves, setCurves] = useState({});
+  const [selectedLabel, setSelectedLabel] = useState(null);
+
+  const loadCurves = useCallback(async () => {
+    try {
+      const r = await api.get("/medications/concentration-curves");
+      setCurves(Object.fromEntries(r.data.medications.map((c) => [c.medication_id, c])));
+    } catch (_) {}
+  }, []);
 
   const loadMeds = useCallback(async () => {
     try {
       const r = await api.get("/medications/");
       setMeds(r.data);
-      // Check for fatal interactions among all current medications
+      loadCurves();
+      // Check for fatal interactions among all current medications (one call for every pair)
       if (r.data.length > 1) {
         try {
-          const pkRes = await api.get("/medications/check-pk-overlaps");
-          if (pkRes.data.overlaps?.length > 0) {
-            setFatalInteractions(pkRes.data.overlaps);
-            return;
-          }
-        } catch (_) {}
-
-        // Fallback: Check via post endpoint with each med
-        const interactions = [];
-        for (let i = 0; i < r.data.length; i++) {
-          try {
-            const checkRes = await api.post("/medications/check-interactions", {
-              name: r.data[i].name,
-              half_life_hours: r.data[i].half_life_hours || 6,
-            });
-            if (checkRes.data.critical_interactions?.length > 0) {
-              if (!interactions.find((x) => x.med1 === r.data[i].name)) {
-                interactions.push({
-                  med1: r.data[i].name,
-                  med2: "another current medication",
+          const matrix = await api.get("/medications/interaction-matrix");
+          setFatalInteractions(
+            matrix.data.pairs
+              .filter((p) => p.is_critical)
+              .map((p) => {
+                const critical = p.interactions.filter((i) => i.is_critical);
+                return {
+                  med1: p.med1,
+                  med2: p.med2,
                   severity: "FATAL",
-                  interactions: checkRes.data.critical_interactions,
-                });
-              }
-            }
-          } catch (_) {}
-        }
-        setFatalInteractions(interactions);
+                  interactions: critical.length > 0 ? critical : undefined,
+                  reason: p.pk_overlap?.reason,
+                };
+              })
+          );
+        } catch (_) {}
       } else {
         setFatalInteractions([]);
       }
     } catch (_) {}
-  }, []);
+  }, [loadCurves]);
 
   const loadAlerts = useCallback(async () => {
     try {
@@ -75,7 +73,43 @@ export default function PatientDashboard() {
     loadMeds();
     loadAlerts();
   }, [loadMeds, loadAlerts]);
-  useAlertPolling(setAlerts);
+  // FDA labels of newly added medications are fetched in the background; poll until they land
+  useEffect(() => {
+    const pending = meds.filter((m) => m.label_status === "pending");
+    if (pending.length === 0) return;
+    const timer = setTimeout(async () => {
+      const labels = await Promise.all(
+        pending.map((m) => api.get(`/medications/${m.id}/label`).then((r) => r.data).catch(() => null))
+      );
+      const done = Object.fromEntries(
+        labels.filter((l) => l && l.label_status !== "pending").map((l) => [l.medication_id, l])
+      );
+      if (Object.keys(done).length === 0) return setMeds((prev) => [...prev]);
+      setMeds((prev) =>
+        prev.map((m) =>
+          done[m.id]
+            ? { ...m, label_status: done[m.id].label_status, has_boxed_warning: !!done[m.id].boxed_warnings }
+            : m
+        )
+      );
+    }, 3000);
+    return () => clearTimeout(timer);
+  }, [meds]);
+  // The medication list carries no label text; fetch it for the selected one
+  const selectedLabelStatus = meds.find((m) => m.id === selectedMed)?.label_status;
+  useEffect(() => {
+    setSelectedLabel(null);
+    if (!selectedMed || selectedLabelStatus === "pending") return;
+    let cancelled = false;
+    api
+      .get(`/medications/${selectedMed}/label`)
+      .then((r) => !cancelled && setSelectedLabel(r.data))
+      .catch(() => {});
+    return () => {
+      cancelled = true;
+    };
+  }, [selectedMed, selectedLabelStatus]);
+  useAlertStream(setAlerts);
   useMedicationReminders(meds, (med) => {
     setPendingMedication(med);
     setShowInteractionWarning(true);
@@ -474,14 +508,16 @@ export default function PatientDashboard() {
           <ConcentrationGraph
             medicationId={selectedMed}
             medicationName={selectedMedObj?.name}
+            curve={curves[selectedMed]}
           />
         </div>
 
         {/* FDA Encyclopedia */}
         {selectedMedObj &&
-          (selectedMedObj.description ||
-            selectedMedObj.side_effects ||
-            selectedMedObj.boxed_warnings) && (
+          selectedLabel?.medication_id === selectedMedObj.id &&
+          (selectedLabel.description ||
+            selectedLabel.side_effects ||
+            selectedLabel.boxed_warnings) && (
             <div
               className="dash-item rounded-3xl overflow-hidden border-3"
               style={{
@@ -507,7 +543,7 @@ export default function PatientDashboard() {
                 </h3>
               </div>
               <div className="p-6 space-y-4">
-                {selectedMedObj.boxed_warnings && (
+                {selectedLabel.boxed_warnings && (
                   <div
                     className="rounded-2xl p-5 border-3"
                     style={{
@@ -519,11 +555,11 @@ export default function PatientDashboard() {
                       ⚠️ Boxed Warning (FDA)
                     </p>
                     <p className="text-red-900 text-sm leading-relaxed font-semibold">
-                      {selectedMedObj.boxed_warnings}
+                      {selectedLabel.boxed_warnings}
                     </p>
                   </div>
                 )}
-                {selectedMedObj.description && (
+                {selectedLabel.description && (
                   <div
                     className="rounded-2xl p-5 border-3"
                     style={{
@@ -535,11 +571,11 @@ export default function PatientDashboard() {
                       📋 Indications
                     </p>
                     <p className="text-gray-800 text-sm leading-relaxed">
-                      {selectedMedObj.description}
+                      {selectedLabel.description}
                     </p>
                   </div>
                 )}
-                {selectedMedObj.side_effects && (
+                {selectedLabel.side_effects && (
                   <div
                     className="rounded-2xl p-5 border-3"
                     style={{
@@ -551,7 +587,7 @@ export default function PatientDashboard() {
                       ⚡ Side Effects
                     </p>
                     <p className="text-gray-800 text-sm leading-relaxed">
-                      {selectedMedObj.side_effects}
+                      {selectedLabel.side_effects}
                     </p>
                   </div>
                 )}